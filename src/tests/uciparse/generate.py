@@ -0,0 +1,32 @@
+# vim: set ft=python ts=4 sw=4 expandtab:
+
+# Generators for large synthetic configurations, shared by the tests that need more input than a fixture file can sensibly hold.
+
+
+def firewall_lines(rules: int, changed: int = 0, *, reverse: bool = False) -> list[str]:
+    """
+    Generate the lines of a firewall configuration, 8 lines per rule.
+
+    The rules are named rule0, rule1 and so on, and are generated in reverse
+    order if ``reverse`` is set.  If ``changed`` is non-zero, the src option of
+    every changed'th rule is lan rather than wan.
+    """
+    lines = ["package firewall\n"]
+    for rule in reversed(range(rules)) if reverse else range(rules):
+        source = "lan" if changed and rule % changed == 0 else "wan"
+        lines.extend([
+            "\n",
+            "config rule\n",
+            f"\toption name 'rule{rule}'\n",
+            f"\toption src {source}\n",
+            f"\toption dest_port {rule % 65535}\n",
+            "\toption target 'ACCEPT'  # comment\n",
+            "\tlist proto tcp\n",
+            "\tlist proto udp\n",
+        ])
+    return lines
+
+
+def firewall_text(rules: int, changed: int = 0, *, reverse: bool = False) -> str:
+    """Generate the text of a firewall configuration, as for firewall_lines()."""
+    return "".join(firewall_lines(rules, changed, reverse=reverse))
@@ -0,0 +1,104 @@
+# vim: set ft=python ts=4 sw=4 expandtab:
+
+import io
+import tarfile
+import zipfile
+
+import pytest
+
+from uciparse.archive import read_archive
+from uciparse.uci import UciFile, UciParseError
+
+NETWORK = """package network
+
+config interface lan
+    option proto 'static'
+"""
+
+DHCP = """package dhcp
+
+config dhcp lan
+    option interface 'lan'
+"""
+
+MEMBERS = {
+    "./etc/config/network": b"package 'network'\nconfig interface 'lan'\n  option proto static\n",
+    "etc/config/dhcp": DHCP.encode(),
+    "etc/config/nested/ignored": b"bogus\n",
+    "etc/passwd": b"bogus\n",
+    "sysupgrade.conf": b"bogus\n",
+}
+
+
+def make_tar(path, members, mode="w:gz"):
+    with tarfile.open(path, mode) as archive:
+        directory = tarfile.TarInfo("etc/config")
+        directory.type = tarfile.DIRTYPE
+        archive.addfile(directory)
+        for name, data in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    return path
+
+
+def make_zip(path, members):
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("etc/config/", b"")
+        for name, data in members.items():
+            archive.writestr(name.removeprefix("./"), data)
+    return path
+
+
+def normalized(files: list[tuple[str, UciFile]]) -> dict[str, str]:
+    return {name: "".join(uci.normalized()) for name, uci in files}
+
+
+class TestReadArchive:
+    """Unit tests for read_archive() and UciFile.from_archive()."""
+
+    @pytest.mark.parametrize("mode", ["w:gz", "w:bz2", "w:xz", "w"])
+    def test_tar(self, tmp_path, mode):
+        path = make_tar(tmp_path / "backup.tar", MEMBERS, mode)
+        assert normalized(list(read_archive(path))) == {"network": NETWORK, "dhcp": DHCP}
+
+    def test_zip(self, tmp_path):
+        path = make_zip(tmp_path / "backup.zip", MEMBERS)
+        assert normalized(list(read_archive(str(path)))) == {"network": NETWORK, "dhcp": DHCP}
+
+    def test_from_archive(self, tmp_path):
+        path = make_tar(tmp_path / "backup.tar.gz", MEMBERS)
+        assert normalized(list(UciFile.from_archive(path))) == {"network": NETWORK, "dhcp": DHCP}
+
+    def test_absolute_names(self, tmp_path):
+        path = make_tar(tmp_path / "backup.tar.gz", {"/etc/config/dhcp": DHCP.encode()})
+        assert normalized(list(read_archive(path))) == {"dhcp": DHCP}
+
+    def test_prefix(self, tmp_path):
+        path = make_tar(tmp_path / "backup.tar.gz", {"overlay/upper/etc/config/dhcp": DHCP.encode(), **MEMBERS})
+        assert normalized(list(read_archive(path, prefix="overlay/upper/etc/config/"))) == {"dhcp": DHCP}
+
+    def test_streaming(self, tmp_path):
+        # the first file must be available before the rest of the archive is read, and a later error doesn't prevent that
+        path = make_tar(tmp_path / "backup.tar.gz", {"etc/config/dhcp": DHCP.encode(), "etc/config/bogus": b"bogus\n"})
+        files = read_archive(path)
+        assert next(files)[0] == "dhcp"
+        with pytest.raises(UciParseError, match=r"^etc/config/bogus: Error on line 1: unrecognized line type"):
+            next(files)
+
+    def test_invalid_member(self, tmp_path):
+        path = make_zip(tmp_path / "backup.zip", {"etc/config/binary": b"\xff\n"})
+        with pytest.raises(UciParseError, match=r"^etc/config/binary: File is not valid UTF-8"):
+            list(read_archive(path))
+
+    def test_invalid_archive(self, tmp_path):
+        path = tmp_path / "backup.tar.gz"
+        path.write_bytes(b"bogus")
+        with pytest.raises(UciParseError, match=r"^Invalid archive "):
+            list(read_archive(path))
+
+    def test_truncated_archive(self, tmp_path):
+        path = make_tar(tmp_path / "backup.tar", MEMBERS, "w")
+        path.write_bytes(path.read_bytes()[:1100])
+        with pytest.raises(UciParseError, match=r"^Invalid archive "):
+            list(read_archive(path))
@@ -0,0 +1,399 @@
+# vim: set ft=python ts=4 sw=4 expandtab:
+
+import random
+import time
+from pathlib import Path
+
+import pytest
+
+from uciparse.batch import UciCommand, apply_commands, diff_commands, parse_commands, verify_commands
+from uciparse.uci import UciFile, UciParseError
+
+FIXTURE_DIR = Path(__file__).parent / "fixtures" / "test_uci"
+
+BASE = """package network
+
+config interface lan
+    option proto 'static'
+    option ipaddr '192.168.1.1'
+    list dns '8.8.8.8'
+    list dns '8.8.4.4'
+
+config interface wan
+    option proto 'dhcp'
+
+config rule
+    option name 'one'
+
+config rule
+    option name 'two'
+
+config rule
+    option name 'three'
+"""
+
+
+def batch(a: str, b: str, package: str | None = None) -> list[str]:
+    """Diff two files, returning the commands as text, and check that they reproduce the second file."""
+    before, after = UciFile.from_text(a), UciFile.from_text(b)
+    commands = diff_commands(before, after, package=package)
+    assert verify_commands(before, after, commands)
+    assert list(parse_commands(f"{command}\n" for command in commands)) == commands
+    return [str(command) for command in commands]
+
+
+def generate(rng: random.Random) -> UciFile:
+    """Generate a small random file, with a mix of named and anonymous sections, options and lists."""
+    lines = ["package p\n"]
+    for _ in range(rng.randint(0, 8)):
+        name = rng.choice([None, None, "a", "b", "c"])
+        lines.append(f"config {rng.choice(['rule', 'zone'])}" + (f" {name}\n" if name else "\n"))
+        for _ in range(rng.randint(0, 4)):
+            option, value = rng.choice(["o1", "o2", "l1", "l2"]), rng.choice(["'v1'", "'v2'", "'v 3'", '"it\'s"'])
+            lines.append(f"    {'list' if option[0] == 'l' or rng.random() < 0.2 else 'option'} {option} {value}\n")
+    return UciFile.from_lines(lines)
+
+
+class TestUciCommand:
+    """Unit tests for UciCommand."""
+
+    def test_str(self):
+        assert str(UciCommand("set", "network", "lan", "proto", "static")) == "set network.lan.proto='static'"
+        assert str(UciCommand("set", "network", "lan", None, "interface")) == "set network.lan=interface"
+        assert str(UciCommand("add_list", "network", "@rule[-1]", "dns", "it's")) == "add_list network.@rule[-1].dns='it'\\''s'"
+        assert str(UciCommand("del_list", "network", "lan", "dns", "")) == "del_list network.lan.dns=''"
+        assert str(UciCommand("delete", "network", "@rule[2]")) == "delete network.@rule[2]"
+        assert str(UciCommand("delete", "network", "lan", "dns")) == "delete network.lan.dns"
+        assert str(UciCommand("add", "network", None, None, "rule")) == "add network rule"
+        assert str(UciCommand("reorder", "network", "wan", None, "0")) == "reorder network.wan=0"
+
+
+class TestParseCommands:
+    """Unit tests for parse_commands()."""
+
+    def test_commands(self):
+        script = [
+            "set network.lan=interface\n",
+            "set network.lan.ipaddr='192.168.1.1'\n",
+            "\n",
+            "set network.lan.name=it\\'s\n",
+            "set 'network.lan.hostname=my host'\n",
+            "add_list network.@rule[-1].dns='1.1.1.1'\n",
+            'del_list network.lan.dns="8.8.8.8"\n',
+            "delete network.@rule[0]\n",
+            "delete network.lan.dns\n",
+            "add network rule\n",
+            "reorder network.wan=0\n",
+            "rename network.lan=home\n",
+            "rename network.lan.dns='servers'\n",
+            "commit network\n",
+        ]
+        assert list(parse_commands(script)) == [
+            UciCommand("set", "network", "lan", None, "interface"),
+            UciCommand("set", "network", "lan", "ipaddr", "192.168.1.1"),
+            UciCommand("set", "network", "lan", "name", "it's"),
+            UciCommand("set", "network", "lan", "hostname", "my host"),
+            UciCommand("add_list", "network", "@rule[-1]", "dns", "1.1.1.1"),
+            UciCommand("del_list", "network", "lan", "dns", "8.8.8.8"),
+            UciCommand("delete", "network", "@rule[0]"),
+            UciCommand("delete", "network", "lan", "dns"),
+            UciCommand("add", "network", None, None, "rule"),
+            UciCommand("reorder", "network", "wan", None, "0"),
+            UciCommand("rename", "network", "lan", None, "home"),
+            UciCommand("rename", "network", "lan", "dns", "servers"),
+        ]
+
+    @pytest.mark.parametrize(
+        "line,message",
+        [
+            ["set network.lan.proto='static\n", "invalid command: unbalanced quotes"],
+            ["bogus network.lan\n", "unknown command bogus"],
+            ["set network.lan\n", "invalid set command"],
+            ["set network.lan.proto=a b\n", "invalid set command"],
+            ["set network.lan='bad type'\n", "invalid set command"],
+            ["set network.wan=a.b\n", "invalid set command"],
+            ["set 'network.wan=a.b'\n", "invalid set command"],
+            ["delete network.lan=x\n", "invalid delete command"],
+            ["add_list network.lan=x\n", "invalid add_list command"],
+            ["reorder network.lan.proto=1\n", "invalid reorder command"],
+            ["rename network.lan=bad.name\n", "invalid rename command"],
+            ["rename network.lan\n", "invalid rename command"],
+            ["add network\n", "invalid add command"],
+            ["add network bad.type\n", "invalid add command"],
+        ],
+    )
+    def test_invalid(self, line, message):
+        with pytest.raises(UciParseError, match=rf"^Error on line 2: {message}"):
+            list(parse_commands(["\n", line]))
+
+
+class TestApplyCommands:
+    """Unit tests for apply_commands()."""
+
+    def test_apply(self):
+        script = [
+            "set network.lan.proto='dhcp'\n",
+            "del_list network.lan.dns='8.8.8.8'\n",
+            "add_list network.wan.dns='1.1.1.1'\n",
+            "delete network.@rule[1]\n",
+            "add network rule\n",
+            "set network.@rule[-1].name='four'\n",
+            "reorder network.@rule[-1]=0\n",
+            "set network.guest=interface\n",
+            "delete network.lan.ipaddr\n",
+        ]
+        result = apply_commands(UciFile.from_text(BASE), parse_commands(script))
+        assert "".join(result.normalized()) == (
+            "package network\n\n"
+            "config rule\n    option name 'four'\n\n"
+            "config interface lan\n    option proto 'dhcp'\n    list dns '8.8.4.4'\n\n"
+            "config interface wan\n    option proto 'dhcp'\n    list dns '1.1.1.1'\n\n"
+            "config rule\n    option name 'one'\n\n"
+            "config rule\n    option name 'three'\n\n"
+            "config interface guest\n"
+        )
+
+    def test_convert(self):
+        # add_list turns an option into a list, set turns a list into an option, and del_list removes every copy
+        script = [
+            "add_list network.wan.proto='static'\n",
+            "set network.lan.dns='1.1.1.1'\n",
+            "add_list network.lan.ipaddr='x'\n",
+            "add_list network.lan.ipaddr='192.168.1.1'\n",
+            "del_list network.lan.ipaddr='192.168.1.1'\n",
+        ]
+        sections = apply_commands(UciFile.from_text(BASE), parse_commands(script)).sections()
+        assert sections[1].options() == {"proto": "static", "dns": "1.1.1.1", "ipaddr": ["x"]}
+        assert sections[2].options() == {"proto": ["dhcp", "static"]}
+
+    def test_retype(self):
+        result = apply_commands(UciFile.from_text(BASE), parse_commands(["set network.wan=device\n"]))
+        assert [section.key for section in result.sections()] == ["", "lan", "wan", "@rule[0]", "@rule[1]", "@rule[2]"]
+        assert result.sections()[2].config.section == "device"
+
+    def test_retype_anonymous(self):
+        result = apply_commands(UciFile.from_text(BASE), parse_commands(["set network.@rule[1]=redirect\n"]))
+        assert [section.key for section in result.sections()] == ["", "lan", "wan", "@rule[0]", "@redirect[0]", "@rule[1]"]
+
+    def test_rename(self):
+        script = [
+            "rename network.wan=uplink\n",
+            "rename network.@rule[0]=first\n",
+            "rename network.lan.proto=protocol\n",
+            "set network.uplink.proto='pppoe'\n",
+            "set network.@rule[1].name='renamed'\n",
+        ]
+        result = apply_commands(UciFile.from_text(BASE), parse_commands(script))
+        assert [section.key for section in result.sections()] == ["", "lan", "uplink", "first", "@rule[1]", "@rule[2]"]
+        assert list(result.sections()[1].options()) == ["protocol", "ipaddr", "dns"]  # renamed in place
+        assert result.sections()[2].options() == {"proto": "pppoe"}
+        assert result.sections()[4].options() == {"name": "renamed"}
+
+    def test_delete_and_find(self):
+        # sections are found by index correctly after deletions from anywhere, including after compaction
+        rules = "".join(f"config rule\n    option name 'rule{index}'\n" for index in range(100))
+        script = ["delete network.@rule[0]\n", "delete network.@rule[-1]\n", "delete network.@rule[20]\n"] * 25
+        result = apply_commands(UciFile.from_text(rules), parse_commands(script))
+        remaining = list(range(100))
+        for _ in range(25):
+            del remaining[0], remaining[-1], remaining[20]
+        assert [section.options()["name"] for section in result.sections()[1:]] == [f"rule{index}" for index in remaining]
+
+    def test_add_and_find(self):
+        script = []
+        for index in range(100):
+            script.extend(["add network rule\n", f"set network.@rule[-1].name='rule{index}'\n"])
+            if index % 3 == 0:
+                script.append("delete network.@rule[0]\n")
+        script.extend(f"set network.@rule[{index}].index='{index}'\n" for index in range(66))
+        sections = apply_commands(UciFile.from_text("package network\n"), parse_commands(script)).sections()[1:]
+        assert [section.options()["name"] for section in sections] == [f"rule{index}" for index in range(34, 100)]
+        assert [section.options()["index"] for section in sections] == [str(index) for index in range(66)]
+
+    def test_many_commands(self):
+        script = []
+        for index in range(20000):
+            script.extend(["add firewall rule\n", f"set firewall.@rule[-1].name='rule{index}'\n"])
+            script.extend(["set firewall.@rule[-1].target=ACCEPT\n", "add_list firewall.@rule[-1].proto='tcp'\n"])
+        script.extend(["delete firewall.@rule[0]\n"] * 10000)
+        script.extend(f"set firewall.@rule[{index}].enabled='0'\n" for index in range(10000))
+        start = time.perf_counter()
+        result = apply_commands(UciFile(lines=[]), parse_commands(script))
+        assert time.perf_counter() - start < 10  # normally well under a second, but this only needs to catch O(n^2)
+        assert len(result.sections()) == 10001
+        assert result.sections()[-1].options() == {"name": "rule19999", "target": "ACCEPT", "proto": ["tcp"], "enabled": "0"}
+
+    def test_many_reorders(self):
+        # reversing a large file moves every section, which must not rebuild the index each time
+        rules = "".join(f"config rule\n    option name 'rule{index}'\n" for index in range(20000))
+        script = [f"reorder firewall.@rule[{index}]=0\n" for index in range(20000)]
+        start = time.perf_counter()
+        result = apply_commands(UciFile.from_text("package firewall\n" + rules), parse_commands(script))
+        assert time.perf_counter() - start < 10  # normally well under a second, but this only needs to catch O(n^2)
+        assert [section.options()["name"] for section in result.sections()[1:]] == [
+            f"rule{index}" for index in reversed(range(20000))
+        ]
+
+    def test_random_model(self):
+        # moving, retyping, adding and deleting sections keeps every @type[index] the same as in a plain list
+        rng = random.Random(7)  # noqa: S311
+        expected = [(rng.choice(["rule", "zone"]), f"s{index}") for index in range(50)]
+        before = "package p\n" + "".join(f"config {section_type} {name}\n" for section_type, name in expected)
+        script = []
+        for _ in range(2000):
+            index = rng.randrange(len(expected))
+            section_type, name = expected[index]
+            reference = f"@{section_type}[{sum(1 for item in expected[:index] if item[0] == section_type)}]"
+            action = rng.choice(["reorder", "retype", "add", "delete", "set"])
+            if action == "reorder":
+                position = rng.randrange(len(expected) + 2)  # past the end moves it to the end
+                script.append(f"reorder p.{reference}={position}\n")
+                expected.insert(position, expected.pop(index))
+            elif action == "retype":
+                other = "zone" if section_type == "rule" else "rule"
+                script.append(f"set p.{name}={other}\n")
+                expected[index] = (other, name)
+            elif action == "add":
+                script.extend([f"add p {section_type}\n", f"rename p.@{section_type}[-1]=n{len(script)}\n"])
+                expected.append((section_type, f"n{len(script) - 2}"))
+            elif action == "delete" and len(expected) > 1:
+                script.append(f"delete p.{reference}\n")
+                del expected[index]
+            else:
+                script.append(f"set p.{reference}.found='{name}'\n")
+        sections = apply_commands(UciFile.from_text(before), parse_commands(script)).sections()[1:]
+        assert [(section.config.section, section.config.name) for section in sections] == expected
+        assert all(section.options().get("found", section.config.name) == section.config.name for section in sections)
+
+    def test_no_package_line(self):
+        result = apply_commands(UciFile.from_text("config rule\n"), parse_commands(["set network.@rule[0].name='one'\n"]))
+        assert "".join(result.normalized()) == "package network\n\nconfig rule\n    option name 'one'\n"
+
+    @pytest.mark.parametrize(
+        "line,message",
+        [
+            ["set dhcp.lan.proto='dhcp'\n", "command for package dhcp in package network"],
+            ["set network.bogus.proto='dhcp'\n", "section not found: bogus"],
+            ["set network.@rule[3].name='four'\n", r"section not found: @rule\[3\]"],
+            ["delete network.lan.bogus\n", "option not found: lan.bogus"],
+            ["del_list network.lan.bogus='x'\n", "option not found: lan.bogus"],
+            ["reorder network.lan=-1\n", "invalid position: -1"],
+            ["set network.@rule[9].name='x'\n", r"section not found: @rule\[9\]"],
+            ["rename network.lan=wan\n", "section already exists: wan"],
+            ["rename network.lan.proto=ipaddr\n", "option already exists: lan.ipaddr"],
+            ["rename network.lan.bogus=x\n", "option not found: lan.bogus"],
+        ],
+    )
+    def test_invalid(self, line, message):
+        with pytest.raises(UciParseError, match=rf"^Error on line 2: {message}"):
+            apply_commands(UciFile.from_text(BASE), parse_commands(["set network.lan.proto='dhcp'\n", line]))
+
+
+class TestDiffCommands:
+    """Unit tests for diff_commands() and verify_commands()."""
+
+    def test_identical(self):
+        assert batch(BASE, BASE) == []
+        assert batch(BASE, BASE.replace("    ", "\t").replace("'", '"') + "# comment\n") == []
+
+    def test_options(self):
+        after = BASE.replace("option proto 'static'", "option proto 'dhcp'").replace("    option ipaddr '192.168.1.1'\n", "")
+        assert batch(BASE, after + "    option enabled '1'\n") == [
+            "delete network.lan.ipaddr",
+            "set network.lan.proto='dhcp'",
+            "set network.@rule[2].enabled='1'",
+        ]
+
+    def test_option_order_ignored(self):
+        before = "package p\n\nconfig rule\n    option a '1'\n    option b '2'\n"
+        assert batch(before, "package p\n\nconfig rule\n    option b '2'\n    option a '1'\n") == []
+
+    def test_lists(self):
+        assert batch(BASE, BASE.replace("list dns '8.8.4.4'\n", "list dns '8.8.4.4'\n    list dns '1.1.1.1'\n")) == [
+            "add_list network.lan.dns='1.1.1.1'",
+        ]
+        assert batch(BASE, BASE.replace("    list dns '8.8.8.8'\n", "")) == ["del_list network.lan.dns='8.8.8.8'"]
+        assert batch(
+            BASE, BASE.replace("list dns '8.8.8.8'\n    list dns '8.8.4.4'", "list dns '8.8.4.4'\n    list dns '8.8.8.8'")
+        ) == [
+            "delete network.lan.dns",
+            "add_list network.lan.dns='8.8.4.4'",
+            "add_list network.lan.dns='8.8.8.8'",
+        ]
+
+    def test_list_and_option(self):
+        assert batch(BASE, BASE.replace("option proto 'static'", "list proto 'static'")) == [
+            "delete network.lan.proto",
+            "add_list network.lan.proto='static'",
+        ]
+        assert batch(BASE, BASE.replace("option proto 'static'", "list proto 'static'\n    list proto 'x'")) == [
+            "add_list network.lan.proto='x'",
+        ]
+        assert batch(BASE, BASE.replace("list dns '8.8.8.8'\n    list dns '8.8.4.4'", "option dns '1.1.1.1'")) == [
+            "set network.lan.dns='1.1.1.1'",
+        ]
+
+    def test_sections(self):
+        after = BASE.replace("config rule\n    option name 'two'\n\n", "").replace("interface wan", "device wan")
+        assert batch(BASE, after + "\nconfig redirect\n    option name 'four'\n\nconfig interface guest\n") == [
+            "delete network.@rule[1]",
+            "set network.wan=device",
+            "add network redirect",
+            "set network.@redirect[-1].name='four'",
+            "set network.guest=interface",
+        ]
+
+    def test_sections_reused(self):
+        # an anonymous section that changed is modified and moved, rather than deleted and added again
+        after = BASE.replace("config rule\n    option name 'two'\n\n", "") + "\nconfig rule\n    option name 'four'\n"
+        assert batch(BASE, after) == ["set network.@rule[1].name='four'", "reorder network.@rule[1]=4"]
+
+    def test_anonymous_matching(self):
+        # the remaining sections match on content, or on their first option, rather than on their position
+        after = BASE.replace("config rule\n    option name 'one'\n\n", "").replace("name 'three'", "name 'three'\n    option x 'y'")
+        assert batch(BASE, after) == ["delete network.@rule[0]", "set network.@rule[1].x='y'"]
+
+    def test_reorder(self):
+        sections = BASE.split("\n\n")
+        after = "\n\n".join([sections[0], sections[5], sections[1], sections[2], sections[3], sections[4]])
+        assert batch(BASE, after) == ["reorder network.@rule[2]=0"]
+        after = "\n\n".join([sections[0], sections[5], sections[4], sections[3], sections[2], sections[1]])
+        assert batch(BASE, after) == [
+            "reorder network.@rule[1]=4",
+            "reorder network.@rule[0]=4",
+            "reorder network.wan=4",
+            "reorder network.lan=4",
+        ]
+
+    def test_duplicate_sections(self):
+        before = "package p\n\nconfig zone a\n    option x '1'\n\nconfig zone a\n    option y '2'\n"
+        assert batch(before, "package p\n\nconfig zone a\n    option y '2'\n    option x '1'\n") == []
+
+    def test_package(self):
+        with pytest.raises(ValueError, match=r"^Files are for different packages: network and dhcp"):
+            diff_commands(UciFile.from_text(BASE), UciFile.from_text("package dhcp\n"))
+        with pytest.raises(ValueError, match=r"^A package name is required"):
+            diff_commands(UciFile.from_text("config rule\n"), UciFile.from_text(""))
+        assert diff_commands(UciFile.from_text("config rule\n"), UciFile.from_text(""), package="firewall") == [
+            UciCommand("delete", "firewall", "@rule[0]"),
+        ]
+
+    def test_verify(self):
+        before, after = UciFile.from_text(BASE), UciFile.from_text(BASE.replace("dhcp", "static"))
+        assert verify_commands(before, after, [UciCommand("set", "network", "wan", "proto", "static")])
+        assert not verify_commands(before, after, [UciCommand("set", "network", "wan", "proto", "pppoe")])
+        assert not verify_commands(before, after, [UciCommand("delete", "network", "bogus")])
+
+    @pytest.mark.parametrize("path", sorted(path for path in (FIXTURE_DIR / "real").iterdir() if path.name != "README.md"))
+    def test_real(self, path):
+        text = path.read_text(encoding="utf-8")
+        batch("", text, package=path.name)
+        batch(text, "", package=path.name)
+
+    def test_random(self):
+        rng = random.Random(4)  # noqa: S311
+        for _ in range(500):
+            before, after = generate(rng), generate(rng)
+            commands = diff_commands(before, after)
+            assert verify_commands(before, after, commands)
+            assert list(parse_commands(f"{command}\n" for command in commands)) == commands
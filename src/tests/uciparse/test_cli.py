@@ -1,11 +1,75 @@
 # vim: set ft=python ts=4 sw=4 expandtab:
 
+import io
+import os
+import pstats
+import re
+import subprocess
+import sys
+from pathlib import Path
 from unittest.mock import MagicMock, call, patch
 
 import pytest
 
-from uciparse.cli import diff, parse
+import uciparse
+from uciparse.cli import apply, diff, lint, merge, parse
 from uciparse.uci import UciParseError
+from uciparse.watch import UciWatchEvent, UciWatchState
+
+# Modules that importing the CLI entry points must not pull in
+DEFERRED = [
+    "argparse",
+    "difflib",
+    "hashlib",
+    "json",
+    "pathlib",
+    "typing",
+    "uciparse.batch",
+    "uciparse.convert",
+    "uciparse.diff",
+    "uciparse.fleet",
+    "uciparse.lint",
+    "uciparse.merge",
+    "uciparse.profiling",
+    "uciparse.schema",
+    "uciparse.uci",
+]
+
+# Modules from DEFERRED that running each command, with no options, is expected to pull in
+NEEDED = {
+    "parse": ["argparse", "uciparse.uci"],
+    "diff": ["argparse", "difflib", "uciparse.diff", "uciparse.uci"],
+}
+
+# Budget for the import time of everything a parse or diff needs beyond what Python imports at startup, in microseconds
+# (argparse alone normally takes about 40% of it)
+IMPORT_BUDGET = 30000
+
+
+def _python(tmp_path: Path, *args: str) -> str:
+    """Run Python in a clean subprocess that can import uciparse, returning stderr."""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = str(Path(uciparse.__file__).parent.parent)
+    env["PYTHONPYCACHEPREFIX"] = str(tmp_path)  # so the timing does not include compiling the source
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    result = subprocess.run([sys.executable, *args], env=env, capture_output=True, text=True, check=True)  # noqa: S603
+    return result.stderr
+
+
+def _import_times(tmp_path: Path, code: str) -> dict[str, int]:
+    """Run code with -X importtime, returning the cumulative import time of each module imported at the top level."""
+    # -X importtime lines look like "import time: self | cumulative | name", with the name indented by depth
+    stderr = _python(tmp_path, "-X", "importtime", "-c", code)
+    fields = [line.split("|") for line in stderr.splitlines() if line.startswith("import time:")]
+    return {field[2].strip(): int(field[1]) for field in fields if field[2][1] != " " and field[1].strip().isdigit()}
+
+
+def _command(tmp_path: Path, command: str) -> str:
+    """Return code that runs a command with no options on a small UCI file (or two, for diff), as if from the command line."""
+    path = tmp_path / "network"
+    path.write_text("package network\n\nconfig interface lan\n\toption proto static\n")
+    argv = [command, *[str(path)] * (2 if command == "diff" else 1)]
+    return f"import sys; sys.argv = {argv!r}; from uciparse.cli import {command}; {command}()"
 
 
 class TestUciParse:
@@ -30,7 +94,7 @@ def test_no_file(self):
 
     @patch("uciparse.cli.sys.stdin")
     @patch("uciparse.cli.sys.stdout.writelines")
-    @patch("uciparse.cli.UciFile")
+    @patch("uciparse.uci.UciFile")
     def test_stdin(self, ucifile, writelines, stdin):
         with patch("sys.argv", ["uciparse", "-"]):
             uci = MagicMock()
@@ -41,7 +105,7 @@ def test_stdin(self, ucifile, writelines, stdin):
             writelines.assert_called_once_with(["normalized"])
 
     @patch("uciparse.cli.sys.stdout.writelines")
-    @patch("uciparse.cli.UciFile")
+    @patch("uciparse.uci.UciFile")
     def test_file(self, ucifile, writelines):
         with patch("sys.argv", ["uciparse", "file"]):
             uci = MagicMock()
@@ -51,8 +115,66 @@ def test_file(self, ucifile, writelines):
             ucifile.from_file.assert_called_once_with("file")
             writelines.assert_called_once_with(["normalized"])
 
+    @patch("uciparse.cli.sys.stdout.writelines")
+    @patch("uciparse.convert.from_show")
+    def test_from_show(self, from_show, writelines, tmp_path):
+        path = tmp_path / "show"
+        path.write_text("network.lan=interface\n")
+        with patch("sys.argv", ["uciparse", "--from", "show", str(path)]):
+            first = MagicMock()
+            first.normalized.return_value = ["first"]
+            second = MagicMock()
+            second.normalized.return_value = ["second"]
+            from_show.return_value = [first, second]
+            parse()
+            assert from_show.call_count == 1
+            writelines.assert_has_calls([call(["first"]), call(["second"])])
+
+    @patch("uciparse.cli.sys.stdin")
+    @patch("uciparse.cli.sys.stdout.writelines")
+    @patch("uciparse.convert.from_show")
+    def test_from_show_stdin(self, from_show, writelines, stdin):
+        with patch("sys.argv", ["uciparse", "--from", "show", "-"]):
+            uci = MagicMock()
+            uci.normalized.return_value = ["normalized"]
+            from_show.return_value = [uci]
+            parse()
+            from_show.assert_called_once_with(stdin)
+            writelines.assert_called_once_with(["normalized"])
+
+    @patch("uciparse.cli.sys.stdout.writelines")
+    @patch("uciparse.convert.from_json")
+    def test_from_json(self, from_json, writelines, tmp_path):
+        path = tmp_path / "json"
+        path.write_text("{}")
+        with patch("sys.argv", ["uciparse", "--from", "json", str(path)]):
+            uci = MagicMock()
+            uci.normalized.return_value = ["normalized"]
+            from_json.return_value = uci
+            parse()
+            from_json.assert_called_once_with("{}")
+            writelines.assert_called_once_with(["normalized"])
+
+    @patch("uciparse.cli.sys.stdin")
+    @patch("uciparse.cli.sys.stdout.writelines")
+    @patch("uciparse.convert.from_json")
+    def test_from_json_stdin(self, from_json, writelines, stdin):
+        with patch("sys.argv", ["uciparse", "--from", "json", "-"]):
+            stdin.read.return_value = "{}"
+            uci = MagicMock()
+            uci.normalized.return_value = ["normalized"]
+            from_json.return_value = uci
+            parse()
+            from_json.assert_called_once_with("{}")
+            writelines.assert_called_once_with(["normalized"])
+
+    def test_from_invalid(self):
+        with patch("sys.argv", ["uciparse", "--from", "bogus", "file"]):
+            with pytest.raises(SystemExit):
+                parse()
+
     @patch("uciparse.cli.sys.stderr.write")
-    @patch("uciparse.cli.UciFile")
+    @patch("uciparse.uci.UciFile")
     def test_error(self, ucifile, write):
         with patch("sys.argv", ["uciparse", "file"]):
             exception = UciParseError(message="Hello")
@@ -62,6 +184,163 @@ def test_error(self, ucifile, write):
             ucifile.from_file.assert_called_once_with("file")
             write.assert_called_once_with("Hello\n")
 
+    @patch("uciparse.server.serve")
+    def test_serve(self, serve):
+        with patch("sys.argv", ["uciparse", "--serve", "socket"]):
+            parse()
+            serve.assert_called_once_with("socket")
+
+    @patch("uciparse.cli.sys.stdout.write")
+    @patch("uciparse.watch.UciWatcher")
+    def test_watch(self, uciwatcher, write):
+        def watch():
+            yield [UciWatchEvent("a", UciWatchState((0, 0, 0), "", MagicMock(), None))]
+            yield [UciWatchEvent("b", UciWatchState((0, 0, 0), "", None, "Error")), UciWatchEvent("c", None)]
+            raise KeyboardInterrupt
+
+        uciwatcher.return_value.__enter__.return_value.watch.side_effect = watch
+        with patch("sys.argv", ["uciparse", "--watch", "dir"]):
+            parse()
+            uciwatcher.assert_called_once_with("dir")
+            assert write.call_args_list == [call("dir/a: ok\n"), call("dir/b: Error\n"), call("dir/c: removed\n")]
+
+    @patch("uciparse.cli.sys.stdout.writelines")
+    @patch("uciparse.archive.read_archive")
+    def test_archive(self, read_archive, writelines):
+        network, dhcp = MagicMock(), MagicMock()
+        network.normalized.return_value = ["network\n"]
+        dhcp.normalized.return_value = ["dhcp\n"]
+        read_archive.return_value = iter([("network", network), ("dhcp", dhcp)])
+        with patch("sys.argv", ["uciparse", "--archive", "backup.tar.gz"]):
+            parse()
+            read_archive.assert_called_once_with("backup.tar.gz")
+            assert writelines.call_args_list == [
+                call(["==> network <==\n", "network\n", "\n"]),
+                call(["==> dhcp <==\n", "dhcp\n", "\n"]),
+            ]
+
+    @patch("uciparse.gitfilter.filter_process")
+    def test_git_filter(self, filter_process):
+        with patch("sys.argv", ["uciparse", "--git-filter"]):
+            parse()
+            filter_process.assert_called_once_with(sys.stdin.buffer, sys.stdout.buffer)
+
+    @patch("uciparse.cli.sys.stdout.write")
+    @patch("uciparse.gitfilter.textconv")
+    def test_textconv(self, textconv, write):
+        textconv.return_value = "normalized"
+        with patch("sys.argv", ["uciparse", "--textconv", "file"]):
+            parse()
+            textconv.assert_called_once_with("file")
+            write.assert_called_once_with("normalized")
+
+    @patch("uciparse.cli.sys.stdout.write")
+    @patch("uciparse.server.UciClient")
+    def test_connect(self, uciclient, write):
+        client = uciclient.return_value.__enter__.return_value
+        client.normalize.return_value = "normalized"
+        with patch("sys.argv", ["uciparse", "--connect", "socket", "file"]):
+            parse()
+            uciclient.assert_called_once_with("socket")
+            client.normalize.assert_called_once_with(path="file", source="uci")
+            write.assert_called_once_with("normalized")
+
+    @patch("uciparse.cli.sys.stdin")
+    @patch("uciparse.cli.sys.stdout.write")
+    @patch("uciparse.server.UciClient")
+    def test_connect_stdin(self, uciclient, write, stdin):
+        client = uciclient.return_value.__enter__.return_value
+        client.normalize.return_value = "normalized"
+        stdin.read.return_value = "text"
+        with patch("sys.argv", ["uciparse", "--connect", "socket", "--from", "show", "-"]):
+            parse()
+            client.normalize.assert_called_once_with(text="text", source="show")
+            write.assert_called_once_with("normalized")
+
+    @patch("uciparse.cli.sys.stderr.write")
+    @patch("uciparse.server.UciClient")
+    def test_connect_error(self, uciclient, write):
+        client = uciclient.return_value.__enter__.return_value
+        client.normalize.side_effect = UciParseError(message="Hello")
+        with patch("sys.argv", ["uciparse", "--connect", "socket", "file"]):
+            with pytest.raises(SystemExit):
+                parse()
+            write.assert_called_once_with("Hello\n")
+
+    def test_canonical(self, tmp_path):
+        (tmp_path / "network").write_text(
+            "config interface wan\n  option proto dhcp\nconfig interface lan\n  option b 2\n  option a 1\n"
+        )
+        with patch("sys.argv", ["uciparse", "--canonical", str(tmp_path / "network")]):
+            with patch("sys.stdout", new_callable=io.StringIO) as stdout:
+                parse()
+                assert stdout.getvalue() == (
+                    "\nconfig interface lan\n    option a '1'\n    option b '2'\n\nconfig interface wan\n    option proto 'dhcp'\n"
+                )
+
+    @pytest.mark.parametrize("option", [["--connect", "socket"], ["--textconv"], ["--schema", "schema.json"]])
+    def test_canonical_combined(self, option):
+        with patch("sys.argv", ["uciparse", "--canonical", *option, "file"]):
+            with pytest.raises(SystemExit) as e:
+                parse()
+            assert e.value.code == 2
+
+    def test_profile(self, tmp_path):
+        (tmp_path / "network").write_text("package network\nconfig interface lan\n")
+        out = tmp_path / "out.pstats"
+        with patch("sys.argv", ["uciparse", "--profile", str(out), str(tmp_path / "network")]):
+            with patch("sys.stdout", new_callable=io.StringIO), patch("sys.stderr", new_callable=io.StringIO) as stderr:
+                parse()
+                report = stderr.getvalue()
+        assert report.splitlines()[1].startswith("parse ")
+        assert report.splitlines()[2].startswith("normalize ")
+        assert report.endswith(f"Profile of 1 process written to {out}\n")
+        assert pstats.Stats(str(out)).total_calls
+
+    def test_two_files(self):
+        with patch("sys.argv", ["uciparse", "a", "b"]):
+            with pytest.raises(SystemExit):
+                parse()
+
+    def test_schema(self, tmp_path):
+        (tmp_path / "schema.json").write_text('{"network": {"interface": {"mtu": {"type": "int"}, "auto": {"type": "bool"}}}}')
+        devices = tmp_path / "devices"
+        devices.mkdir()
+        (devices / "network").write_text("config interface lan\n    option mtu big\n    option auto ture\n")
+        (devices / "other").write_text("package network\nconfig interface lan\n    option mtu 1500\n")
+        (tmp_path / "bogus").write_text("bogus\n")
+        argv = ["uciparse", "--schema", str(tmp_path / "schema.json"), str(devices), str(tmp_path / "bogus")]
+        with patch("sys.argv", argv), patch("sys.stdout", new_callable=io.StringIO) as stdout:
+            with pytest.raises(SystemExit) as e:
+                parse()
+            assert e.value.code == 1
+            assert stdout.getvalue() == (
+                f"{devices / 'network'}: lan.mtu: invalid value 'big', expected an integer\n"
+                f"{devices / 'network'}: lan.auto: invalid value 'ture', expected a boolean\n"
+                f"{tmp_path / 'bogus'}: error: Error on line 1: unrecognized line type\n"
+            )
+
+    def test_schema_valid(self, tmp_path):
+        (tmp_path / "schema.json").write_text('{"network": {"interface": {"mtu": {"type": "int"}}}}')
+        (tmp_path / "network").write_text("config interface lan\n    option mtu 1500\n")
+        with patch("sys.argv", ["uciparse", "--schema", str(tmp_path / "schema.json"), str(tmp_path / "network")]):
+            with patch("sys.stdout", new_callable=io.StringIO) as stdout:
+                parse()
+                assert not stdout.getvalue()
+
+    @patch("uciparse.cli.sys.stderr.write")
+    def test_schema_invalid(self, write, tmp_path):
+        (tmp_path / "schema.json").write_text('{"network": {"interface": {"mtu": {"type": "float"}}}}')
+        with patch("sys.argv", ["uciparse", "--schema", str(tmp_path / "schema.json"), "network"]):
+            with pytest.raises(SystemExit):
+                parse()
+            write.assert_called_once_with("Invalid schema for network.interface.mtu: unknown type 'float'\n")
+
+    def test_schema_combined(self):
+        with patch("sys.argv", ["uciparse", "--schema", "schema.json", "--archive", "backup.tar.gz"]):
+            with pytest.raises(SystemExit):
+                parse()
+
 
 class TestUciDiff:
     """
@@ -88,9 +367,9 @@ def test_one_file(self):
             with pytest.raises(SystemExit):
                 diff()
 
-    @patch("uciparse.cli.difflib.unified_diff")
+    @patch("uciparse.diff.unified_diff")
     @patch("uciparse.cli.sys.stdout.writelines")
-    @patch("uciparse.cli.UciFile")
+    @patch("uciparse.uci.UciFile")
     def test_file(self, ucifile, writelines, unified_diff):
         with patch("sys.argv", ["ucidiff", "a", "b"]):
             left = MagicMock()
@@ -105,7 +384,7 @@ def test_file(self, ucifile, writelines, unified_diff):
             unified_diff.assert_called_once_with(a=["left"], b=["right"], fromfile="a", tofile="b")
 
     @patch("uciparse.cli.sys.stderr.write")
-    @patch("uciparse.cli.UciFile")
+    @patch("uciparse.uci.UciFile")
     def test_error(self, ucifile, write):
         with patch("sys.argv", ["ucidiff", "a", "b"]):
             exception = UciParseError(message="Hello")
@@ -114,3 +393,370 @@ def test_error(self, ucifile, write):
                 diff()
             ucifile.from_file.assert_called_once_with("a")
             write.assert_called_once_with("Hello\n")
+
+    @patch("uciparse.cli.sys.stdout.write")
+    @patch("uciparse.server.UciClient")
+    def test_connect(self, uciclient, write):
+        client = uciclient.return_value.__enter__.return_value
+        client.diff.return_value = "diff"
+        with patch("sys.argv", ["ucidiff", "--connect", "socket", "a", "b"]):
+            diff()
+            uciclient.assert_called_once_with("socket")
+            client.diff.assert_called_once_with("a", "b")
+            write.assert_called_once_with("diff")
+
+    @patch("uciparse.cli.sys.stdout.writelines")
+    @patch("uciparse.archive.read_archive")
+    def test_archive(self, read_archive, writelines):
+        def files(lines):
+            uci = MagicMock()
+            uci.normalized.return_value = lines
+            return uci
+
+        read_archive.side_effect = [
+            iter([("network", files(["same\n", "a\n"])), ("wireless", files(["gone\n"]))]),
+            iter([("network", files(["same\n", "b\n"])), ("dhcp", files(["new\n"]))]),
+        ]
+        with patch("sys.argv", ["ucidiff", "--archive", "a.tar.gz", "b.tar.gz"]):
+            diff()
+            assert read_archive.call_args_list == [call("a.tar.gz"), call("b.tar.gz")]
+            assert "".join(writelines.call_args[0][0]) == (
+                "--- a.tar.gz:dhcp\n+++ b.tar.gz:dhcp\n@@ -0,0 +1 @@\n+new\n"
+                "--- a.tar.gz:network\n+++ b.tar.gz:network\n@@ -1,2 +1,2 @@\n same\n-a\n+b\n"
+                "--- a.tar.gz:wireless\n+++ b.tar.gz:wireless\n@@ -1 +0,0 @@\n-gone\n"
+            )
+
+    @patch("uciparse.cli.sys.stdout.writelines")
+    def test_batch(self, writelines, tmp_path):
+        (tmp_path / "a").write_text("package network\nconfig interface lan\n  option proto static\n")
+        (tmp_path / "b").write_text("package network\nconfig interface lan\n  option proto dhcp\nconfig rule\n")
+        with patch("sys.argv", ["ucidiff", "--format", "uci-batch", str(tmp_path / "a"), str(tmp_path / "b")]):
+            diff()
+            writelines.assert_called_once_with(["set network.lan.proto='dhcp'\n", "add network rule\n"])
+
+    @patch("uciparse.cli.sys.stdout.writelines")
+    def test_batch_no_package(self, writelines, tmp_path):
+        (tmp_path / "a").write_text("config rule\n")
+        (tmp_path / "firewall").write_text("")
+        with patch("sys.argv", ["ucidiff", "--format", "uci-batch", str(tmp_path / "a"), str(tmp_path / "firewall")]):
+            diff()
+            writelines.assert_called_once_with(["delete firewall.@rule[0]\n"])
+
+    @patch("uciparse.cli.sys.stderr.write")
+    @patch("uciparse.batch.verify_commands")
+    def test_batch_unverified(self, verify_commands, write, tmp_path):
+        (tmp_path / "a").write_text("package network\n")
+        (tmp_path / "b").write_text("package network\nconfig rule\n")
+        verify_commands.return_value = False
+        with patch("sys.argv", ["ucidiff", "--format", "uci-batch", str(tmp_path / "a"), str(tmp_path / "b")]):
+            with pytest.raises(SystemExit):
+                diff()
+            write.assert_called_once_with(f"Generated commands do not reproduce {tmp_path / 'b'}\n")
+
+    def test_batch_archive(self):
+        with patch("sys.argv", ["ucidiff", "--format", "uci-batch", "--archive", "a.tar.gz", "b.tar.gz"]):
+            with pytest.raises(SystemExit):
+                diff()
+
+    def test_three_files(self):
+        with patch("sys.argv", ["ucidiff", "a", "b", "c"]):
+            with pytest.raises(SystemExit):
+                diff()
+
+    @pytest.mark.parametrize("option", [["--connect", "socket"], ["--archive"], ["--format", "uci-batch"]])
+    def test_against_combined(self, option):
+        with patch("sys.argv", ["ucidiff", *option, "--against", "golden", "a"]):
+            with pytest.raises(SystemExit):
+                diff()
+
+    @pytest.mark.parametrize("jobs", ["1", "2"])
+    def test_against(self, jobs, tmp_path):
+        (tmp_path / "golden").write_text("package network\nconfig interface lan\n  option proto static\n")
+        devices = tmp_path / "devices"
+        devices.mkdir()
+        (devices / "a").write_text("package network\nconfig interface lan\n  option proto 'static'\n")
+        (devices / "b").write_text("package network\nconfig interface lan\n  option proto dhcp\nconfig rule\n")
+        (devices / "c").write_text("bogus\n")
+        (tmp_path / "d").write_text("package network\nconfig interface lan\n  option proto dhcp\n")
+        argv = ["ucidiff", "--jobs", jobs, "--against", str(tmp_path / "golden"), str(devices), str(tmp_path / "d")]
+        with patch("sys.argv", argv), patch("sys.stdout", new_callable=io.StringIO) as stdout:
+            with pytest.raises(SystemExit) as e:
+                diff()
+            assert e.value.code == 1
+            assert stdout.getvalue() == (
+                f"{devices / 'b'}: lan.proto: is 'dhcp', expected 'static'\n"
+                f"{devices / 'b'}: @rule[0]: unexpected section\n"
+                f"{devices / 'c'}: error: Error on line 1: unrecognized line type\n"
+                f"{tmp_path / 'd'}: lan.proto: is 'dhcp', expected 'static'\n"
+                f"Summary: 3 of 4 devices deviate from {tmp_path / 'golden'}\n"
+                "      2 lan.proto\n"
+                "      1 @rule[0]\n"
+            )
+
+    def test_trace_memory(self, tmp_path):
+        (tmp_path / "a").write_text("package network\nconfig interface lan\n")
+        (tmp_path / "b").write_text("package network\nconfig interface wan\n")
+        with patch("sys.argv", ["ucidiff", "--trace-memory", str(tmp_path / "a"), str(tmp_path / "b")]):
+            with patch("sys.stdout", new_callable=io.StringIO), patch("sys.stderr", new_callable=io.StringIO) as stderr:
+                diff()
+                report = stderr.getvalue()
+        assert [line.split()[0] for line in report.splitlines()[1:4]] == ["parse", "normalize", "diff"]
+        assert "Peak traced memory: " in report
+        assert " uci.py:" in report
+
+    @pytest.mark.parametrize("jobs", ["1", "2"])
+    def test_against_profile(self, jobs, tmp_path):
+        (tmp_path / "golden").write_text("package network\nconfig interface lan\n")
+        for name in ("a", "b", "c"):
+            (tmp_path / name).write_text("package network\nconfig interface lan\n")
+        out = tmp_path / "out.pstats"
+        argv = ["ucidiff", "--jobs", jobs, "--profile", str(out), "--against", str(tmp_path / "golden")]
+        with patch("sys.argv", [*argv, *(str(tmp_path / name) for name in ("a", "b", "c"))]):
+            with patch("sys.stdout", new_callable=io.StringIO), patch("sys.stderr", new_callable=io.StringIO) as stderr:
+                diff()
+                report = stderr.getvalue()
+        processes = int(re.search(r"Profile of (\d+) process", report)[1])
+        assert processes == 1 if jobs == "1" else processes > 1  # the workers' profiles are merged in
+        assert any(function[2] == "_check" for function in pstats.Stats(str(out)).stats)
+
+    def test_against_match(self, tmp_path):
+        (tmp_path / "golden").write_text("package network\nconfig interface lan\n")
+        (tmp_path / "a").write_text("package network\n\nconfig interface 'lan'\n")
+        with patch("sys.argv", ["ucidiff", "--against", str(tmp_path / "golden"), str(tmp_path / "a")]):
+            with patch("sys.stdout", new_callable=io.StringIO) as stdout:
+                diff()
+                assert stdout.getvalue() == f"Summary: 0 of 1 devices deviate from {tmp_path / 'golden'}\n"
+
+
+class TestUciMerge:
+    """
+    Unit tests for the ucimerge script.
+    """
+
+    def test_h(self):
+        with patch("sys.argv", ["ucimerge", "-h"]):
+            with pytest.raises(SystemExit):
+                merge()
+
+    def test_help(self):
+        with patch("sys.argv", ["ucimerge", "--help"]):
+            with pytest.raises(SystemExit):
+                merge()
+
+    def test_no_overlay(self):
+        with patch("sys.argv", ["ucimerge", "base"]):
+            with pytest.raises(SystemExit):
+                merge()
+
+    @patch("uciparse.cli.sys.stderr.writelines")
+    @patch("uciparse.cli.sys.stdout.writelines")
+    @patch("uciparse.uci.UciFile")
+    def test_merge(self, ucifile, writelines, stderr):
+        with patch("sys.argv", ["ucimerge", "base", "site", "device"]):
+            base, site, device = MagicMock(), MagicMock(), MagicMock()
+            ucifile.from_file.side_effect = [base, site, device]
+            result = MagicMock(conflicts=[])
+            result.file.normalized.return_value = ["merged"]
+            ucifile.merge.return_value = result
+            merge()
+            ucifile.from_file.assert_has_calls([call("base"), call("site"), call("device")])
+            ucifile.merge.assert_called_once_with(base, site, device, lists="replace")
+            writelines.assert_called_once_with(["merged"])
+            stderr.assert_not_called()
+
+    @patch("uciparse.cli.sys.stdout.writelines")
+    @patch("uciparse.uci.UciFile")
+    def test_append_lists(self, ucifile, writelines):
+        with patch("sys.argv", ["ucimerge", "--append-lists", "base", "site"]):
+            base, site = MagicMock(), MagicMock()
+            ucifile.from_file.side_effect = [base, site]
+            result = MagicMock(conflicts=[])
+            result.file.normalized.return_value = ["merged"]
+            ucifile.merge.return_value = result
+            merge()
+            ucifile.merge.assert_called_once_with(base, site, lists="append")
+            writelines.assert_called_once_with(["merged"])
+
+    @patch("uciparse.cli.sys.stderr.writelines")
+    @patch("uciparse.cli.sys.stdout.writelines")
+    @patch("uciparse.uci.UciFile")
+    def test_conflicts(self, ucifile, writelines, stderr):
+        with patch("sys.argv", ["ucimerge", "base", "site"]):
+            result = MagicMock(conflicts=["lan: conflict"])
+            result.file.normalized.return_value = ["merged"]
+            ucifile.merge.return_value = result
+            with pytest.raises(SystemExit) as e:
+                merge()
+            assert e.value.code == 1
+            writelines.assert_called_once_with(["merged"])
+            assert list(stderr.call_args.args[0]) == ["Conflict: lan: conflict\n"]
+
+    @patch("uciparse.cli.sys.stdout.writelines")
+    @patch("uciparse.merge.merge3")
+    @patch("uciparse.uci.UciFile")
+    def test_three_way(self, ucifile, merge3, writelines):
+        with patch("sys.argv", ["ucimerge", "-3", "base", "ours", "theirs"]):
+            base, ours, theirs = MagicMock(), MagicMock(), MagicMock()
+            ucifile.from_file.side_effect = [base, ours, theirs]
+            result = MagicMock(conflicts=[])
+            result.file.normalized.return_value = ["merged"]
+            merge3.return_value = result
+            merge()
+            merge3.assert_called_once_with(base, ours, theirs, labels=("ours", "theirs"))
+            ucifile.merge.assert_not_called()
+            writelines.assert_called_once_with(["merged"])
+
+    def test_three_way_wrong_files(self):
+        with patch("sys.argv", ["ucimerge", "--three-way", "base", "ours"]):
+            with pytest.raises(SystemExit):
+                merge()
+        with patch("sys.argv", ["ucimerge", "--three-way", "base", "ours", "theirs", "other"]):
+            with pytest.raises(SystemExit):
+                merge()
+
+    @patch("uciparse.cli.sys.stderr.write")
+    @patch("uciparse.uci.UciFile")
+    def test_error(self, ucifile, write):
+        with patch("sys.argv", ["ucimerge", "base", "site"]):
+            exception = UciParseError(message="Hello")
+            ucifile.from_file.side_effect = exception
+            with pytest.raises(SystemExit):
+                merge()
+            ucifile.from_file.assert_called_once_with("base")
+            write.assert_called_once_with("Hello\n")
+
+
+class TestUciApply:
+    """
+    Unit tests for the uciapply script.
+    """
+
+    def test_h(self):
+        with patch("sys.argv", ["uciapply", "-h"]):
+            with pytest.raises(SystemExit):
+                apply()
+
+    def test_no_file(self):
+        with patch("sys.argv", ["uciapply"]):
+            with pytest.raises(SystemExit):
+                apply()
+
+    @patch("uciparse.cli.sys.stdout.writelines")
+    def test_apply(self, writelines, tmp_path):
+        (tmp_path / "network").write_text("package network\nconfig interface lan\n  option proto static\n")
+        commands = io.StringIO("set network.lan.proto='dhcp'\nadd network rule\nset network.@rule[-1].name=x\ncommit\n")
+        with patch("sys.argv", ["uciapply", str(tmp_path / "network")]), patch("sys.stdin", commands):
+            apply()
+            writelines.assert_called_once_with([
+                "package network\n",
+                "\n",
+                "config interface lan\n",
+                "    option proto 'dhcp'\n",
+                "\n",
+                "config rule\n",
+                "    option name 'x'\n",
+            ])
+
+    @patch("uciparse.cli.sys.stdout.writelines")
+    @patch("uciparse.cli.sys.stderr.write")
+    def test_error(self, write, writelines, tmp_path):
+        (tmp_path / "network").write_text("package network\n")
+        with patch("sys.argv", ["uciapply", str(tmp_path / "network")]), patch("sys.stdin", io.StringIO("delete network.lan\n")):
+            with pytest.raises(SystemExit):
+                apply()
+            write.assert_called_once_with("Error on line 1: section not found: lan\n")
+            writelines.assert_not_called()
+
+
+class TestUciLint:
+    """
+    Unit tests for the ucilint script.
+    """
+
+    def test_h(self):
+        with patch("sys.argv", ["ucilint", "-h"]):
+            with pytest.raises(SystemExit):
+                lint()
+
+    def test_no_file(self):
+        with patch("sys.argv", ["ucilint"]):
+            with pytest.raises(SystemExit) as e:
+                lint()
+            assert e.value.code == 2
+
+    def test_unknown_rule(self, tmp_path):
+        with patch("sys.argv", ["ucilint", "--disable", "bogus", str(tmp_path)]):
+            with pytest.raises(SystemExit) as e:
+                lint()
+            assert e.value.code == 2
+
+    def test_list_rules(self):
+        with patch("sys.argv", ["ucilint", "--list-rules"]), patch("sys.stdout", new_callable=io.StringIO) as stdout:
+            lint()
+            lines = stdout.getvalue().splitlines()
+            assert lines[0] == "syntax                   a line can't be parsed"
+            assert [line.split()[0] for line in lines[1:]] == [
+                "package-name",
+                "outside-section",
+                "duplicate-section",
+                "duplicate-option",
+                "option-list-collision",
+            ]
+
+    @pytest.mark.parametrize("jobs", ["1", "2"])
+    def test_lint(self, jobs, tmp_path):
+        config = tmp_path / "config"
+        config.mkdir()
+        (config / "network").write_text("package network\nconfig interface lan\n  option proto static\n")
+        (config / "firewall").write_text("package network\nconfig rule\n  option a b\n  option a c\n")
+        (tmp_path / "dhcp").write_text("bogus\n")
+        argv = ["ucilint", "--jobs", jobs, str(config), str(tmp_path / "dhcp"), str(tmp_path / "missing")]
+        with patch("sys.argv", argv), patch("sys.stdout", new_callable=io.StringIO) as stdout:
+            with pytest.raises(SystemExit) as e:
+                lint()
+            assert e.value.code == 1
+            output = stdout.getvalue().splitlines()
+            assert output[:3] == [
+                f"{config / 'firewall'}:1: package network does not match file name firewall [package-name]",
+                f"{config / 'firewall'}:4: option a is already set on line 3 [duplicate-option]",
+                f"{tmp_path / 'dhcp'}:1: unrecognized line type [syntax]",
+            ]
+            assert output[3].startswith(f"{tmp_path / 'missing'}: error: ")
+            assert len(output) == 4
+
+    def test_disable(self, tmp_path):
+        (tmp_path / "firewall").write_text("package network\nconfig rule\n")
+        with patch("sys.argv", ["ucilint", "--disable", "package-name", str(tmp_path / "firewall")]):
+            with patch("sys.stdout", new_callable=io.StringIO) as stdout:
+                lint()
+                assert not stdout.getvalue()
+
+
+class TestStartup:
+    """
+    Startup tests for the command-line interface.
+    """
+
+    def test_deferred_imports(self, tmp_path):
+        code = "import sys, uciparse.cli; sys.stderr.write(' '.join(sys.modules))"
+        loaded = _python(tmp_path, "-c", code).split()
+        for module in DEFERRED:
+            assert module not in loaded
+
+    @pytest.mark.parametrize("command", ["parse", "diff"])
+    def test_command_deferred_imports(self, tmp_path, command):
+        code = f"{_command(tmp_path, command)}; sys.stderr.write(' '.join(sys.modules))"
+        loaded = _python(tmp_path, "-c", code).split()
+        for module in DEFERRED:
+            assert module in NEEDED[command] or module not in loaded
+
+    @pytest.mark.parametrize("command", ["parse", "diff"])
+    def test_import_budget(self, tmp_path, command):
+        startup = _import_times(tmp_path, "pass")
+        code = _command(tmp_path, command)
+
+        def measure() -> int:
+            return sum(time for module, time in _import_times(tmp_path, code).items() if module not in startup)
+
+        measure()  # warm up, so the bytecode cache is populated
+        assert min(measure() for _ in range(3)) < IMPORT_BUDGET
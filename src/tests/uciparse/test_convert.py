@@ -0,0 +1,181 @@
+# vim: set ft=python ts=4 sw=4 expandtab:
+
+import json
+
+import pytest
+
+from uciparse.convert import from_json, from_show, is_identifier, split_value
+from uciparse.uci import UciParseError
+
+SHOW = """network.loopback=interface
+network.loopback.device='lo'
+network.lan=interface
+network.lan.ipaddr='192.168.1.1'
+network.lan.dns='8.8.8.8' '1.1.1.1'
+network.lan.description='it'\\''s the lan'
+network.@rule[0]=rule
+network.@rule[0].name='Allow-Ping'
+network.cfg0a1b2c=rule
+network.cfg0a1b2c.name=''
+dhcp.lan=dhcp
+dhcp.lan.interface='lan'
+"""
+
+NETWORK = """package network
+
+config interface loopback
+    option device 'lo'
+
+config interface lan
+    option ipaddr '192.168.1.1'
+    list dns '8.8.8.8'
+    list dns '1.1.1.1'
+    option description "it's the lan"
+
+config rule
+    option name 'Allow-Ping'
+
+config rule
+    option name ''
+"""
+
+DHCP = """package dhcp
+
+config dhcp lan
+    option interface 'lan'
+"""
+
+
+class TestUtil:
+    """Unit tests utility functions."""
+
+    def testsplit_value(self):
+        assert split_value("''") == [""]
+        assert split_value("'value'") == ["value"]
+        assert split_value("value") == ["value"]
+        assert split_value("'one' 'two'") == ["one", "two"]
+        assert split_value("'one'  \t'two' three") == ["one", "two", "three"]
+        assert split_value("'it'\\''s'") == ["it's"]
+        assert split_value("\"double\" 'single'") == ["double", "single"]
+        assert split_value("a\\ b") == ["a b"]
+        assert split_value("") == []
+
+    def test_is_identifier(self):
+        assert is_identifier("lan_2-a")
+        assert not is_identifier("")
+        assert not is_identifier("a.b")
+        assert not is_identifier("a b")
+
+    def test_split_value_invalid(self):
+        with pytest.raises(ValueError, match=r"unbalanced quotes"):
+            split_value("'value")
+        with pytest.raises(ValueError, match=r"trailing escape character"):
+            split_value("value\\")
+
+
+class TestFromShow:
+    """Unit tests for from_show()."""
+
+    def test_empty(self):
+        assert not list(from_show([]))
+
+    def test_packages(self):
+        files = list(from_show(SHOW.splitlines(keepends=True)))
+        assert len(files) == 2
+        assert "".join(files[0].normalized()) == NETWORK
+        assert "".join(files[1].normalized()) == DHCP
+
+    def test_blank_lines(self):
+        files = list(from_show(["\n", "dhcp.lan=dhcp\n", "  \n", "dhcp.lan.interface='lan'\n"]))
+        assert len(files) == 1
+        assert "".join(files[0].normalized()) == DHCP
+
+    def test_streaming(self):
+        # the first package must be available before the rest of the input is consumed
+        def lines():
+            yield "dhcp.lan=dhcp\n"
+            yield "dhcp.lan.interface='lan'\n"
+            yield "network.lan=interface\n"
+            raise AssertionError("read too far")
+
+        assert "".join(next(from_show(lines())).normalized()) == DHCP
+
+    @pytest.mark.parametrize(
+        "line,message",
+        [
+            ["garbage", r"Error on line 1: invalid uci show line"],
+            ["network.lan", r"Error on line 1: invalid uci show line"],
+            ["network.lan='inter face'", r"Error on line 1: invalid section type"],
+            ["network.lan=a b", r"Error on line 1: invalid section type"],
+            ["network.lan.ipaddr='x'", r"Error on line 1: option for unknown section lan"],
+            ["network.lan='interface", r"Error on line 1: invalid value: unbalanced quotes"],
+            ["network.lan=interface\nnetwork.lan.ipaddr=", r"Error on line 2: missing value for option ipaddr"],
+            ["network.lan=interface\nnetwork.lan=interface", r"Error on line 2: duplicate section lan"],
+            ["network.@rule[0]=rule\nnetwork.@rule[0]=rule", r"Error on line 2: duplicate section @rule\[0\]"],
+        ],
+    )
+    def test_invalid(self, line, message):
+        with pytest.raises(UciParseError, match=message):
+            list(from_show(line.splitlines()))
+
+
+class TestFromJson:
+    """Unit tests for from_json()."""
+
+    def test_values(self):
+        data = {
+            "values": {
+                "lan": {
+                    ".anonymous": False,
+                    ".type": "interface",
+                    ".name": "lan",
+                    ".index": 1,
+                    "ipaddr": "192.168.1.1",
+                    "dns": ["8.8.8.8", "1.1.1.1"],
+                    "description": "it's the lan",
+                },
+                "cfg0a1b2c": {".anonymous": True, ".type": "rule", ".name": "cfg0a1b2c", ".index": 2, "name": ""},
+                "cfg030e4d": {".anonymous": True, ".type": "rule", ".name": "cfg030e4d", ".index": 3, "name": "Allow-Ping"},
+                "loopback": {".anonymous": False, ".type": "interface", ".name": "loopback", ".index": 0, "device": "lo"},
+            }
+        }
+        expected = NETWORK.replace(
+            "    option name 'Allow-Ping'\n\nconfig rule\n    option name ''\n",
+            "    option name ''\n\nconfig rule\n    option name 'Allow-Ping'\n",
+        )
+        assert "".join(from_json(data, package="network").normalized()) == expected
+        assert "".join(from_json(json.dumps(data), package="network").normalized()) == expected
+
+    def test_no_wrapper(self):
+        data = '{"lan": {".type": "dhcp", "interface": "lan"}}'
+        assert "".join(from_json(data, package="dhcp").normalized()) == DHCP
+        assert "".join(from_json(data).normalized()) == DHCP.replace("package dhcp\n", "")
+
+    def test_scalars(self):
+        data = {"main": {".type": "system", "enabled": True, "disabled": False, "port": 22, "ratio": 0.5}}
+        assert from_json(data).normalized() == [
+            "\n",
+            "config system main\n",
+            "    option enabled '1'\n",
+            "    option disabled '0'\n",
+            "    option port '22'\n",
+            "    option ratio '0.5'\n",
+        ]
+
+    @pytest.mark.parametrize(
+        "data,message",
+        [
+            ["{", r"Invalid JSON: "],
+            ["[]", r"Invalid JSON: expected an object"],
+            ['{"values": []}', r"Invalid JSON: expected an object of sections"],
+            ['{"lan": []}', r"Error in section lan: expected an object"],
+            ['{"lan": {}}', r"Error in section lan: invalid section type"],
+            ['{"lan": {".type": "a b"}}', r"Error in section lan: invalid section type"],
+            ['{"lan": {".type": "dhcp", ".name": "a b"}}', r"Error in section lan: invalid section name"],
+            ['{"lan": {".type": "dhcp", "a b": "x"}}', r"Error in section lan: invalid option name 'a b'"],
+            ['{"lan": {".type": "dhcp", "x": {}}}', r"Error in section lan: unsupported value \{\}"],
+        ],
+    )
+    def test_invalid(self, data, message):
+        with pytest.raises(UciParseError, match=message):
+            from_json(data)
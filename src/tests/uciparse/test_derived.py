@@ -0,0 +1,168 @@
+# vim: set ft=python ts=4 sw=4 expandtab:
+
+import copy
+import gc
+import tracemalloc
+
+import pytest
+
+from uciparse.derived import UciDerivedFile
+from uciparse.uci import UciFile
+
+TEMPLATE = """package network
+
+config interface loopback
+    option proto 'static'  # comment
+    option ipaddr '127.0.0.1'
+
+config interface lan
+    option proto 'static'
+    option ipaddr '192.168.1.1'
+    list dns '8.8.8.8'
+    list dns '8.8.4.4'
+
+config rule
+    option name 'one'
+"""
+
+
+@pytest.fixture
+def template() -> UciFile:
+    return UciFile.from_text(TEMPLATE)
+
+
+def expected(text: str) -> list[str]:
+    """Return the normalized form of a file."""
+    return UciFile.from_text(text).normalized()
+
+
+class TestUciDerivedFile:
+    """Unit tests for UciDerivedFile."""
+
+    def test_unchanged(self, template):
+        derived = template.derive()
+        assert isinstance(derived, UciDerivedFile)
+        assert derived.normalized() == template.normalized()
+        assert all(left is right for left, right in zip(derived.lines, template.lines, strict=True))
+        assert [section.key for section in derived.sections()] == ["", "loopback", "lan", "@rule[0]"]
+
+    def test_set(self, template):
+        derived = template.derive()
+        derived.set("lan", "ipaddr", "10.0.0.1")
+        derived.set("loopback", "proto", "dhcp")
+        derived.set("@rule[0]", "target", "ACCEPT")
+        assert derived.normalized() == expected(
+            TEMPLATE.replace("192.168.1.1", "10.0.0.1")
+            .replace("'static'  # comment", "'dhcp'  # comment")
+            .replace("'one'\n", "'one'\n    option target 'ACCEPT'\n")
+        )
+        assert template.normalized() == expected(TEMPLATE)  # the template is never changed
+
+    def test_set_list(self, template):
+        derived = template.derive()
+        derived.set("lan", "dns", ["1.1.1.1"])
+        derived.set("lan", "proto", ["a", "b"])
+        assert derived.section("lan").options() == {"proto": ["a", "b"], "ipaddr": "192.168.1.1", "dns": ["1.1.1.1"]}
+
+    def test_shares_unchanged(self, template):
+        derived = template.derive()
+        derived.set("lan", "ipaddr", "10.0.0.1")
+        lines = derived.lines
+        changed = [i for i, line in enumerate(lines) if line is not template.lines[i]]
+        assert changed == [6]
+        assert derived._changed.keys() == {2}
+
+    def test_independent(self, template):
+        first, second = template.derive(), template.derive()
+        first.set("lan", "ipaddr", "10.0.0.1")
+        second.delete("lan", "dns")
+        assert first.section("lan").options()["dns"] == ["8.8.8.8", "8.8.4.4"]
+        assert second.section("lan").options()["ipaddr"] == "192.168.1.1"
+
+    def test_delete(self, template):
+        derived = template.derive()
+        derived.delete("lan", "dns")
+        derived.delete("loopback")
+        derived.delete("lan", "missing")
+        assert derived.normalized() == expected(
+            TEMPLATE.replace("    list dns '8.8.8.8'\n    list dns '8.8.4.4'\n", "").replace(
+                "config interface loopback\n    option proto 'static'  # comment\n    option ipaddr '127.0.0.1'\n", ""
+            )
+        )
+        assert [section.key for section in derived.sections()] == ["", "lan", "@rule[0]"]
+        with pytest.raises(ValueError, match=r"^Unknown section: loopback$"):
+            derived.set("loopback", "proto", "dhcp")
+
+    def test_unknown(self, template):
+        with pytest.raises(ValueError, match=r"^Unknown section: wan$"):
+            template.derive().set("wan", "proto", "dhcp")
+        with pytest.raises(ValueError, match=r"^Unknown section: wan$"):
+            template.derive().section("wan")
+
+    def test_add(self, template):
+        derived = template.derive()
+        assert derived.add("interface", "wan") == "wan"
+        assert derived.add("rule") == "@rule[1]"
+        derived.set("wan", "proto", "dhcp")
+        derived.set("@rule[1]", "name", "two")
+        assert derived.normalized() == expected(
+            TEMPLATE + "config interface wan\n    option proto dhcp\nconfig rule\n    option name two\n"
+        )
+        with pytest.raises(ValueError, match=r"^Section already exists: lan$"):
+            derived.add("interface", "lan")
+
+    def test_add_named_then_anonymous(self, template):
+        derived = template.derive()
+        derived.add("rule", "named")
+        assert derived.add("rule") == "@rule[2]"
+        derived.set("@rule[2]", "name", "three")
+        assert [section.key for section in derived.sections()] == [section.key for section in derived.to_file().sections()]
+
+    def test_duplicate(self):
+        text = TEMPLATE + "\nconfig interface lan\n    option ipaddr '10.0.0.1'\n"
+        template = UciFile.from_text(text)
+        derived = template.derive()
+        with pytest.raises(ValueError, match=r"^Section is defined more than once: lan$"):
+            derived.set("lan", "ipaddr", "10.0.0.2")
+        with pytest.raises(ValueError, match=r"^Section is defined more than once: lan$"):
+            derived.delete("lan")
+        with pytest.raises(ValueError, match=r"^Section already exists: lan$"):
+            derived.add("interface", "lan")
+        derived.set("loopback", "proto", "none")
+        assert derived.normalized() == expected(text.replace("'static'  # comment", "'none'  # comment"))
+
+    def test_add_deleted(self, template):
+        derived = template.derive()
+        derived.add("interface", "wan")
+        derived.delete("wan")
+        derived.delete("lan")
+        derived.add("interface", "lan")
+        derived.add("interface", "wan")
+        assert [section.key for section in derived.sections()] == ["", "loopback", "@rule[0]", "lan", "wan"]
+        assert derived.to_file().normalized() == derived.normalized()
+
+    def test_to_file(self, template):
+        derived = template.derive()
+        derived.set("lan", "ipaddr", "10.0.0.1")
+        ucifile = derived.to_file()
+        assert ucifile.normalized() == derived.normalized()
+        assert ucifile.fingerprint() != template.fingerprint()
+
+    def test_memory(self):
+        template = UciFile.from_text(TEMPLATE + "".join(f"\nconfig rule\n    option name 'rule{i}'\n" for i in range(200)))
+        devices = 1000
+        gc.collect()
+        tracemalloc.start()
+        derived = [template.derive() for _ in range(devices)]
+        for index, file in enumerate(derived):
+            file.set("lan", "ipaddr", f"10.0.{index // 256}.{index % 256}")
+        derived_size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        gc.collect()
+        tracemalloc.start()
+        copies = [copy.deepcopy(template) for _ in range(devices // 10)]
+        copied_size = tracemalloc.get_traced_memory()[0] * 10
+        tracemalloc.stop()
+        assert len(copies) == devices // 10
+        assert derived_size * 10 < copied_size
+        assert "    option ipaddr '10.0.0.5'\n" in derived[5].normalized()
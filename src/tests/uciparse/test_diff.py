@@ -0,0 +1,85 @@
+# vim: set ft=python ts=4 sw=4 expandtab:
+
+import difflib
+import random
+import re
+
+import pytest
+
+from uciparse.diff import unified_diff
+
+RULES = "".join(f"\nconfig rule\n\toption name 'rule{rule}'\n\toption src wan\n\tlist proto tcp\n" for rule in range(200))
+
+
+def patch(a: list[str], diff: list[str]) -> list[str]:
+    """Apply a unified diff to a list of lines, checking the context, and return the result."""
+    result: list[str] = []
+    position = 0
+    for line in diff[2:]:
+        header = re.match(r"^@@ -(\d+)(?:,(\d+))? \+\d+(?:,\d+)? @@\n$", line)
+        if header:
+            start = int(header[1]) - (1 if header[2] != "0" else 0)
+            result.extend(a[position:start])
+            position = start
+        elif line[0] == "+":
+            result.append(line[1:])
+        else:
+            assert a[position] == line[1:]
+            if line[0] == " ":
+                result.append(line[1:])
+            position += 1
+    return result + a[position:]
+
+
+class TestUnifiedDiff:
+    """Unit tests for unified_diff()."""
+
+    def test_identical(self):
+        lines = RULES.splitlines(keepends=True)
+        assert not list(unified_diff(lines, lines))
+        assert not list(unified_diff([], []))
+
+    @pytest.mark.parametrize(
+        "a,b",
+        [
+            ["a\nb\nc\n", "a\nx\nc\n"],
+            ["", "a\nb\n"],
+            ["a\nb\n", ""],
+            ["a\nb\nc\nd\ne\nf\ng\nh\ni\n", "a\nb\nc\nd\nX\nf\ng\nh\ni\n"],
+            ["x\nx\nx\n", "x\nx\n"],  # no unique lines at all
+            [RULES, RULES.replace("'rule100'", "'changed'")],
+        ],
+    )
+    def test_same_as_difflib(self, a, b):
+        a_lines, b_lines = a.splitlines(keepends=True), b.splitlines(keepends=True)
+        expected = list(difflib.unified_diff(a_lines, b_lines, fromfile="a", tofile="b"))
+        assert list(unified_diff(a_lines, b_lines, fromfile="a", tofile="b")) == expected
+
+    def test_context(self):
+        a = [f"{i}\n" for i in range(20)]
+        b = [*a[:10], "x\n", *a[11:]]
+        assert list(unified_diff(a, b, n=1)) == ["--- \n", "+++ \n", "@@ -10,3 +10,3 @@\n", " 9\n", "-10\n", "+x\n", " 11\n"]
+
+    def test_moved(self):
+        a = RULES.splitlines(keepends=True)
+        b = a[500:] + a[:500]
+        diff = list(unified_diff(a, b))
+        assert patch(a, diff) == b
+
+    @pytest.mark.parametrize("seed", range(50))
+    def test_random(self, seed):
+        generator = random.Random(seed)  # noqa: S311
+        a = RULES.splitlines(keepends=True)
+        b = list(a)
+        for _ in range(generator.randint(1, 30)):
+            position = generator.randrange(len(b))
+            edit = generator.choice(["delete", "insert", "replace"])
+            if edit == "delete":
+                del b[position]
+            elif edit == "insert":
+                b.insert(position, generator.choice(a))
+            else:
+                b[position] = f"\toption src {generator.random()}\n"
+        diff = list(unified_diff(a, b, fromfile="a", tofile="b"))
+        assert diff[:2] == ["--- a\n", "+++ b\n"]
+        assert patch(a, diff) == b
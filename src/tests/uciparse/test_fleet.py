@@ -0,0 +1,144 @@
+# vim: set ft=python ts=4 sw=4 expandtab:
+
+import pickle  # noqa: S403
+from pathlib import Path
+
+import pytest
+
+from uciparse.fleet import UciDeviation, UciFleetResult, UciTemplate, compare_fleet, drift
+from uciparse.uci import UciFile
+
+FIXTURE_DIR = Path(__file__).parent / "fixtures" / "test_uci"
+
+GOLDEN = """package firewall
+
+config defaults
+    option input 'ACCEPT'
+    option forward 'REJECT'
+
+config zone lan
+    option name 'lan'
+    list network 'lan'
+    list network 'guest'
+
+config rule
+    option name 'Allow-DHCP'
+    option proto 'udp'
+
+config rule
+    option name 'Allow-Ping'
+    option proto 'icmp'
+"""
+
+
+def compare(golden: str, device: str) -> list[str]:
+    """Compare a device file against a golden file, returning the deviations as text."""
+    return [str(deviation) for deviation in UciTemplate(UciFile.from_text(golden)).compare(UciFile.from_text(device))]
+
+
+class TestUciDeviation:
+    """Unit tests for UciDeviation."""
+
+    @pytest.mark.parametrize(
+        "deviation,expected",
+        [
+            [UciDeviation("lan", "name", "missing"), "lan.name: missing"],
+            [UciDeviation("@rule[0]", None, "missing section"), "@rule[0]: missing section"],
+            [UciDeviation("", None, "package is x, expected y"), "package: package is x, expected y"],
+        ],
+    )
+    def test_str(self, deviation, expected):
+        assert str(deviation) == expected
+
+
+class TestUciTemplate:
+    """Unit tests for UciTemplate."""
+
+    def test_identical(self):
+        assert not compare(GOLDEN, GOLDEN)
+
+    def test_formatting_ignored(self):
+        device = GOLDEN.replace("'", '"').replace("    ", "\t") + "\n# comment\n"
+        assert not compare(GOLDEN, device)
+
+    def test_order_ignored(self):
+        sections = GOLDEN.split("\n\n")
+        device = "\n\n".join([sections[0], sections[4], sections[2], sections[1], sections[3]])
+        assert not compare(GOLDEN, device)
+
+    def test_options(self):
+        device = GOLDEN.replace("option forward 'REJECT'", "option output 'ACCEPT'").replace(
+            "option proto 'icmp'", "option proto 'all'"
+        )
+        assert compare(GOLDEN, device) == [
+            "@defaults[0].forward: missing, expected 'REJECT'",
+            "@defaults[0].output: unexpected 'ACCEPT'",
+            "@rule[1].proto: is 'all', expected 'icmp'",
+        ]
+
+    def test_lists(self):
+        device = GOLDEN.replace("    list network 'guest'\n", "")
+        assert compare(GOLDEN, device) == ["lan.network: is 'lan', expected 'lan' 'guest'"]
+
+    def test_sections(self):
+        device = GOLDEN.replace("config zone lan", "config zone wan").replace(
+            "config rule\n    option name 'Allow-Ping'\n    option proto 'icmp'\n", ""
+        )
+        assert compare(GOLDEN, device) == ["lan: missing section", "@rule[1]: missing section", "wan: unexpected section"]
+
+    def test_type(self):
+        device = GOLDEN.replace("config zone lan", "config forwarding lan")
+        assert compare(GOLDEN, device) == ["lan: type is forwarding, expected zone"]
+
+    def test_package(self):
+        assert compare(GOLDEN, GOLDEN.replace("package firewall", "package network")) == [
+            "package: package is network, expected firewall"
+        ]
+        assert not compare(GOLDEN, GOLDEN.replace("package firewall", ""))
+
+    def test_matches_by_content(self):
+        device = GOLDEN.replace("config rule\n    option name 'Allow-DHCP'\n    option proto 'udp'\n\n", "")
+        assert compare(GOLDEN, device) == ["@rule[0]: missing section"]
+
+    def test_pickle(self):
+        template = pickle.loads(pickle.dumps(UciTemplate(UciFile.from_text(GOLDEN))))  # noqa: S301
+        assert not template.compare(UciFile.from_text(GOLDEN))
+
+
+class TestCompareFleet:
+    """Unit tests for compare_fleet() and drift()."""
+
+    @pytest.mark.parametrize("jobs", [None, 1, 2])
+    def test_fleet(self, jobs, tmp_path):
+        paths = []
+        for index in range(20):
+            path = tmp_path / f"device{index}"
+            path.write_text(GOLDEN.replace("'udp'", "'tcp'") if index % 4 == 0 else GOLDEN)
+            paths.append(str(path))
+        (tmp_path / "bogus").write_text("bogus\n")
+        (tmp_path / "binary").write_bytes(b"\xff\n")
+        paths.extend([str(tmp_path / "bogus"), str(tmp_path / "missing"), str(tmp_path / "binary")])
+        results = list(compare_fleet(UciFile.from_text(GOLDEN), paths, jobs=jobs))
+        assert [result.path for result in results] == paths
+        assert [bool(result.deviations) for result in results[:20]] == [index % 4 == 0 for index in range(20)]
+        assert results[20].error == "Error on line 1: unrecognized line type"
+        assert results[21].error
+        assert "can't decode" in results[22].error
+        assert drift(results) == {"@rule[0].proto": 5}
+
+    def test_drift(self):
+        results = [
+            UciFleetResult(
+                "a", [UciDeviation("lan", "name", "x"), UciDeviation("lan", "name", "y"), UciDeviation("wan", None, "z")]
+            ),
+            UciFleetResult("b", [UciDeviation("lan", "name", "x")]),
+            UciFleetResult("c", [], "error"),
+        ]
+        assert drift(results).most_common() == [("lan.name", 2), ("wan", 1)]
+
+    def test_real(self):
+        golden = UciFile.from_file(str(FIXTURE_DIR / "real" / "network"))
+        paths = [str(path) for path in sorted((FIXTURE_DIR / "real").iterdir()) if path.name != "README.md"]
+        results = {Path(result.path).name: result for result in compare_fleet(golden, paths)}
+        assert not results["network"].deviations
+        assert all(result.deviations for name, result in results.items() if name != "network")
@@ -0,0 +1,210 @@
+# vim: set ft=python ts=4 sw=4 expandtab:
+
+import os
+import shutil
+import subprocess
+import sys
+from io import BytesIO
+from pathlib import Path
+
+import pytest
+
+import uciparse
+from uciparse.gitfilter import (
+    MAX_PACKET_DATA,
+    clean,
+    filter_process,
+    read_packet,
+    read_packets,
+    read_text,
+    textconv,
+    write_content,
+    write_packet,
+    write_text,
+)
+from uciparse.uci import UciParseError
+
+ORIGINAL = """package 'network'
+config interface "lan"
+  option proto static
+"""
+
+NORMALIZED = """package network
+
+config interface lan
+    option proto 'static'
+"""
+
+
+def packets(*lists: list[bytes]) -> bytes:
+    """Build a stream from lists of packets, each followed by a flush packet."""
+    stream = BytesIO()
+    for items in lists:
+        for item in items:
+            write_packet(stream, item)
+        write_packet(stream, None)
+    return stream.getvalue()
+
+
+HANDSHAKE = packets(
+    [b"git-filter-client\n", b"version=2\n"],
+    [b"capability=clean\n", b"capability=smudge\n", b"capability=delay\n"],
+)
+
+HANDSHAKE_RESPONSE = packets([b"git-filter-server\n", b"version=2\n"], [b"capability=clean\n"])
+
+
+class TestPackets:
+    """Unit tests for the pkt-line functions."""
+
+    def test_write_packet(self):
+        stream = BytesIO()
+        write_packet(stream, b"hello\n")
+        write_packet(stream, None)
+        assert stream.getvalue() == b"000ahello\n0000"
+
+    def test_read_packet(self):
+        stream = BytesIO(b"000ahello\n0000")
+        assert read_packet(stream) == b"hello\n"
+        assert read_packet(stream) is None
+        with pytest.raises(EOFError):
+            read_packet(stream)
+
+    @pytest.mark.parametrize(
+        "data,message",
+        [
+            [b"00", r"truncated packet"],
+            [b"zzzz", r"invalid packet header"],
+            [b"0002", r"invalid packet header"],
+            [b"000ahel", r"truncated packet"],
+        ],
+    )
+    def test_read_packet_invalid(self, data, message):
+        with pytest.raises(ValueError, match=message):
+            read_packet(BytesIO(data))
+
+    def test_text(self):
+        stream = BytesIO()
+        write_text(stream, ["one", "two"])
+        stream.seek(0)
+        assert read_text(stream) == ["one", "two"]
+
+    def test_content(self):
+        content = b"x" * (MAX_PACKET_DATA * 2 + 1)
+        stream = BytesIO()
+        write_content(stream, content)
+        stream.seek(0)
+        assert [len(packet) for packet in read_packets(stream)] == [MAX_PACKET_DATA, MAX_PACKET_DATA, 1]
+        assert stream.read() == b""  # nothing left after the flush
+
+    def test_content_empty(self):
+        stream = BytesIO()
+        write_content(stream, b"")
+        assert stream.getvalue() == b"0000"
+
+
+class TestClean:
+    """Unit tests for clean() and textconv()."""
+
+    def test_clean(self):
+        assert clean(ORIGINAL.encode()) == NORMALIZED.encode()
+
+    def test_clean_invalid(self):
+        with pytest.raises(UciParseError, match=r"Error on line 1"):
+            clean(b"bogus\n")
+        with pytest.raises(UciParseError, match=r"File is not valid UTF-8"):
+            clean(b"\xff\n")
+
+    def test_textconv(self, tmp_path):
+        (tmp_path / "network").write_text(ORIGINAL)
+        assert textconv(str(tmp_path / "network")) == NORMALIZED
+
+    def test_textconv_invalid(self, tmp_path):
+        (tmp_path / "bogus").write_text("bogus\n")
+        assert textconv(str(tmp_path / "bogus")) == "bogus\n"
+
+
+class TestFilterProcess:
+    """Unit tests for filter_process(), simulating git."""
+
+    def run(self, requests: bytes) -> bytes:
+        stdout = BytesIO()
+        filter_process(BytesIO(HANDSHAKE + requests), stdout)
+        output = stdout.getvalue()
+        assert output.startswith(HANDSHAKE_RESPONSE)
+        return output[len(HANDSHAKE_RESPONSE) :]
+
+    def test_no_requests(self):
+        assert self.run(b"") == b""
+
+    def test_clean(self):
+        requests = packets([b"command=clean\n", b"pathname=network\n"], [ORIGINAL.encode()])
+        requests += packets([b"command=clean\n", b"pathname=dhcp\n"], [b"package dhcp\n"])
+        assert self.run(requests) == packets(
+            [b"status=success\n"], [NORMALIZED.encode()], [], [b"status=success\n"], [b"package dhcp\n"], []
+        )
+
+    def test_clean_split_content(self):
+        chunks = [ORIGINAL.encode()[:10], ORIGINAL.encode()[10:]]
+        requests = packets([b"command=clean\n", b"pathname=network\n"], chunks)
+        assert self.run(requests) == packets([b"status=success\n"], [NORMALIZED.encode()], [])
+
+    def test_clean_error(self):
+        requests = packets([b"command=clean\n", b"pathname=bogus\n"], [b"bogus\n"])
+        assert self.run(requests) == packets([b"status=error\n"])
+
+    def test_unsupported_command(self):
+        requests = packets([b"command=smudge\n", b"pathname=network\n"], [ORIGINAL.encode()])
+        assert self.run(requests) == packets([b"status=error\n"])
+
+    def test_unsupported_client(self):
+        with pytest.raises(ValueError, match=r"unsupported filter client"):
+            filter_process(BytesIO(packets([b"git-filter-client\n", b"version=3\n"])), BytesIO())
+
+
+@pytest.mark.skipif(not shutil.which("git"), reason="requires git")
+class TestGit:
+    """Integration tests with a real git repository."""
+
+    @pytest.fixture
+    def repo(self, tmp_path):
+        repo = tmp_path / "repo"
+        repo.mkdir()
+        script = tmp_path / "filter.py"
+        script.write_text("import sys\nfrom uciparse.cli import parse\nsys.argv[0] = 'uciparse'\nparse()\n")
+        env = dict(os.environ)
+        env["PYTHONPATH"] = str(Path(uciparse.__file__).parent.parent)
+        command = f'"{sys.executable}" "{script}"'
+
+        def git(*args: str) -> str:
+            result = subprocess.run(["git", *args], cwd=repo, env=env, capture_output=True, text=True, check=True)  # noqa: S603,S607
+            return result.stdout
+
+        git("init", "-q")
+        git("config", "user.name", "test")
+        git("config", "user.email", "test@example.com")
+        git("config", "filter.uci.process", f"{command} --git-filter")
+        git("config", "diff.uci.textconv", f"{command} --textconv")
+        (repo / ".gitattributes").write_text("config/* filter=uci diff=uci\n")
+        (repo / "config").mkdir()
+        return repo, git
+
+    def test_clean(self, repo):
+        path, git = repo
+        (path / "config" / "network").write_text(ORIGINAL)
+        (path / "config" / "bogus").write_text("bogus\n")
+        git("add", ".")
+        git("commit", "-q", "-m", "initial")
+        assert git("show", "HEAD:config/network") == NORMALIZED
+        assert git("show", "HEAD:config/bogus") == "bogus\n"  # stored unchanged, since it can't be parsed
+
+    def test_textconv(self, repo):
+        path, git = repo
+        (path / ".gitattributes").write_text("config/* diff=uci\n")  # textconv only, so the raw file is stored
+        (path / "config" / "network").write_text(ORIGINAL)
+        git("add", ".")
+        git("commit", "-q", "-m", "initial")
+        (path / "config" / "network").write_text(ORIGINAL.replace("static", '"static"'))
+        assert git("diff") == ""  # only the quoting changed
+        (path / "config" / "network").write_text(ORIGINAL.replace("static", "dhcp"))
+        assert "-    option proto 'static'\n+    option proto 'dhcp'\n" in git("diff")
@@ -0,0 +1,161 @@
+# vim: set ft=python ts=4 sw=4 expandtab:
+
+import time
+from pathlib import Path
+from typing import ClassVar
+
+import pytest
+
+from uciparse.lint import RULES, UciFinding, UciLintContext, UciLinter, UciLintRule, lint_files, register
+from uciparse.uci import UciFile, UciLine, UciOptionLine
+
+FIXTURE_DIR = Path(__file__).parent / "fixtures" / "test_uci"
+
+
+def lint(
+    text: str, path: str | None = None, rules: list[type[UciLintRule]] | None = None, disable: tuple[str, ...] = ()
+) -> list[str]:
+    """Lint text, returning the findings as text."""
+    return [str(finding) for finding in UciLinter(rules, disable=disable).lint_text(text, path)]
+
+
+class _Counter(UciLintRule):
+    """A rule that counts the options in a file, reporting the count at the end."""
+
+    name = "count"
+    description = "count the options"
+    line_types: ClassVar[tuple[type[UciLine], ...]] = (UciOptionLine,)
+    checked: ClassVar[list[type[UciLine]]] = []
+
+    def __init__(self, context):
+        super().__init__(context)
+        self.count = 0
+
+    def check(self, _lineno, line):
+        _Counter.checked.append(type(line))
+        self.count += 1
+
+    def finish(self):
+        self.report(1, f"{self.count} options")
+
+
+class TestUciFinding:
+    """Unit tests for UciFinding."""
+
+    def test_str(self):
+        assert str(UciFinding(3, "rule", "bad")) == "3: bad [rule]"
+
+
+class TestUciLinter:
+    """Unit tests for UciLinter."""
+
+    def test_clean(self):
+        text = "package network\nconfig interface lan\n  option proto static\n  list dns 1.1.1.1\n  list dns 8.8.8.8\n"
+        assert not lint(text, "/etc/config/network")
+
+    def test_real(self):
+        for path in (FIXTURE_DIR / "real").iterdir():
+            if path.name != "README.md":
+                findings = UciLinter(disable=["package-name"]).lint_text(path.read_text(), str(path))
+                assert not [finding for finding in findings if finding.rule == "syntax"]
+
+    def test_syntax(self):
+        text = "package network\nbogus\nconfig interface lan\n  option proto 'static\n  option ipaddr 1.2.3.4\n"
+        assert lint(text) == ["2: unrecognized line type [syntax]", "4: invalid option line [syntax]"]
+        assert not lint(text, disable=("syntax",))
+
+    def test_package_name(self):
+        assert lint("package network\n", "/etc/config/firewall") == [
+            "1: package network does not match file name firewall [package-name]"
+        ]
+        assert not lint("package network\n")
+
+    def test_outside_section(self):
+        assert lint("package network\noption proto static\nlist dns 1.1.1.1\nconfig interface lan\noption a b\n") == [
+            "2: option proto is outside of any config section [outside-section]",
+            "3: list dns is outside of any config section [outside-section]",
+        ]
+
+    def test_duplicate_section(self):
+        text = "config interface lan\nconfig interface wan\nconfig rule\nconfig rule\nconfig interface 'lan'\n"
+        assert lint(text) == ["5: section lan is already defined on line 1 [duplicate-section]"]
+
+    def test_duplicate_option(self):
+        text = "config interface lan\n  option proto static\n  option proto dhcp\nconfig interface wan\n  option proto dhcp\n"
+        assert lint(text) == ["3: option proto is already set on line 2 [duplicate-option]"]
+
+    def test_option_list_collision(self):
+        text = "config interface lan\n  option dns 1.1.1.1\n  list dns 8.8.8.8\n  list dns 9.9.9.9\nconfig rule\n  list dns 1\n"
+        assert lint(text + "  option dns 2\n") == [
+            "3: list dns is already set as an option on line 2 [option-list-collision]",
+            "4: list dns is already set as an option on line 2 [option-list-collision]",
+            "7: option dns is already set as a list on line 6 [option-list-collision]",
+        ]
+
+    def test_in_order(self):
+        text = "option a b\nconfig x lan\n  option c d\n  option c e\nconfig x lan\n"
+        assert lint(text, rules=[*RULES.values(), _Counter]) == [
+            "1: option a is outside of any config section [outside-section]",
+            "1: 3 options [count]",
+            "4: option c is already set on line 3 [duplicate-option]",
+            "5: section lan is already defined on line 2 [duplicate-section]",
+        ]
+
+    def test_dispatch(self):
+        _Counter.checked.clear()
+        assert lint("config x\n  option a b\n  list c d\n  # comment\n", rules=[_Counter]) == ["1: 1 options [count]"]
+        assert _Counter.checked == [UciOptionLine]
+
+    def test_unknown_rule(self):
+        with pytest.raises(ValueError, match=r"^Unknown rule: bogus, other$"):
+            UciLinter(disable=["other", "bogus"])
+
+    def test_register(self):
+        try:
+            assert register(_Counter) is _Counter
+            assert lint("config x\n  option a b\n") == ["1: 1 options [count]"]
+            with pytest.raises(ValueError, match=r"^Duplicate rule: count$"):
+                register(_Counter)
+        finally:
+            del RULES["count"]
+
+    def test_check_required(self):
+        rule = type("_Unchecked", (UciLintRule,), {"name": "unchecked"})
+        with pytest.raises(TypeError, match=r"abstract method"):
+            rule(UciLintContext())
+
+    def test_register_syntax(self):
+        rule = type("_Syntax", (UciLintRule,), {"name": "syntax"})
+        with pytest.raises(ValueError, match=r"^Duplicate rule: syntax$"):
+            register(rule)
+
+    def test_throughput(self):
+        text = "package firewall\n" + "".join(
+            f"config rule\n    option name 'rule{i}'\n    option dest_port {i}\n    list proto tcp\n" for i in range(20000)
+        )
+        linter = UciLinter()
+        start = time.perf_counter()
+        UciFile.from_text(text)
+        parsing = time.perf_counter() - start
+        start = time.perf_counter()
+        assert not linter.lint_text(text)
+        assert time.perf_counter() - start < parsing * 3  # a single pass, so not much more than parsing
+
+
+class TestLintFiles:
+    """Unit tests for lint_files()."""
+
+    @pytest.mark.parametrize("jobs", [None, 2])
+    def test_lint_files(self, jobs, tmp_path):
+        (tmp_path / "network").write_text("package network\nconfig interface lan\n")
+        (tmp_path / "firewall").write_text("package network\nbogus\n")
+        paths = [str(tmp_path / name) for name in ("network", "firewall", "missing")]
+        results = list(lint_files(UciLinter(), paths, jobs=jobs))
+        assert [result.path for result in results] == paths
+        assert results[0].findings == []
+        assert results[1].findings == [
+            UciFinding(1, "package-name", "package network does not match file name firewall"),
+            UciFinding(2, "syntax", "unrecognized line type"),
+        ]
+        assert results[2].error
+        assert not results[2].findings
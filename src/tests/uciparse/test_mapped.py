@@ -0,0 +1,156 @@
+# vim: set ft=python ts=4 sw=4 expandtab:
+
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from tests.uciparse.generate import firewall_text
+from uciparse.mapped import UciMappedFile
+from uciparse.uci import UciConfigLine, UciFile, UciOptionLine, UciParseError, UciSection
+
+FIXTURE_DIR = Path(__file__).parent / "fixtures" / "test_uci"
+
+TEXT = """package firewall
+
+config defaults
+\toption input 'ACCEPT'
+
+config zone wan
+\toption name 'wan'
+\tlist network 'wan'
+
+config rule
+\toption name 'one'
+
+  config rule  # indented
+\toption name 'two'
+"""
+
+
+def summary(section: UciSection) -> tuple[str, str, list[str]]:
+    """Summarize a section as its key, config line and other lines, each normalized."""
+    return section.key, section.config.normalized() if section.config else "", [line.normalized() for line in section.lines]
+
+
+@pytest.fixture
+def mapped(tmp_path):
+    def mapped(text: str | bytes) -> UciMappedFile:
+        path = tmp_path / "firewall"
+        if isinstance(text, str):
+            path.write_text(text, encoding="utf-8")
+        else:
+            path.write_bytes(text)
+        return UciFile.open_mapped(path)
+
+    return mapped
+
+
+class TestUciMappedFile:
+    """Unit tests for UciMappedFile."""
+
+    @pytest.mark.parametrize("path", sorted(path for path in (FIXTURE_DIR / "real").iterdir() if path.name != "README.md"))
+    def test_sections(self, path):
+        expected = [summary(section) for section in UciFile.from_file(path).sections()]
+        with UciFile.open_mapped(path) as mapped:
+            assert [summary(section) for section in mapped] == expected
+            assert len(mapped) == len(expected)
+            assert [summary(mapped[index]) for index in range(len(expected))] == expected
+
+    def test_keys(self, mapped):
+        with mapped(TEXT) as ucifile:
+            assert [section.key for section in ucifile] == ["", "@defaults[0]", "wan", "@rule[0]", "@rule[1]"]
+            assert ucifile[-1].key == "@rule[1]"
+            assert ucifile[-1].config.comment == "# indented"
+            assert [line.value for line in ucifile[-1].lines] == ["two"]
+
+    def test_no_preamble(self, mapped):
+        with mapped("\n# comment\nconfig rule\n\toption name 'one'\n") as ucifile:
+            assert [summary(section) for section in ucifile] == [
+                ("", "", ["# comment\n"]),
+                ("@rule[0]", "\nconfig rule\n", ["    option name 'one'\n"]),
+            ]
+        with mapped("\n\nconfig rule\n") as ucifile:
+            assert [section.key for section in ucifile] == ["@rule[0]"]
+
+    def test_config_in_value(self, mapped):
+        with mapped("config rule\n\toption name 'config x'  # config y\n\t# config z\nconfigure\n") as ucifile:
+            assert len(ucifile) == 1
+            with pytest.raises(UciParseError, match=r"^Error on line 4: unrecognized line type"):
+                ucifile[0]
+
+    def test_empty(self, mapped):
+        with mapped("") as ucifile:
+            assert len(ucifile) == 0
+            assert len(ucifile.lines) == 0
+            assert not list(ucifile)
+            with pytest.raises(IndexError):
+                ucifile.lines[0]
+            with pytest.raises(IndexError):
+                ucifile[0]
+
+    def test_lines(self, mapped):
+        with mapped(TEXT) as ucifile:
+            assert ucifile.lines[0].name == "firewall"
+            assert ucifile.lines[1] is None  # blank lines are included, so indexes match line numbers
+            assert isinstance(ucifile.lines[2], UciConfigLine)
+            assert [line.value for line in ucifile.lines[3:8] if isinstance(line, UciOptionLine)] == ["ACCEPT", "wan"]
+            assert ucifile.lines[-1].value == "two"
+            assert len(ucifile.lines[::2]) == 7
+            assert len(ucifile.lines) == 14
+            with pytest.raises(IndexError):
+                ucifile.lines[14]
+            with pytest.raises(IndexError):
+                ucifile.lines[-15]
+
+    def test_line_endings(self, mapped):
+        with mapped(b"package a\r\nconfig rule\r\toption name 'one'\r\n\r\nconfig rule\n\toption name 'two'") as ucifile:
+            assert len(ucifile.lines) == 6
+            assert ucifile.lines[2].value == "one"
+            assert [section.key for section in ucifile] == ["", "@rule[0]", "@rule[1]"]
+            assert ucifile[2].lines[0].value == "two"
+
+    def test_lazy(self, mapped):
+        text = firewall_text(10000)
+        with patch("uciparse.mapped.BLOCK_SIZE", 1000), mapped(text) as ucifile:
+            assert ucifile.indexed == 0
+            assert [line.value for line in ucifile.lines[11:13]] == ["rule1", "wan"]
+            assert 0 < ucifile.indexed < 2000
+            assert ucifile[101].lines[0].value == "rule100"
+            assert ucifile.indexed < len(text) // 10
+            assert len(ucifile) == 10001
+            assert ucifile.indexed == len(text)
+
+    def test_matches_from_file(self, mapped):
+        text = firewall_text(1000)
+        with patch("uciparse.mapped.BLOCK_SIZE", 1000), mapped(text) as ucifile:
+            expected = UciFile.from_text(text)
+            assert [line.normalized() for line in ucifile.lines if line] == [line.normalized() for line in expected.lines]
+            assert [summary(section) for section in ucifile] == [summary(section) for section in expected.sections()]
+
+    def test_invalid(self, mapped):
+        with mapped("package a\nconfig rule\n\toption name 'one\n") as ucifile:
+            assert ucifile.lines[1].section == "rule"  # the valid lines can still be accessed
+            with pytest.raises(UciParseError, match=r"^Error on line 3: invalid option line"):
+                ucifile.lines[2]
+            with pytest.raises(UciParseError, match=r"^Error on line 3: invalid option line"):
+                ucifile[1]
+
+    def test_invalid_utf8(self, mapped):
+        with mapped(b"package a\n# \xff\n") as ucifile:
+            with pytest.raises(UciParseError, match=r"^Error on line 2: line is not valid UTF-8"):
+                ucifile.lines[1]
+
+    def test_max_line_length(self, tmp_path):
+        path = tmp_path / "firewall"
+        path.write_text(TEXT)
+        with UciMappedFile(path, max_line_length=20) as ucifile:
+            assert ucifile.lines[0].name == "firewall"
+            with pytest.raises(UciParseError, match=r"^Error on line 13: line is longer than 20 characters"):
+                ucifile.lines[12]
+
+    def test_close(self, mapped):
+        ucifile = mapped(TEXT)
+        ucifile.close()
+        with pytest.raises(ValueError, match=r"closed"):
+            ucifile.lines[0]
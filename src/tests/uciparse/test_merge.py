@@ -0,0 +1,310 @@
+# vim: set ft=python ts=4 sw=4 expandtab:
+
+from pathlib import Path
+
+import pytest
+
+from uciparse.merge import LIST_APPEND, UciConflict, UciConflictLine, UciMergeResult, merge3, overlay
+from uciparse.uci import UciFile, UciOptionLine
+
+FIXTURE_DIR = Path(__file__).parent / "fixtures" / "test_uci"
+
+BASE = """package network
+
+config interface lan
+    option proto 'static'
+    # addressing
+    option ipaddr '192.168.1.1'
+    list dns '8.8.8.8'
+    list dns '8.8.4.4'
+    option mtu '1500'
+
+config interface wan
+    option proto 'dhcp'
+
+config rule
+    option name 'base'
+"""
+
+
+def merged(result: UciMergeResult) -> str:
+    return "".join(result.file.normalized())
+
+
+class TestUciConflict:
+    """Unit tests for UciConflict."""
+
+    def test_init(self):
+        conflict = UciConflict(section="lan", option="dns", message="message")
+        assert conflict.section == "lan"
+        assert conflict.option == "dns"
+        assert conflict.message == "message"
+
+    def test_str(self):
+        assert str(UciConflict(section="lan", option="dns", message="message")) == "lan.dns: message"
+        assert str(UciConflict(section="lan", option=None, message="message")) == "lan: message"
+        assert str(UciConflict(section="", option=None, message="message")) == "package: message"
+
+
+class TestOverlay:
+    """Unit tests for overlay()."""
+
+    def test_no_overlays(self):
+        result = overlay(UciFile.from_text(BASE))
+        assert merged(result) == BASE
+        assert not result.conflicts
+
+    def test_override_options(self):
+        layer = UciFile.from_text("config interface lan\n    option ipaddr '10.0.0.1'  # site\n    option gateway '10.0.0.254'\n")
+        result = overlay(UciFile.from_text(BASE), layer)
+        assert merged(result) == BASE.replace(
+            "    option ipaddr '192.168.1.1'\n", "    option ipaddr '10.0.0.1'  # site\n"
+        ).replace("    option mtu '1500'\n", "    option mtu '1500'\n    option gateway '10.0.0.254'\n")
+        assert not result.conflicts
+
+    def test_replace_lists(self):
+        layer = UciFile.from_text("config interface lan\n    list dns '1.1.1.1'\n")
+        result = overlay(UciFile.from_text(BASE), layer)
+        assert merged(result) == BASE.replace("    list dns '8.8.8.8'\n    list dns '8.8.4.4'\n", "    list dns '1.1.1.1'\n")
+
+    def test_append_lists(self):
+        layer = UciFile.from_text("config interface lan\n    list dns '1.1.1.1'\n")
+        result = overlay(UciFile.from_text(BASE), layer, lists=LIST_APPEND)
+        assert merged(result) == BASE.replace("    list dns '8.8.4.4'\n", "    list dns '8.8.4.4'\n    list dns '1.1.1.1'\n")
+
+    def test_invalid_list_mode(self):
+        with pytest.raises(ValueError, match=r"Unknown list mode: bogus"):
+            overlay(UciFile.from_text(BASE), lists="bogus")
+
+    def test_new_sections(self):
+        layer = UciFile.from_text("config interface guest\n    option proto 'static'\n\nconfig rule\n    option name 'site'\n")
+        result = overlay(UciFile.from_text(BASE), layer)
+        assert merged(result) == BASE + (
+            "\nconfig interface guest\n    option proto 'static'\n\nconfig rule\n    option name 'site'\n"
+        )
+        assert not result.conflicts
+
+    def test_layers_in_order(self):
+        site = UciFile.from_text("config interface wan\n    option proto 'pppoe'\n    option username 'site'\n")
+        device = UciFile.from_text("config interface wan\n    option username 'device'\n")
+        result = overlay(UciFile.from_text(BASE), site, device)
+        assert merged(result) == BASE.replace(
+            "    option proto 'dhcp'\n", "    option proto 'pppoe'\n    option username 'device'\n"
+        )
+
+    def test_inputs_unchanged(self):
+        base = UciFile.from_text(BASE)
+        layer = UciFile.from_text("config interface lan\n    option ipaddr '10.0.0.1'\n\nconfig interface new\n")
+        overlay(base, layer)
+        assert "".join(base.normalized()) == BASE
+        assert len(layer.lines) == 3
+
+    def test_conflict_section_type(self):
+        layer = UciFile.from_text("config device wan\n    option name 'eth1'\n")
+        result = overlay(UciFile.from_text(BASE), layer)
+        assert [str(conflict) for conflict in result.conflicts] == ["wan: overlay changes section type from interface to device"]
+        assert "\nconfig device wan\n    option proto 'dhcp'\n    option name 'eth1'\n" in merged(result)
+
+    def test_conflict_option_list(self):
+        layer = UciFile.from_text("config interface lan\n    option dns '1.1.1.1'\n    list mtu '1400'\n")
+        result = overlay(UciFile.from_text(BASE), layer)
+        assert [str(conflict) for conflict in result.conflicts] == [
+            "lan.dns: overlay changes option to list or list to option",
+            "lan.mtu: overlay changes option to list or list to option",
+        ]
+        assert "    option dns '1.1.1.1'\n    option mtu" not in merged(result)
+        assert "    option dns '1.1.1.1'\n    list mtu '1400'\n" in merged(result)
+
+    def test_conflict_package(self):
+        result = overlay(UciFile.from_text(BASE), UciFile.from_text("package wireless\n"))
+        assert [str(conflict) for conflict in result.conflicts] == ["package: overlay changes package from network to wireless"]
+
+    def test_package_added(self):
+        base = UciFile.from_text("config interface lan\n")
+        result = overlay(base, UciFile.from_text("package network\n"))
+        assert merged(result) == "package network\n\nconfig interface lan\n"
+        assert not result.conflicts
+
+    def test_real(self):
+        base = UciFile.from_file(FIXTURE_DIR / "real" / "network")
+        result = overlay(base, base)
+        assert not result.conflicts
+        assert result.file.fingerprint().sections.keys() >= base.fingerprint().sections.keys()
+
+
+class TestUciFileMerge:
+    """Unit tests for UciFile.merge()."""
+
+    def test_merge(self):
+        layer = UciFile.from_text("config interface lan\n    list dns '1.1.1.1'\n")
+        result = UciFile.merge(UciFile.from_text(BASE), layer, lists="append")
+        assert isinstance(result, UciMergeResult)
+        assert "    list dns '8.8.4.4'\n    list dns '1.1.1.1'\n" in merged(result)
+
+
+THREE_BASE = """package firewall
+
+config defaults
+    option input 'ACCEPT'
+
+config zone lan
+    option name 'lan'
+    list network 'lan'
+    option forward 'ACCEPT'
+
+config rule
+    option name 'A'
+
+config rule
+    option name 'B'
+
+config rule
+    option name 'C'
+"""
+
+
+def three_way(ours: str, theirs: str, base: str = THREE_BASE) -> UciMergeResult:
+    return merge3(UciFile.from_text(base), UciFile.from_text(ours), UciFile.from_text(theirs))
+
+
+class TestUciConflictLine:
+    """Unit tests for UciConflictLine."""
+
+    def test_init(self):
+        ours = [UciOptionLine(name="a", value="1")]
+        theirs = [UciOptionLine(name="a", value="2")]
+        line = UciConflictLine(ours=ours, theirs=theirs)
+        assert line.ours is ours
+        assert line.theirs is theirs
+        assert line.labels == ("ours", "theirs")
+
+    def test_normalized(self):
+        ours = [UciOptionLine(name="a", value="1")]
+        theirs = [UciOptionLine(name="a", value="2")]
+        assert UciConflictLine(ours=ours, theirs=theirs, labels=("left", "right")).normalized() == (
+            "<<<<<<< left\n    option a '1'\n=======\n    option a '2'\n>>>>>>> right\n"
+        )
+        assert UciConflictLine(ours=[], theirs=theirs).normalized() == ("<<<<<<< ours\n=======\n    option a '2'\n>>>>>>> theirs\n")
+
+
+class TestMerge3:
+    """Unit tests for merge3()."""
+
+    def test_unchanged(self):
+        result = three_way(THREE_BASE, THREE_BASE)
+        assert merged(result) == THREE_BASE
+        assert not result.conflicts
+
+    def test_one_side(self):
+        changed = THREE_BASE.replace("option input 'ACCEPT'", "option input 'DROP'")
+        assert merged(three_way(changed, THREE_BASE)) == changed
+        assert merged(three_way(THREE_BASE, changed)) == changed
+
+    def test_same_change(self):
+        changed = THREE_BASE.replace("option input 'ACCEPT'", "option input 'DROP'")
+        result = three_way(changed, changed)
+        assert merged(result) == changed
+        assert not result.conflicts
+
+    def test_non_overlapping(self):
+        ours = THREE_BASE.replace("option input 'ACCEPT'", "option input 'DROP'").replace(
+            "    list network 'lan'\n", "    list network 'lan'\n    list network 'guest'\n"
+        )
+        theirs = THREE_BASE.replace("option input 'ACCEPT'", "option input 'ACCEPT'\n    option output 'ACCEPT'").replace(
+            "option forward 'ACCEPT'", "option forward 'REJECT'"
+        )
+        result = three_way(ours, theirs)
+        assert not result.conflicts
+        assert merged(result) == THREE_BASE.replace(
+            "option input 'ACCEPT'", "option input 'DROP'\n    option output 'ACCEPT'"
+        ).replace(
+            "    list network 'lan'\n    option forward 'ACCEPT'\n",
+            "    list network 'lan'\n    list network 'guest'\n    option forward 'REJECT'\n",
+        )
+
+    def test_deleted_option(self):
+        ours = THREE_BASE.replace("    option forward 'ACCEPT'\n", "")
+        theirs = THREE_BASE.replace("option input 'ACCEPT'", "option input 'DROP'")
+        result = three_way(ours, theirs)
+        assert not result.conflicts
+        assert merged(result) == theirs.replace("    option forward 'ACCEPT'\n", "")
+
+    def test_conflict(self):
+        ours = THREE_BASE.replace("option forward 'ACCEPT'", "option forward 'REJECT'")
+        theirs = THREE_BASE.replace("option forward 'ACCEPT'", "option forward 'DROP'")
+        result = three_way(ours, theirs)
+        assert [str(conflict) for conflict in result.conflicts] == ["lan.forward: changed in both"]
+        assert merged(result) == THREE_BASE.replace(
+            "    option forward 'ACCEPT'\n",
+            "<<<<<<< ours\n    option forward 'REJECT'\n=======\n    option forward 'DROP'\n>>>>>>> theirs\n",
+        )
+
+    def test_conflict_deleted_and_changed(self):
+        ours = THREE_BASE.replace("    option forward 'ACCEPT'\n", "")
+        theirs = THREE_BASE.replace("option forward 'ACCEPT'", "option forward 'DROP'")
+        result = three_way(ours, theirs)
+        assert [str(conflict) for conflict in result.conflicts] == ["lan.forward: changed in both"]
+        assert "<<<<<<< ours\n=======\n    option forward 'DROP'\n>>>>>>> theirs\n" in merged(result)
+
+    def test_anonymous_sections(self):
+        # ours deletes rule A and changes C, theirs changes B and adds D; rules are matched by content, not position
+        ours = THREE_BASE.replace("\nconfig rule\n    option name 'A'\n", "").replace(
+            "option name 'C'", "option name 'C'\n    option target 'ACCEPT'"
+        )
+        theirs = THREE_BASE.replace("option name 'B'", "option name 'B'\n    option src 'wan'") + (
+            "\nconfig rule\n    option name 'D'\n"
+        )
+        result = three_way(ours, theirs)
+        assert not result.conflicts
+        assert merged(result).endswith(
+            "\nconfig rule\n    option name 'B'\n    option src 'wan'\n"
+            "\nconfig rule\n    option name 'C'\n    option target 'ACCEPT'\n"
+            "\nconfig rule\n    option name 'D'\n"
+        )
+        assert "'A'" not in merged(result)
+
+    def test_deleted_section(self):
+        ours = THREE_BASE.replace(
+            "\nconfig zone lan\n    option name 'lan'\n    list network 'lan'\n    option forward 'ACCEPT'\n", ""
+        )
+        result = three_way(ours, THREE_BASE)
+        assert not result.conflicts
+        assert merged(result) == ours
+
+    def test_deleted_and_modified_section(self):
+        ours = THREE_BASE.replace(
+            "\nconfig zone lan\n    option name 'lan'\n    list network 'lan'\n    option forward 'ACCEPT'\n", ""
+        )
+        theirs = THREE_BASE.replace("option forward 'ACCEPT'", "option forward 'DROP'")
+        result = three_way(ours, theirs)
+        assert [str(conflict) for conflict in result.conflicts] == ["lan: deleted on one side and modified on the other"]
+        assert (
+            "<<<<<<< ours\n=======\n\nconfig zone lan\n    option name 'lan'\n    list network 'lan'\n"
+            "    option forward 'DROP'\n>>>>>>> theirs\n"
+        ) in merged(result)
+
+    def test_section_type(self):
+        theirs = THREE_BASE.replace("config zone lan", "config area lan")
+        result = three_way(THREE_BASE, theirs)
+        assert not result.conflicts
+        assert merged(result) == theirs
+
+    def test_section_type_conflict(self):
+        ours = THREE_BASE.replace("config zone lan", "config region lan")
+        theirs = THREE_BASE.replace("config zone lan", "config area lan")
+        result = three_way(ours, theirs)
+        assert [str(conflict) for conflict in result.conflicts] == ["lan: section type changed in both"]
+        assert "<<<<<<< ours\n\nconfig region lan\n=======\n\nconfig area lan\n>>>>>>> theirs\n" in merged(result)
+
+    def test_added_both(self):
+        ours = THREE_BASE + "\nconfig zone wan\n    option name 'wan'\n    option input 'DROP'\n"
+        theirs = THREE_BASE + "\nconfig zone wan\n    option name 'wan'\n    option input 'REJECT'\n"
+        result = three_way(ours, theirs)
+        assert [str(conflict) for conflict in result.conflicts] == ["wan.input: changed in both"]
+
+    def test_labels(self):
+        ours = THREE_BASE.replace("option forward 'ACCEPT'", "option forward 'REJECT'")
+        theirs = THREE_BASE.replace("option forward 'ACCEPT'", "option forward 'DROP'")
+        result = merge3(UciFile.from_text(THREE_BASE), UciFile.from_text(ours), UciFile.from_text(theirs), labels=("a", "b"))
+        assert "<<<<<<< a\n" in merged(result)
+        assert ">>>>>>> b\n" in merged(result)
@@ -0,0 +1,96 @@
+# vim: set ft=python ts=4 sw=4 expandtab:
+
+import io
+import os
+import pstats
+import tracemalloc
+
+import pytest
+
+from uciparse import profiling
+from uciparse.fleet import compare_fleet
+from uciparse.profiling import UciProfiler, phase
+from uciparse.uci import UciFile
+
+TEXT = "package firewall\n" + "".join(f"config rule\n  option name 'rule{rule}'\n  list proto tcp\n" for rule in range(500))
+
+
+class TestPhase:
+    """Unit tests for phase()."""
+
+    def test_inactive(self):
+        assert profiling._active is None
+        with phase("parse"):
+            pass
+
+    def test_exception(self):
+        stream = io.StringIO()
+        with UciProfiler(stream=stream) as profiler:
+            with pytest.raises(ValueError, match=r"^bad$"), phase("parse"):
+                raise ValueError("bad")
+        assert profiler.phases["parse"][0] == 1
+
+
+class TestUciProfiler:
+    """Unit tests for UciProfiler."""
+
+    def test_phases(self):
+        stream = io.StringIO()
+        with UciProfiler(stream=stream) as profiler:
+            with phase("parse"):
+                ucifile = UciFile.from_text(TEXT)
+            for _ in range(2):
+                with phase("normalize"):
+                    ucifile.normalized()
+        assert list(profiler.phases) == ["parse", "normalize"]
+        assert [count for count, _ in profiler.phases.values()] == [1, 2]
+        lines = stream.getvalue().splitlines()
+        assert lines[0].split() == ["Phase", "Count", "Time"]
+        assert [line.split()[:2] for line in lines[1:]] == [["parse", "1"], ["normalize", "2"]]
+        assert profiling._active is None
+
+    def test_profile(self, tmp_path):
+        out = tmp_path / "out.pstats"
+        stream = io.StringIO()
+        with UciProfiler(str(out), stream=stream):
+            UciFile.from_text(TEXT)
+        assert stream.getvalue() == f"Profile of 1 process written to {out}\n"
+        functions = pstats.Stats(str(out)).stats
+        assert any(function[2] == "from_text" for function in functions)
+        assert profiling._WORKER_DIRECTORY not in os.environ
+
+    def test_workers(self, tmp_path):
+        (tmp_path / "golden").write_text("package network\nconfig interface lan\n")
+        paths = []
+        for device in range(4):
+            (tmp_path / str(device)).write_text("package network\nconfig interface wan\n")
+            paths.append(str(tmp_path / str(device)))
+        out = tmp_path / "out.pstats"
+        stream = io.StringIO()
+        with UciProfiler(str(out), stream=stream):
+            results = list(compare_fleet(UciFile.from_file(str(tmp_path / "golden")), paths, jobs=2))
+        assert all(result.deviations for result in results)
+        assert not stream.getvalue().startswith("Profile of 1 process ")
+        functions = pstats.Stats(str(out)).stats
+        assert any(function[2] == "_check_in_worker" for function in functions)  # only ever called in a worker
+
+    def test_trace_memory(self):
+        stream = io.StringIO()
+        with UciProfiler(trace_memory=True, top=3, stream=stream):
+            with phase("parse"):
+                ucifile = UciFile.from_text(TEXT)
+            del ucifile
+            with phase("small"):
+                pass
+        assert not tracemalloc.is_tracing()
+        lines = stream.getvalue().splitlines()
+        assert lines[3].startswith("Peak traced memory: ")
+        assert lines[4] == "Top 3 lines of uci.py by memory in use, at the end of parse:"
+        assert len(lines) == 8
+        assert all(" blocks  uci.py:" in line for line in lines[5:])
+
+    def test_trace_memory_no_phases(self):
+        stream = io.StringIO()
+        with UciProfiler(trace_memory=True, stream=stream):
+            UciFile.from_text(TEXT)
+        assert stream.getvalue().startswith("Peak traced memory: ")
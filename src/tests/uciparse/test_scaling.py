@@ -0,0 +1,97 @@
+# vim: set ft=python ts=4 sw=4 expandtab:
+
+# Scaling tests, which check that the cost of an operation grows about linearly with the size of its input.  Absolute timings
+# depend on the machine, but the ratio between the cost at two sizes doesn't, so these catch accidental quadratic behavior.
+
+import gc
+import io
+import time
+import tracemalloc
+from collections.abc import Callable
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from tests.uciparse.generate import firewall_lines, firewall_text
+from uciparse.cli import diff
+from uciparse.uci import UciFile
+
+# Number of firewall rules in the small input; the large input has twice as many
+RULES = 1000
+
+# Doubling the input must not cost more than this many times as much; linear growth gives 2, and quadratic growth gives 4
+GROWTH = 2.5
+
+
+def elapsed(small: Callable[[], object], large: Callable[[], object]) -> float:
+    """
+    Return the ratio between the time taken by the large and the small operation, using the best time out of several tries.
+
+    The two operations are timed alternately, so that anything else slowing
+    the machine down affects both, and garbage collection is disabled while they
+    are timed, since a collection costs time in proportion to everything else
+    that has been allocated.
+    """
+    times = [float("inf"), float("inf")]
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(7):
+            for index, operation in enumerate((small, large)):
+                start = time.perf_counter()
+                operation()
+                times[index] = min(times[index], time.perf_counter() - start)
+    finally:
+        gc.enable()
+    return times[1] / times[0]
+
+
+def memory(small: Callable[[], object], large: Callable[[], object]) -> float:
+    """Return the ratio between the peak memory allocated by the large and the small operation."""
+    peaks = []
+    for operation in (small, large):
+        tracemalloc.start()
+        operation()
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return peaks[1] / peaks[0]
+
+
+def assert_linear(small: Callable[[], object], large: Callable[[], object]) -> None:
+    """Assert that the large operation, on twice the input, costs no more than GROWTH times as much as the small one."""
+    assert memory(small, large) < GROWTH
+    # A busy machine can only make one try look worse, while a quadratic operation fails every try
+    assert any(elapsed(small, large) < GROWTH for _ in range(3))
+
+
+class TestScaling:
+    """Check that parsing, normalizing and diffing scale about linearly with the size of the file."""
+
+    def test_from_lines(self):
+        small, large = firewall_lines(RULES), firewall_lines(RULES * 2)
+        assert_linear(lambda: UciFile.from_lines(small), lambda: UciFile.from_lines(large))
+
+    @pytest.mark.parametrize("canonical", [False, True])
+    def test_normalized(self, canonical):
+        small, large = UciFile.from_lines(firewall_lines(RULES)), UciFile.from_lines(firewall_lines(RULES * 2))
+        assert_linear(lambda: small.normalized(canonical=canonical), lambda: large.normalized(canonical=canonical))
+
+    @pytest.mark.parametrize("reverse", [False, True], ids=["in-order", "reversed"])
+    @pytest.mark.parametrize("changed", [1, 50])
+    @pytest.mark.parametrize("diff_format", ["unified", "uci-batch"])
+    def test_ucidiff(self, diff_format, changed, reverse, tmp_path):
+        # Reversing the rules moves every section, so a uci-batch diff reorders every section but one
+        def ucidiff(rules: int) -> Callable[[], object]:
+            a, b = tmp_path / f"a{rules}", tmp_path / f"b{rules}"
+            a.write_text(firewall_text(rules))
+            b.write_text(firewall_text(rules, changed, reverse=reverse))
+            return lambda: run(a, b)
+
+        def run(a: Path, b: Path) -> None:
+            with patch("sys.argv", ["ucidiff", "--format", diff_format, str(a), str(b)]):
+                with patch("sys.stdout", new_callable=io.StringIO) as stdout:
+                    diff()
+                    assert stdout.getvalue()
+
+        assert_linear(ucidiff(RULES), ucidiff(RULES * 2))
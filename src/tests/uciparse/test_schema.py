@@ -0,0 +1,179 @@
+# vim: set ft=python ts=4 sw=4 expandtab:
+
+import json
+import time
+from pathlib import Path
+
+import pytest
+
+import uciparse.schema
+from uciparse.schema import UciSchema, UciViolation
+from uciparse.uci import UciFile
+
+FIXTURE_DIR = Path(__file__).parent / "fixtures" / "test_uci"
+
+SCHEMA = {
+    "network": {
+        "interface": {
+            "proto": {"type": "enum", "values": ["static", "dhcp"], "required": True},
+            "ipaddr": {"type": "ipv4"},
+            "ip6addr": {"type": "ipv6"},
+            "gateway": {"type": "ipaddr"},
+            "prefix": {"type": "cidr"},
+            "mtu": {"type": "int", "min": 68, "max": 9000},
+            "auto": {"type": "bool"},
+            "macaddr": {"type": "mac"},
+            "ifname": {"type": "string", "pattern": "eth[0-9]+(\\.[0-9]+)?"},
+            "dns": {"type": "ipaddr", "list": True, "min_items": 1, "max_items": 2},
+            "type": {"list": False},
+        },
+    },
+}
+
+
+def validate(text: str, package: str | None = None) -> list[str]:
+    """Validate a file against the schema, returning the violations as text."""
+    return [str(violation) for violation in UciSchema(SCHEMA).validate(UciFile.from_text(text), package=package)]
+
+
+def interface(option: str) -> str:
+    """Build a network file with one interface that sets an option (which may be several lines)."""
+    return f"package network\nconfig interface lan\n    option proto static\n    {option}\n"
+
+
+class TestUciViolation:
+    """Unit tests for UciViolation."""
+
+    def test_str(self):
+        assert str(UciViolation("lan", "mtu", "bad")) == "lan.mtu: bad"
+        assert str(UciViolation("@rule[0]", None, "bad")) == "@rule[0]: bad"
+
+
+class TestUciSchema:
+    """Unit tests for UciSchema."""
+
+    def test_valid(self):
+        text = interface(
+            "option ipaddr 192.168.1.1\n    option ip6addr 'fd00::1'\n    option gateway '2001:db8::1'\n"
+            "    option prefix 10.0.0.0/8\n    option mtu 1500\n    option auto 'off'\n    option macaddr '00:11:22:AA:bb:cc'\n"
+            "    option ifname eth0.1\n    list dns 8.8.8.8\n    list dns '::1'\n    option type bridge\n    option other 'anything'"
+        )
+        assert not validate(text)
+
+    @pytest.mark.parametrize(
+        "option,expected",
+        [
+            ["option ipaddr 192.168.1.256", "lan.ipaddr: invalid value '192.168.1.256', expected an IPv4 address"],
+            ["option ipaddr 1.2.3", "lan.ipaddr: invalid value '1.2.3', expected an IPv4 address"],
+            ["option ip6addr 'fd00::1::2'", "lan.ip6addr: invalid value 'fd00::1::2', expected an IPv6 address"],
+            ["option ip6addr 10.0.0.1", "lan.ip6addr: invalid value '10.0.0.1', expected an IPv6 address"],
+            ["option gateway bogus", "lan.gateway: invalid value 'bogus', expected an IP address"],
+            ["option prefix 10.0.0.0/33", "lan.prefix: invalid value '10.0.0.0/33', expected an address with a prefix length"],
+            ["option prefix 10.0.0.0", "lan.prefix: invalid value '10.0.0.0', expected an address with a prefix length"],
+            ["option prefix 'fd00::/129'", "lan.prefix: invalid value 'fd00::/129', expected an address with a prefix length"],
+            ["option mtu 10000", "lan.mtu: invalid value '10000', expected an integer from 68 to 9000"],
+            ["option mtu 1.5", "lan.mtu: invalid value '1.5', expected an integer from 68 to 9000"],
+            ["option auto 'ture'", "lan.auto: invalid value 'ture', expected a boolean"],
+            ["option macaddr 00:11:22:33:44", "lan.macaddr: invalid value '00:11:22:33:44', expected a MAC address"],
+            ["option ifname wlan0", "lan.ifname: invalid value 'wlan0', expected a value matching 'eth[0-9]+(\\\\.[0-9]+)?'"],
+            ["option dns 8.8.8.8", "lan.dns: expected a list"],
+            ["list type bridge", "lan.type: expected an option, not a list"],
+        ],
+    )
+    def test_invalid(self, option, expected):
+        assert validate(interface(option)) == [expected]
+
+    def test_enum(self):
+        assert validate("package network\nconfig interface lan\n    option proto pppoe\n") == [
+            "lan.proto: invalid value 'pppoe', expected one of 'static', 'dhcp'"
+        ]
+
+    def test_required(self):
+        assert validate("package network\nconfig interface lan\nconfig interface wan\n    option proto dhcp\n") == [
+            "lan.proto: missing required option"
+        ]
+
+    def test_list_items(self):
+        assert validate(interface("list dns 1.1.1.1\n    list dns 8.8.8.8\n    list dns 9.9.9.9")) == [
+            "lan.dns: has 3 values, expected at most 2"
+        ]
+        assert validate(interface("list dns bogus")) == ["lan.dns: invalid value 'bogus', expected an IP address"]
+
+    def test_list_replaced(self):
+        assert not validate(interface("option dns bogus\n    list dns 1.1.1.1"))
+        assert validate(interface("list dns 1.1.1.1\n    option dns 1.1.1.1")) == ["lan.dns: expected a list"]
+
+    def test_anonymous(self):
+        text = "package network\nconfig interface\n    option proto static\nconfig interface\n    option proto x\n"
+        assert validate(text) == ["@interface[1].proto: invalid value 'x', expected one of 'static', 'dhcp'"]
+
+    def test_package(self):
+        text = "config interface lan\n    option proto x\n"
+        assert not validate(text)
+        assert validate(text, package="network") == ["lan.proto: invalid value 'x', expected one of 'static', 'dhcp'"]
+        assert not validate("package firewall\n" + text, package="network")
+
+    def test_unknown_section_type(self):
+        assert not validate("package network\nconfig device\n    option mtu bogus\n")
+
+    @pytest.mark.parametrize(
+        "schema,message",
+        [
+            [[], r"^Invalid schema: expected an object$"],
+            [{"network": []}, r"^Invalid schema for network: expected an object$"],
+            [{"network": {"interface": []}}, r"^Invalid schema for network.interface: expected an object$"],
+            [{"network": {"interface": {"mtu": 5}}}, r"^Invalid schema for network.interface.mtu: expected an object$"],
+            [{"network": {"interface": {"mtu": {"type": "float"}}}}, r"unknown type 'float'$"],
+            [{"network": {"interface": {"mtu": {"type": "int", "values": []}}}}, r"unknown property 'values'$"],
+            [{"network": {"interface": {"mtu": {"type": "int", "min": "1"}}}}, r"min and max must be integers$"],
+            [{"network": {"interface": {"proto": {"type": "enum"}}}}, r"values must be a list of strings$"],
+            [{"network": {"interface": {"ifname": {"pattern": "("}}}}, r"network.interface.ifname: missing \)"],
+            [{"network": {"interface": {"ifname": {"pattern": 5}}}}, r"pattern must be a string$"],
+            [{"network": {"interface": {"dns": {"list": "yes"}}}}, r"list must be true or false$"],
+            [{"network": {"interface": {"dns": {"max_items": "2"}}}}, r"min_items and max_items must be integers$"],
+        ],
+    )
+    def test_invalid_schema(self, schema, message):
+        with pytest.raises(ValueError, match=message):
+            UciSchema(schema)
+
+    def test_from_file(self, tmp_path):
+        (tmp_path / "schema.json").write_text(json.dumps(SCHEMA))
+        schema = UciSchema.from_file(tmp_path / "schema.json")
+        assert not schema.validate(UciFile.from_text(interface("option mtu 1500")))
+        (tmp_path / "bad.json").write_text("{")
+        with pytest.raises(ValueError, match=r"^Invalid schema: Expecting"):
+            UciSchema.from_file(tmp_path / "bad.json")
+
+    def test_docstring_example(self):
+        # the example in the module docstring can be copied into a schema file as-is
+        example = uciparse.schema.__doc__.split(".. code-block:: json\n", 1)[1].split("\n\nThe ", 1)[0]
+        schema = UciSchema(json.loads(example))
+        assert not schema.validate(UciFile.from_text(interface("option mtu 1500")))
+
+    def test_real(self):
+        schema = UciSchema({"network": {"interface": {"proto": {"type": "enum", "values": ["static", "dhcp", "none"]}}}})
+        for path in (FIXTURE_DIR / "real").iterdir():
+            if path.name != "README.md":
+                assert not schema.validate(UciFile.from_file(path), package=path.name)
+
+    def test_throughput(self):
+        rules = "".join(
+            f"config rule\n    option name 'rule{i}'\n    option dest_port {i}\n    list proto tcp\n" for i in range(20000)
+        )
+        ucifile = UciFile.from_text(f"package firewall\n{rules}")
+        schema = UciSchema({
+            "firewall": {
+                "rule": {
+                    "name": {"required": True},
+                    "dest_port": {"type": "int", "min": 0, "max": 65535},
+                    "proto": {"type": "enum", "values": ["tcp", "udp"], "list": True},
+                }
+            }
+        })
+        start = time.perf_counter()
+        UciFile.from_text(f"package firewall\n{rules}")
+        parsing = time.perf_counter() - start
+        start = time.perf_counter()
+        assert not schema.validate(ucifile)
+        assert time.perf_counter() - start < parsing  # validating is cheaper than parsing
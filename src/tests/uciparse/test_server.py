@@ -0,0 +1,175 @@
+# vim: set ft=python ts=4 sw=4 expandtab:
+
+import json
+import socket
+import socketserver
+import threading
+
+import pytest
+
+from uciparse.uci import UciParseError
+
+pytestmark = pytest.mark.skipif(not hasattr(socketserver, "ThreadingUnixStreamServer"), reason="requires Unix sockets")
+
+# These imports only work on platforms with Unix sockets
+if hasattr(socketserver, "ThreadingUnixStreamServer"):
+    from uciparse.server import UciCache, UciClient, UciServer
+
+ORIGINAL = """package 'network'
+config interface "lan"
+  option proto static
+"""
+
+NORMALIZED = """package network
+
+config interface lan
+    option proto 'static'
+"""
+
+
+@pytest.fixture
+def server(tmp_path):
+    path = str(tmp_path / "uci.sock")
+    server = UciServer(path)
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+@pytest.fixture
+def client(server):
+    with UciClient(server.path, timeout=10) as client:
+        yield client
+
+
+class TestUciCache:
+    """Unit tests for UciCache."""
+
+    def test_load(self, tmp_path):
+        path = tmp_path / "network"
+        path.write_text(ORIGINAL)
+        cache = UciCache()
+        files = cache.load(str(path))
+        assert "".join(files[0].normalized()) == NORMALIZED
+        assert cache.load(str(path)) is files
+
+    def test_invalidated(self, tmp_path):
+        path = tmp_path / "network"
+        path.write_text(ORIGINAL)
+        cache = UciCache()
+        files = cache.load(str(path))
+        path.write_text(ORIGINAL + "  option ipaddr 192.168.1.1\n")
+        assert cache.load(str(path)) is not files
+        assert "".join(cache.load(str(path))[0].normalized()) == NORMALIZED + "    option ipaddr '192.168.1.1'\n"
+
+    def test_source(self, tmp_path):
+        path = tmp_path / "show"
+        path.write_text("network.lan=interface\n")
+        cache = UciCache()
+        assert "".join(cache.load(str(path), "show")[0].normalized()) == "package network\n\nconfig interface lan\n"
+
+    def test_size(self, tmp_path):
+        cache = UciCache(size=2)
+        for name in ["a", "b", "c"]:
+            (tmp_path / name).write_text(ORIGINAL)
+            cache.load(str(tmp_path / name))
+        assert len(cache) == 2
+
+
+class TestUciServer:
+    """Unit tests for UciServer and UciClient, over a real Unix socket."""
+
+    def test_ping(self, client):
+        assert client.request(command="ping") == ""
+
+    def test_normalize_text(self, client):
+        assert client.normalize(text=ORIGINAL) == NORMALIZED
+
+    def test_normalize_path(self, client, tmp_path):
+        path = tmp_path / "network"
+        path.write_text(ORIGINAL)
+        assert client.normalize(path=str(path)) == NORMALIZED
+        assert client.normalize(path=str(path)) == NORMALIZED  # second time from cache
+
+    def test_normalize_relative_path(self, client, tmp_path, monkeypatch):
+        (tmp_path / "network").write_text(ORIGINAL)
+        monkeypatch.chdir(tmp_path)
+        assert client.normalize(path="network") == NORMALIZED  # the client makes the path absolute
+
+    def test_normalize_source(self, client):
+        output = client.normalize(text="network.lan=interface\ndhcp.lan=dhcp\n", source="show")
+        assert output == "package network\n\nconfig interface lan\npackage dhcp\n\nconfig dhcp lan\n"
+
+    def test_diff(self, client, tmp_path):
+        (tmp_path / "a").write_text(ORIGINAL)
+        (tmp_path / "b").write_text(ORIGINAL.replace("static", "dhcp"))
+        output = client.diff(str(tmp_path / "a"), str(tmp_path / "b"))
+        assert f"--- {tmp_path / 'a'}\n" in output
+        assert f"+++ {tmp_path / 'b'}\n" in output
+        assert "-    option proto 'static'\n+    option proto 'dhcp'\n" in output
+
+    def test_diff_identical(self, client):
+        assert client.request(command="diff", a={"text": ORIGINAL}, b={"text": NORMALIZED}) == ""
+
+    @pytest.mark.parametrize(
+        "request_,message",
+        [
+            [{"command": "bogus"}, r"Invalid request: unknown command 'bogus'"],
+            [{"command": "normalize"}, r"Invalid request: expected a path or text"],
+            [{"command": "normalize", "path": "relative"}, r"Invalid request: path must be absolute"],
+            [{"command": "normalize", "text": "", "source": "bogus"}, r"Invalid request: unknown source 'bogus'"],
+            [{"command": "normalize", "text": "bogus"}, r"Error on line 1: unrecognized line type"],
+            [{"command": "diff", "a": {"text": ""}}, r"Invalid request: expected files a and b"],
+        ],
+    )
+    def test_errors(self, client, request_, message):
+        with pytest.raises(UciParseError, match=message):
+            client.request(**request_)
+        assert client.request(command="ping") == ""  # the connection remains usable
+
+    def test_missing_file(self, client, tmp_path):
+        with pytest.raises(UciParseError, match=r"Error reading .*missing: No such file or directory"):
+            client.normalize(path=str(tmp_path / "missing"))
+
+    def test_invalid_json(self, server):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(server.path)
+            sock.sendall(b"{\n[]\n")
+            reader = sock.makefile("rb")
+            assert json.loads(reader.readline())["error"].startswith("Invalid request: ")
+            assert json.loads(reader.readline()) == {"error": "Invalid request: expected an object"}
+
+    def test_concurrent_clients(self, server):
+        results: dict[int, str] = {}
+
+        def run(index: int) -> None:
+            with UciClient(server.path, timeout=10) as client:
+                for _ in range(10):
+                    results[index] = client.normalize(text=ORIGINAL.replace("lan", f"lan{index}"))
+
+        threads = [threading.Thread(target=run, args=(index,)) for index in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert results == {index: NORMALIZED.replace("lan", f"lan{index}") for index in range(8)}
+
+    def test_socket_removed(self, tmp_path):
+        path = tmp_path / "uci.sock"
+        with UciServer(str(path)):
+            assert path.exists()
+        assert not path.exists()
+
+    def test_stale_socket(self, tmp_path):
+        path = str(tmp_path / "uci.sock")
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as stale:
+            stale.bind(path)  # bound but not listening, like a socket left behind by a dead server
+        with UciServer(path) as server:
+            assert server.path == path
+
+    def test_already_running(self, server):
+        with pytest.raises(OSError, match=r"Server is already running"):
+            UciServer(server.path)
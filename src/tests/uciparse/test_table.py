@@ -0,0 +1,122 @@
+# vim: set ft=python ts=4 sw=4 expandtab:
+
+import io
+from pathlib import Path
+
+import pytest
+
+from uciparse.table import COLUMNS, UciTable
+from uciparse.uci import UciFile
+
+FIXTURE_DIR = Path(__file__).parent / "fixtures" / "test_uci"
+
+FIREWALL = """package firewall
+
+# comment
+config zone lan
+    option name 'lan'
+    list network 'lan'
+    list network 'guest'
+
+config rule
+    option src 'wan'
+    option proto 'udp'
+
+config rule
+    option src 'lan'
+"""
+
+
+@pytest.fixture
+def table() -> UciTable:
+    table = UciTable()
+    table.add("one", UciFile.from_text(FIREWALL))
+    table.add("two", UciFile.from_text(FIREWALL.replace("'udp'", "'tcp'")))
+    table.add("three", UciFile.from_text("config interface wan\n    option proto dhcp\n"))
+    return table
+
+
+class TestUciTable:
+    """Unit tests for UciTable."""
+
+    def test_empty(self):
+        table = UciTable()
+        assert len(table) == 0
+        assert not list(table.rows())
+
+    def test_rows(self, table):
+        assert len(table) == 20
+        rows = list(table.rows())
+        assert rows[:9] == [
+            ("one", "firewall", "zone", "lan", "", "", "config"),
+            ("one", "firewall", "zone", "lan", "name", "lan", "option"),
+            ("one", "firewall", "zone", "lan", "network", "lan", "list"),
+            ("one", "firewall", "zone", "lan", "network", "guest", "list"),
+            ("one", "firewall", "rule", "@rule[0]", "", "", "config"),
+            ("one", "firewall", "rule", "@rule[0]", "src", "wan", "option"),
+            ("one", "firewall", "rule", "@rule[0]", "proto", "udp", "option"),
+            ("one", "firewall", "rule", "@rule[1]", "", "", "config"),
+            ("one", "firewall", "rule", "@rule[1]", "src", "lan", "option"),
+        ]
+        assert rows[-1] == ("three", "", "interface", "wan", "proto", "dhcp", "option")
+
+    def test_interned(self, table):
+        assert table.values("device").count("one") == 9
+        assert len(set(table.column("device"))) == 3
+        assert table.string(table.intern("firewall")) == "firewall"
+        assert table.intern("") == 0
+        assert table.column("option").itemsize == 4
+
+    def test_nbytes(self, table):
+        assert table.nbytes >= 4 * len(COLUMNS) * len(table)
+
+    def test_filter(self, table):
+        rules = table.filter(type="rule", option="proto")
+        assert rules.values("value") == ["udp", "tcp"]
+        assert rules.values("device") == ["one", "two"]
+
+    def test_filter_any(self, table):
+        assert table.filter(value=["wan", "tcp"], kind="option").values("option") == ["src", "src", "proto"]
+
+    def test_filter_unknown_value(self, table):
+        assert len(table.filter(value="unknown")) == 0
+        assert len(table.filter(value=["unknown"])) == 0
+
+    def test_filter_nothing(self, table):
+        assert list(table.filter().rows()) == list(table.rows())
+
+    def test_filter_unknown_column(self, table):
+        with pytest.raises(ValueError, match="Unknown column: bogus"):
+            table.filter(bogus="x")
+
+    def test_filter_shares_strings(self, table):
+        result = table.filter(device="three")
+        assert result.intern("dhcp") == table.intern("dhcp")
+
+    def test_group_by(self, table):
+        counts = table.group_by("type")
+        assert counts == {("zone",): 8, ("rule",): 10, ("interface",): 2}
+
+    def test_group_by_distinct(self, table):
+        counts = table.filter(kind="option").group_by("option", "value", distinct="device")
+        assert counts.most_common(2) == [(("name", "lan"), 2), (("src", "wan"), 2)]
+        assert counts["proto", "udp"] == 1
+        with pytest.raises(ValueError, match="Unknown column: bogus"):
+            table.group_by("type", distinct="bogus")
+
+    def test_to_csv(self, table):
+        output = io.StringIO()
+        table.filter(device="three").to_csv(output)
+        assert output.getvalue() == (
+            "device,package,type,section,option,value,kind\nthree,,interface,wan,,,config\nthree,,interface,wan,proto,dhcp,option\n"
+        )
+
+    def test_from_files(self):
+        paths = [str(path) for path in sorted((FIXTURE_DIR / "real").iterdir()) if path.name != "README.md"]
+        table = UciTable.from_files(paths)
+        assert set(table.values("device")) <= set(paths)
+        for path in paths:
+            sections = [section for section in UciFile.from_file(path).sections() if section.config]
+            device = table.filter(device=path)
+            assert len(device.filter(kind="config")) == len(sections)
+            assert device.filter(kind="config").values("section") == [section.key for section in sections]
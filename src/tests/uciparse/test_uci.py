@@ -1,24 +1,38 @@
 # vim: set ft=python ts=4 sw=4 expandtab:
 
+import os
+import time
+from contextlib import suppress
 from pathlib import Path
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
 import pytest
 
+from tests.uciparse.generate import firewall_text
 from uciparse.uci import (
     UciCommentLine,
     UciConfigLine,
     UciFile,
+    UciFingerprint,
+    UciInterner,
     UciListLine,
     UciOptionLine,
     UciPackageLine,
     UciParseError,
+    UciSection,
     _contains_single,
+    _split_chunks,
+    parse_line,
 )
 
 FIXTURE_DIR = Path(__file__).parent / "fixtures" / "test_uci"
 
 
+def copy(string: str) -> str:
+    """Return a string equal to the given string, but a different object."""
+    return string.encode().decode()
+
+
 def load(path: Path) -> dict[str, list[str]]:
     return {f.name: f.read_text().splitlines(keepends=True) for f in path.iterdir() if f.is_file()}
 
@@ -54,6 +68,23 @@ def test_contains_single(self):
         assert _contains_single("''") is True
         assert _contains_single("'whatever'") is True
 
+    def test_parse_line(self):
+        assert parse_line(1, "  \n") is None
+        assert isinstance(parse_line(1, "  option proto 'static'  # comment\n"), UciOptionLine)
+        assert isinstance(parse_line(2, "config rule\r\n", max_line_length=11), UciConfigLine)  # not counting the line ending
+        with pytest.raises(UciParseError, match=r"^Error on line 3: unrecognized line type"):
+            parse_line(3, "bogus\n")
+        with pytest.raises(UciParseError, match=r"^Error on line 4: line is longer than 10 characters"):
+            parse_line(4, "option proto static\n", max_line_length=10)
+
+    def test_split_chunks(self):
+        text = "a\nbb\r\nccc\rdddd\n\neeeee"
+        for count in range(1, 10):
+            chunks = _split_chunks(text, count)
+            assert "".join(chunks) == text
+            assert all(chunk.endswith("\n") for chunk in chunks[:-1])
+        assert _split_chunks("", 4) == []
+
 
 class TestUciPackageLine:
     """Unit tests for UciPackageLine."""
@@ -155,6 +186,89 @@ def test_normalized(self):
         assert UciCommentLine(comment="# comment", indented=True).normalized() == "    # comment\n"
 
 
+class TestUciSection:
+    """Unit tests for UciSection."""
+
+    def test_init(self):
+        config = UciConfigLine(section="section")
+        lines = [MagicMock()]
+        section = UciSection(key="@section[0]", config=config, lines=lines)
+        assert section.key == "@section[0]"
+        assert section.config is config
+        assert section.lines is lines
+
+    def test_options(self):
+        lines = [
+            UciOptionLine(name="a", value="1"),
+            UciCommentLine(comment="# comment"),
+            UciListLine(name="b", value="x"),
+            UciOptionLine(name="c", value="3"),
+            UciListLine(name="b", value="y"),
+            UciOptionLine(name="a", value="2"),
+        ]
+        section = UciSection(key="", config=None, lines=lines)
+        assert section.options() == {"a": "2", "b": ["x", "y"], "c": "3"}
+        assert list(section.options()) == ["a", "b", "c"]
+
+
+class TestUciFingerprint:
+    """Unit tests for UciFingerprint."""
+
+    def test_init(self):
+        fingerprint = UciFingerprint(digest="digest", sections={"a": "1"})
+        assert fingerprint.digest == "digest"
+        assert fingerprint.sections == {"a": "1"}
+        assert repr(fingerprint) == "UciFingerprint('digest')"
+
+    def test_eq(self):
+        assert UciFingerprint(digest="a", sections={}) == UciFingerprint(digest="a", sections={"x": "y"})
+        assert UciFingerprint(digest="a", sections={}) != UciFingerprint(digest="b", sections={})
+        assert UciFingerprint(digest="a", sections={}) != "a"
+        assert len({UciFingerprint(digest="a", sections={}), UciFingerprint(digest="a", sections={})}) == 1
+
+    def test_changed(self):
+        left = UciFingerprint(digest="1", sections={"a": "1", "b": "2", "c": "3"})
+        right = UciFingerprint(digest="2", sections={"a": "1", "b": "x", "d": "4"})
+        assert left.changed(right) == ["b", "c", "d"]
+        assert right.changed(left) == ["b", "d", "c"]
+        assert not left.changed(left)
+
+
+class TestUciInterner:
+    """
+    Unit tests for UciInterner.
+    """
+
+    def test_empty(self):
+        interner = UciInterner()
+        assert len(interner) == 0
+        assert interner.hits == 0
+        assert interner.hit_rate == 0.0
+        assert repr(interner) == "UciInterner(strings=0, hit_rate=0.0%, bytes_saved=0)"
+
+    def test_intern(self):
+        interner = UciInterner()
+        first = copy("interface")
+        second = copy("interface")
+        assert first is not second
+        assert interner.intern(first) is first
+        assert interner.intern(second) is first
+        assert interner.intern("lan") == "lan"
+        assert len(interner) == 2
+        assert interner.lookups == 3
+        assert interner.hits == 1
+        assert interner.hit_rate == pytest.approx(1 / 3)
+        assert interner.bytes_saved > len("interface")
+
+    def test_intern_value(self):
+        interner = UciInterner(max_value_length=5)
+        short, long = copy("abc"), copy("abcdef")
+        assert interner.intern_value(short) is short
+        assert interner.intern_value(long) is long
+        assert interner.intern_value(copy("abcdef")) is not long
+        assert len(interner) == 1
+
+
 class TestUciFile:
     """Unit tests for UciFile."""
 
@@ -162,6 +276,11 @@ def test_init(self):
         lines = [MagicMock()]
         ucifile = UciFile(lines=lines)
         assert ucifile.lines == lines
+        assert ucifile.source is None
+        assert ucifile.tail == 0
+        ucifile = UciFile(lines=lines, source="source", tail=3)
+        assert ucifile.source == "source"
+        assert ucifile.tail == 3
 
     def test_normalized(self):
         line1 = MagicMock()
@@ -172,6 +291,44 @@ def test_normalized(self):
         ucifile = UciFile(lines=lines)
         assert ucifile.normalized() == ["line1\n", "\n", "line2\n"]  # embedded newlines are split out
 
+    def test_normalized_canonical(self):
+        text = (
+            "package network\n# header\n"
+            "config rule\n    option name 'b'\n"
+            "config interface wan\n    option proto dhcp\n    # about dns\n    list dns 2\n    list dns 1\n    option auto 0\n"
+            "config rule\n    option name 'a'\n    # trailing\n"
+            "config interface lan\n    option proto static\n"
+            "config rule allow\n    option name 'c'\n"
+        )
+        assert "".join(UciFile.from_text(text).normalized(canonical=True)) == (
+            "package network\n# header\n"
+            "\nconfig interface lan\n    option proto 'static'\n"
+            "\nconfig interface wan\n    option auto '0'\n    # about dns\n    list dns '2'\n    list dns '1'\n"
+            "    option proto 'dhcp'\n"
+            "\nconfig rule allow\n    option name 'c'\n"
+            "\nconfig rule\n    option name 'b'\n"
+            "\nconfig rule\n    option name 'a'\n    # trailing\n"
+        )
+
+    def test_normalized_canonical_order_independent(self):
+        first = UciFile.from_text("config a x\n  option p 1\n  option q 2\nconfig b\nconfig a y\nconfig b\n  option r 3\n")
+        second = UciFile.from_text("config b\nconfig a y\nconfig a x\n  option q 2\n  option p 1\nconfig b\n  option r 3\n")
+        assert first.normalized() != second.normalized()
+        assert first.normalized(canonical=True) == second.normalized(canonical=True)
+        assert UciFile.from_text("".join(first.normalized(canonical=True))).fingerprint(ordered=False) == first.fingerprint(
+            ordered=False
+        )
+
+    def test_normalized_canonical_duplicates(self):
+        text = "config a x\n  option p 2\nconfig a w\nconfig a x\n  option p 1\n"
+        assert "".join(UciFile.from_text(text).normalized(canonical=True)) == (
+            "\nconfig a w\n\nconfig a x\n    option p '2'\n\nconfig a x\n    option p '1'\n"
+        )
+
+    def test_normalized_canonical_no_sections(self):
+        assert UciFile.from_text("# only\npackage x\n").normalized(canonical=True) == ["# only\n", "package x\n"]
+        assert UciFile(lines=[]).normalized(canonical=True) == []
+
     @pytest.mark.parametrize(
         "path",
         [
@@ -233,6 +390,192 @@ def test_list_empty_value(self, original, normalized):
         ucifile = UciFile.from_lines(lines=original["list-empty-value"])
         assert "".join(ucifile.normalized()) == "".join(normalized["list-empty-value"])
 
+    def test_lossless_unchanged(self, original, real):
+        for name, lines in {**original, **real}.items():
+            if name == "README.md":
+                continue
+            text = "".join(lines)
+            ucifile = UciFile.from_text(text, lossless=True)
+            assert ucifile.source is text, name
+            assert "".join(ucifile.lossless()) == text, name
+
+    def test_lossless_no_trailing_newline(self):
+        text = 'config interface lan\n\toption  ipaddr   "10.0.0.1"   # addr'
+        ucifile = UciFile.from_text(text, lossless=True)
+        assert "".join(ucifile.lossless()) == text
+
+    def test_lossless_edit(self):
+        text = (
+            "package network  # pkg\n\n\n\tconfig interface 'lan'\n\t\toption ipaddr \"192.168.1.1\"\n\t\toption proto static\n\n"
+        )
+        ucifile = UciFile.from_text(text, lossless=True)
+        ucifile.lines[2].value = "10.0.0.1"
+        assert ucifile.lossless() == [
+            "package network  # pkg\n",
+            "\n",
+            "\n",
+            "\tconfig interface 'lan'\n",
+            "\t\toption ipaddr '10.0.0.1'\n",
+            "\t\toption proto static\n",
+            "\n",
+        ]
+
+    def test_lossless_edit_config(self):
+        text = "package network\n\n  config interface lan # comment\n    option proto static\n"
+        ucifile = UciFile.from_text(text, lossless=True)
+        ucifile.lines[1].name = "wan"
+        assert "".join(ucifile.lossless()) == text.replace("  config interface lan # comment", "  config interface wan  # comment")
+
+    def test_lossless_insert_delete(self):
+        text = "config interface lan\n  option a 1\n\n  option b 2 # two\n  option c 3\n"
+        ucifile = UciFile.from_text(text, lossless=True)
+        del ucifile.lines[2]
+        ucifile.lines.append(UciListLine(name="d", value="4"))
+        assert "".join(ucifile.lossless()) == "config interface lan\n  option a 1\n  option c 3\n    list d '4'\n"
+
+    def test_lossless_append_no_trailing_newline(self):
+        ucifile = UciFile.from_text("config a\n  option x y", lossless=True)
+        ucifile.lines.append(UciOptionLine(name="new", value="v"))
+        lines = ucifile.lossless()
+        assert lines == ["config a\n", "  option x y\n", "    option new 'v'\n"]
+        assert UciFile.from_lines(lines).normalized() == ucifile.normalized()
+
+    def test_lossless_reorder_no_trailing_newline(self):
+        ucifile = UciFile.from_text("config a\n  option z w\n  option x y", lossless=True)
+        ucifile.lines[1:] = reversed(ucifile.lines[1:])
+        lines = ucifile.lossless()
+        assert lines == ["config a\n", "  option x y\n", "  option z w\n"]
+        assert UciFile.from_lines(lines).normalized() == ucifile.normalized()
+
+    def test_lossless_not_lossless(self, original):
+        ucifile = UciFile.from_lines(original["comments"])
+        assert ucifile.lossless() == ucifile.normalized()
+
+    def test_lossless_from_file(self):
+        path = FIXTURE_DIR / "original" / "comments"
+        ucifile = UciFile.from_file(path, lossless=True)
+        assert "".join(ucifile.lossless()) == path.read_text()
+        with path.open() as fp:
+            ucifile = UciFile.from_fp(fp, lossless=True)
+        assert "".join(ucifile.lossless()) == path.read_text()
+
+    @pytest.mark.parametrize("jobs", [0, 1, 3])
+    def test_parallel(self, jobs):
+        text = firewall_text(500)
+        with patch("uciparse.uci._PARALLEL_MINIMUM", 0):
+            ucifile = UciFile.from_text(text, jobs=jobs)
+        assert ucifile.normalized() == UciFile.from_text(text).normalized()
+
+    def test_parallel_small(self):
+        with patch("uciparse.uci._parse_parallel") as parse_parallel:
+            UciFile.from_text(firewall_text(10), jobs=4)  # too small to be worth parsing in parallel
+            parse_parallel.assert_not_called()
+
+    def test_parallel_from_file(self, tmp_path):
+        (tmp_path / "firewall").write_text(firewall_text(500))
+        with patch("uciparse.uci._PARALLEL_MINIMUM", 0):
+            ucifile = UciFile.from_file(tmp_path / "firewall", jobs=2)
+        assert len(ucifile.lines) == 3501
+
+    @pytest.mark.parametrize("rule", [0, 250, 499])
+    def test_parallel_error(self, rule):
+        text = firewall_text(500).replace(f"\toption name 'rule{rule}'\n", f"\toption name 'rule{rule}\n")
+        lineno = rule * 8 + 4
+        with pytest.raises(UciParseError, match=rf"^Error on line {lineno}: invalid option line"):
+            UciFile.from_text(text)
+        with patch("uciparse.uci._PARALLEL_MINIMUM", 0):
+            with pytest.raises(UciParseError, match=rf"^Error on line {lineno}: invalid option line"):
+                UciFile.from_text(text, jobs=3)
+
+    def test_parallel_lossless(self):
+        with pytest.raises(ValueError, match=r"not supported in lossless mode"):
+            UciFile.from_text("package network\n", lossless=True, jobs=2)
+
+    @pytest.mark.skipif(not os.environ.get("UCIPARSE_BENCHMARK"), reason="set UCIPARSE_BENCHMARK=1 to run benchmarks")
+    @pytest.mark.skipif((os.cpu_count() or 1) < 4, reason="requires at least 4 CPUs")
+    def test_parallel_benchmark(self, tmp_path):
+        path = tmp_path / "firewall"
+        path.write_text(firewall_text(125000))  # a million lines
+        start = time.perf_counter()
+        sequential = UciFile.from_file(path)
+        elapsed = time.perf_counter() - start
+        start = time.perf_counter()
+        parallel = UciFile.from_file(path, jobs=0)
+        speedup = elapsed / (time.perf_counter() - start)
+        print(f"\nsequential {elapsed:.2f}s, parallel on {os.cpu_count()} CPUs {speedup:.2f}x faster")  # noqa: T201
+        assert len(parallel.lines) == len(sequential.lines)
+        assert speedup > 1.5
+
+    def test_sections(self):
+        ucifile = UciFile.from_text(
+            "package network\n"
+            "config rule\n"
+            "    option name 'a'\n"
+            "config interface lan\n"
+            "    # comment\n"
+            "config rule named\n"
+            "config rule\n"
+        )
+        sections = ucifile.sections()
+        assert [section.key for section in sections] == ["", "@rule[0]", "lan", "named", "@rule[2]"]
+        assert sections[0].config is None
+        assert isinstance(sections[0].lines[0], UciPackageLine)
+        assert sections[1].config is ucifile.lines[1]
+        assert sections[1].lines == [ucifile.lines[2]]
+        assert sections[2].lines == [ucifile.lines[4]]
+        assert not sections[4].lines
+
+    def test_sections_empty(self):
+        assert not UciFile(lines=[]).sections()
+        assert [section.key for section in UciFile.from_text("config rule\n").sections()] == ["@rule[0]"]
+
+    def test_fingerprint_ignores_formatting(self, original, normalized):
+        for name in original:
+            left = UciFile.from_lines(original[name]).fingerprint()
+            right = UciFile.from_lines(normalized[name]).fingerprint()
+            assert left == right
+            assert left.sections == right.sections
+
+    def test_fingerprint_stable(self):
+        text = "package network\nconfig interface lan\n    option ipaddr '192.168.1.1'\n"
+        assert UciFile.from_text(text).fingerprint().digest == UciFile.from_text(text).fingerprint().digest
+        assert len(UciFile.from_text(text).fingerprint().digest) == 32
+
+    def test_fingerprint_changes(self):
+        base = UciFile.from_text("config interface lan\n    option a '1'\n\nconfig interface wan\n    option a '1'\n")
+        changed = UciFile.from_text("config interface lan\n    option a '2'\n\nconfig interface wan\n    option a '1'\n")
+        assert base.fingerprint() != changed.fingerprint()
+        assert base.fingerprint().changed(changed.fingerprint()) == ["lan"]
+
+    def test_fingerprint_option_vs_list(self):
+        option = UciFile.from_text("config interface lan\n    option a '1'\n")
+        listed = UciFile.from_text("config interface lan\n    list a '1'\n")
+        assert option.fingerprint() != listed.fingerprint()
+
+    def test_fingerprint_ordered(self):
+        left = UciFile.from_text(
+            "config interface lan\n    option a '1'\n    list l 'x'\n    option b '2'\n    list l 'y'\n"
+            "config interface wan\n    option a '1'\n"
+        )
+        right = UciFile.from_text(
+            "config interface wan\n    option a '1'\n"
+            "config interface lan\n    option b '2'\n    list l 'x'\n    list l 'y'\n    option a '1'\n"
+        )
+        swapped = UciFile.from_text(
+            "config interface wan\n    option a '1'\n"
+            "config interface lan\n    option b '2'\n    list l 'y'\n    list l 'x'\n    option a '1'\n"
+        )
+        assert left.fingerprint() != right.fingerprint()
+        assert left.fingerprint(ordered=False) == right.fingerprint(ordered=False)
+        assert left.fingerprint(ordered=False).sections == right.fingerprint(ordered=False).sections
+        assert left.fingerprint(ordered=False) != swapped.fingerprint(ordered=False)  # list order always matters
+
+    def test_fingerprint_duplicate_sections(self):
+        merged = UciFile.from_text("config interface lan\n    option a '1'\nconfig interface lan\n    option b '2'\n")
+        single = UciFile.from_text("config interface lan\n    option a '1'\n    option b '2'\n")
+        assert list(merged.fingerprint().sections) == ["lan"]
+        assert merged.fingerprint() == single.fingerprint()
+
     def test_unknown_line(self, invalid):
         with pytest.raises(UciParseError, match=r"Error on line 1: unrecognized line type"):
             UciFile.from_lines(lines=invalid["unknown-line"])
@@ -280,3 +623,179 @@ def test_real(self, real):
             # just check that these real-ish files can be read and normalized successfully
             ucifile = UciFile.from_lines(lines=real[filename])
             ucifile.normalized()
+
+    @pytest.mark.parametrize(
+        "line,message",
+        [
+            ["package\n", "invalid package line"],
+            ["package", "unrecognized line type"],
+            ["packages network\n", "unrecognized line type"],
+            ["\tlist\t\n", "invalid list line"],
+            ["option a b\nc\n", "unrecognized line type"],
+            ["# a\nb\n", "unrecognized line type"],
+        ],
+    )
+    def test_line_type_invalid(self, line, message):
+        with pytest.raises(UciParseError, match=rf"^Error on line 1: {message}"):
+            UciFile.from_lines([line])
+
+    def test_line_type_whitespace(self):
+        ucifile = UciFile.from_lines(["\x0b\r\n", "  # comment \r\n", "\u2028option\xa0a\tb \x0c\n"])
+        assert ucifile.lines[0].comment == "# comment \r"  # trailing whitespace is kept in a comment
+        assert ucifile.lines[0].indented
+        assert (ucifile.lines[1].name, ucifile.lines[1].value) == ("a", "b")
+
+    def test_lazy(self, original, normalized):
+        for name, lines in original.items():
+            if name != "README.md":
+                ucifile = UciFile.from_lines(lines, lazy=True)
+                assert "".join(ucifile.normalized()) == "".join(normalized[name]), name
+
+    def test_lazy_deferred(self):
+        text = firewall_text(10)
+        with patch("uciparse.uci._parse_option") as parse_option, patch("uciparse.uci._parse_list") as parse_list:
+            ucifile = UciFile.from_text(text, lazy=True)
+            assert [section.config.section for section in ucifile.sections()[1:]] == ["rule"] * 10
+            assert all(isinstance(line, (UciOptionLine, UciListLine)) for line in ucifile.sections()[1].lines)
+            parse_option.assert_not_called()
+            parse_list.assert_not_called()
+        assert ucifile.fingerprint() == UciFile.from_text(text).fingerprint()
+
+    def test_lazy_fields(self):
+        ucifile = UciFile.from_text("config rule\n\toption name 'one'  # comment\n\tlist proto tcp\n", lazy=True)
+        option, values = ucifile.lines[1], ucifile.lines[2]
+        assert "name" not in vars(option)
+        assert (option.name, option.value, option.comment) == ("name", "one", "# comment")
+        assert (values.name, values.value, values.comment) == ("proto", "tcp", None)
+        with pytest.raises(AttributeError):
+            option.bogus  # noqa: B018
+
+    def test_lazy_assigned(self):
+        ucifile = UciFile.from_text("config rule\n\toption name 'one'  # comment\n", lazy=True)
+        ucifile.lines[1].value = "two"  # assigned before the line is parsed, so it isn't overwritten
+        assert ucifile.lines[1].normalized() == "    option name 'two'  # comment\n"
+
+    def test_lazy_invalid(self):
+        ucifile = UciFile.from_text("config rule\n\toption name 'one\n", lazy=True)
+        assert ucifile.sections()[0].config.section == "rule"
+        with pytest.raises(UciParseError, match=r"^Error on line 2: invalid option line"):
+            ucifile.lines[1].value  # noqa: B018
+        with pytest.raises(UciParseError, match=r"^Error on line 2: invalid option line"):
+            ucifile.validate()
+        ucifile = UciFile.from_text("config rule\n\tlist name 'one\n", lazy=True)
+        with pytest.raises(UciParseError, match=r"^Error on line 2: invalid list line"):
+            ucifile.validate()
+
+    def test_lazy_validate(self):
+        ucifile = UciFile.from_text(firewall_text(10), lazy=True)
+        ucifile.validate()
+        assert all(vars(line).get("_remainder") is None for line in ucifile.lines)
+        UciFile.from_text(firewall_text(10)).validate()  # nothing to do for a file that wasn't parsed lazily
+
+    def test_lazy_lossless(self):
+        with pytest.raises(ValueError, match=r"not supported in lossless mode"):
+            UciFile.from_text("package network\n", lossless=True, lazy=True)
+
+    def test_lazy_parallel(self):
+        text = firewall_text(500)
+        with patch("uciparse.uci._PARALLEL_MINIMUM", 0):
+            ucifile = UciFile.from_text(text, jobs=2, lazy=True)
+        assert ucifile.normalized() == UciFile.from_text(text).normalized()
+
+    def test_lazy_parallel_invalid(self):
+        text = firewall_text(500).replace("\toption name 'rule450'\n", "\toption name 'rule450\n")
+        with patch("uciparse.uci._PARALLEL_MINIMUM", 0):
+            ucifile = UciFile.from_text(text, jobs=2, lazy=True)
+        with pytest.raises(UciParseError, match=r"^Error on line 3604: invalid option line"):
+            ucifile.validate()
+        with pytest.raises(UciParseError, match=r"^Error on line 3604: invalid option line"):
+            UciFile.from_text(text, lazy=True).validate()
+
+    def test_max_line_length(self):
+        text = "package network\nconfig interface lan\n    option proto 'static'\r\n"
+        for lossless in (False, True):
+            assert (
+                UciFile.from_text(text, lossless=lossless, max_line_length=25).normalized() == UciFile.from_text(text).normalized()
+            )
+            with pytest.raises(UciParseError, match=r"^Error on line 3: line is longer than 24 characters"):
+                UciFile.from_text(text, lossless=lossless, max_line_length=24)
+
+    def test_max_line_length_parallel(self):
+        text = firewall_text(500).replace("\toption name 'rule250'\n", f"\toption name '{'x' * 100}'\n")
+        with patch("uciparse.uci._PARALLEL_MINIMUM", 0):
+            with pytest.raises(UciParseError, match=r"^Error on line 2004: line is longer than 80 characters"):
+                UciFile.from_text(text, jobs=3, max_line_length=80)
+
+    def test_interner(self, original, normalized):
+        interner = UciInterner()
+        for filename, lines in original.items():
+            assert UciFile.from_lines(lines, interner=interner).normalized() == normalized[filename]
+        assert interner.hits > 0
+
+    def test_interner_shared(self):
+        interner = UciInterner()
+        first = UciFile.from_text(firewall_text(10), interner=interner)
+        second = UciFile.from_text(firewall_text(10), interner=interner)
+        for left, right in zip(first.lines, second.lines, strict=True):
+            for field in ("name", "section", "value"):
+                if isinstance(getattr(left, field, None), str):
+                    assert getattr(left, field) is getattr(right, field)
+            if isinstance(left, UciOptionLine) and left.comment:
+                assert left.comment is not right.comment  # comments are never interned
+
+    @pytest.mark.parametrize("mode", [{}, {"lossless": True}, {"lazy": True}, {"jobs": 2}, {"jobs": 2, "lazy": True}])
+    def test_interner_modes(self, mode):
+        text = firewall_text(500)
+        interner = UciInterner()
+        expected = UciFile.from_text(text, interner=interner)
+        with patch("uciparse.uci._PARALLEL_MINIMUM", 0):
+            ucifile = UciFile.from_text(text, interner=interner, **mode)
+        assert ucifile.normalized() == expected.normalized()
+        assert ucifile.lines[-1].value is expected.lines[-1].value
+        assert ucifile.lines[2].value is expected.lines[2].value
+
+    def test_interner_from_file(self, tmp_path):
+        (tmp_path / "firewall").write_text(firewall_text(10))
+        interner = UciInterner()
+        UciFile.from_file(tmp_path / "firewall", interner=interner)
+        with (tmp_path / "firewall").open() as fp:
+            UciFile.from_fp(fp, interner=interner)
+        assert interner.hit_rate > 0.5
+
+
+# Lines that have caused (or could cause) regular expressions to backtrack, generated with a size
+ADVERSARIAL = {
+    "spaces in the middle": lambda n: "option a" + " " * n + "b\n",
+    "spaces in a quoted value": lambda n: "option a '" + " " * n + "b\n",
+    "spaces in a config line": lambda n: "config a" + " " * n + "b c\n",
+    "spaces then garbage": lambda n: " " * n + "garbage\n",
+    "trailing whitespace then garbage": lambda n: "option a b" + " \t" * n + "x\n",
+    "unterminated single quote": lambda n: "option a '" + "x" * n + "\n",
+    "unterminated double quote": lambda n: 'option a "' + "x " * n + "\n",
+    "many quotes": lambda n: "option a '" + "' " * n + "x\n",
+    "many closed quotes": lambda n: "option a '" + "x' " * n + "\n",
+    "comment after quote": lambda n: "option a 'x'" + " " * n + "x#\n",
+    "long name": lambda n: "option " + "a" * n + " '\n",
+    "long comment": lambda n: "#" + " #" * n + "\n",
+}
+
+
+def elapsed(line: str) -> float:
+    """Get the best time to parse a line out of several tries, whether or not it is valid."""
+    times = []
+    for _ in range(5):
+        start = time.perf_counter()
+        with suppress(UciParseError):
+            UciFile.from_lines([line])
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+class TestLinearTime:
+    """Check that the time to parse adversarial lines scales linearly with their length."""
+
+    @pytest.mark.parametrize("generator", ADVERSARIAL.values(), ids=ADVERSARIAL.keys())
+    def test_linear(self, generator):
+        # Linear time gives a ratio of about 8, while quadratic time would give a ratio of about 64
+        small, large = elapsed(generator(2000)), elapsed(generator(16000))
+        assert large / small < 24
@@ -0,0 +1,123 @@
+# vim: set ft=python ts=4 sw=4 expandtab:
+
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from uciparse.uci import UciFile
+from uciparse.watch import UciWatcher, UciWatchEvent
+
+VALID = """package network
+
+config interface lan
+    option proto 'static'
+"""
+
+CHANGED = VALID.replace("static", "dhcp")
+
+INOTIFY = pytest.mark.skipif(not sys.platform.startswith("linux"), reason="requires inotify")
+
+
+def touch(path: Path, text: str) -> None:
+    """Write a file and make sure its modification time changes, even on filesystems with coarse timestamps."""
+    mtime = path.stat().st_mtime_ns if path.exists() else 0
+    path.write_text(text, encoding="utf-8")
+    if path.stat().st_mtime_ns == mtime:
+        os.utime(path, ns=(mtime + 1_000_000_000, mtime + 1_000_000_000))
+
+
+def summary(events: list[UciWatchEvent]) -> list[tuple[str, str | None]]:
+    """Summarize events as (name, status) tuples."""
+    return [(event.name, None if not event.state else event.state.error or "ok") for event in events]
+
+
+class TestUciWatcher:
+    """Unit tests for UciWatcher state handling."""
+
+    def test_scan(self, tmp_path):
+        (tmp_path / "network").write_text(VALID)
+        (tmp_path / "bogus").write_text("bogus\n")
+        (tmp_path / ".hidden").write_text("bogus\n")
+        (tmp_path / "network~").write_text("bogus\n")
+        (tmp_path / "subdir").mkdir()
+        with UciWatcher(str(tmp_path), inotify=False) as watcher:
+            assert summary(watcher.scan()) == [("bogus", "Error on line 1: unrecognized line type"), ("network", "ok")]
+            assert "".join(watcher.states["network"].file.normalized()) == VALID
+            assert watcher.states["bogus"].file is None
+            assert not watcher.scan()  # nothing changed
+
+    def test_invalid_utf8(self, tmp_path):
+        (tmp_path / "binary").write_bytes(b"\xff\n")
+        with UciWatcher(str(tmp_path), inotify=False) as watcher:
+            assert watcher.scan()[0].state.error.startswith("File is not valid UTF-8")
+
+    def test_unchanged_not_parsed(self, tmp_path):
+        (tmp_path / "network").write_text(VALID)
+        with UciWatcher(str(tmp_path), inotify=False) as watcher:
+            watcher.scan()
+            with patch("uciparse.watch.UciFile.from_text", wraps=UciFile.from_text) as from_text:
+                touch(tmp_path / "network", VALID)  # same content, new modification time
+                assert watcher.refresh("network") is None
+                from_text.assert_not_called()
+                touch(tmp_path / "network", CHANGED)
+                assert summary([watcher.refresh("network")]) == [("network", "ok")]
+                from_text.assert_called_once()
+
+    def test_removed(self, tmp_path):
+        (tmp_path / "network").write_text(VALID)
+        with UciWatcher(str(tmp_path), inotify=False) as watcher:
+            watcher.scan()
+            (tmp_path / "network").unlink()
+            assert summary(watcher.scan()) == [("network", None)]
+            assert not watcher.states
+            assert watcher.refresh("network") is None
+
+
+class TestWatch:
+    """Unit tests for UciWatcher.watch(), with both backends."""
+
+    @pytest.fixture(params=[pytest.param(True, marks=INOTIFY, id="inotify"), pytest.param(False, id="polling")])
+    def watcher(self, request, tmp_path):
+        (tmp_path / "network").write_text(VALID)
+        with UciWatcher(str(tmp_path), debounce=0.05, interval=0.02, inotify=request.param) as watcher:
+            assert watcher.polling is not request.param
+            yield watcher
+
+    def test_change(self, watcher, tmp_path):
+        watch = watcher.watch()
+        assert summary(next(watch)) == [("network", "ok")]
+        touch(tmp_path / "network", "bogus\n")
+        assert summary(next(watch)) == [("network", "Error on line 1: unrecognized line type")]
+        (tmp_path / "dhcp").write_text("package dhcp\n")
+        assert summary(next(watch)) == [("dhcp", "ok")]
+        (tmp_path / "network").unlink()
+        assert summary(next(watch)) == [("network", None)]
+
+    def test_debounce(self, watcher, tmp_path):
+        watch = watcher.watch()
+        next(watch)
+
+        def burst() -> None:
+            for index in range(5):
+                touch(tmp_path / "network", VALID.replace("lan", f"lan{index}"))
+                time.sleep(0.01)
+
+        thread = threading.Thread(target=burst)
+        thread.start()
+        with patch("uciparse.watch.UciFile.from_text", wraps=UciFile.from_text) as from_text:
+            assert summary(next(watch)) == [("network", "ok")]
+            thread.join()
+            assert from_text.call_count == 1  # the burst was processed once, after it was done
+        assert watcher.states["network"].file.lines[1].name == "lan4"
+
+    def test_rewrite_same_content(self, watcher, tmp_path):
+        watch = watcher.watch()
+        next(watch)
+        touch(tmp_path / "network", VALID)  # no event, since the content didn't change
+        touch(tmp_path / "dhcp", "package dhcp\n")
+        assert summary(next(watch)) == [("dhcp", "ok")]
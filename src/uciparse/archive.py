@@ -0,0 +1,84 @@
+# vim: set ft=python ts=4 sw=4 expandtab:
+
+"""
+Read UCI files directly out of backup archives, without extracting them.
+
+A backup made with ``sysupgrade -b`` is a ``.tar.gz`` file containing the
+configuration files under ``etc/config/``.  Archives may be tar files (with any
+compression that the tarfile module supports) or zip files.
+
+Tar archives are read as a stream, so the archive is decompressed only once,
+and each member is parsed as soon as it is read.  Only regular files directly
+within the configuration directory are returned; anything else in the archive,
+including files in subdirectories, is skipped.  Member names may be relative
+(``etc/config/network``), start with ``./``, or be absolute.
+"""
+
+import tarfile
+import zipfile
+from collections.abc import Iterator
+
+from uciparse.uci import UciFile, UciParseError
+
+# Directory within an archive that contains the UCI files
+CONFIG_DIR = "etc/config/"
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from os import PathLike
+
+
+def _config_name(member: str, prefix: str) -> str | None:
+    """Get the name of a UCI file from the name of an archive member, or None if the member is not a UCI file."""
+    name = member.lstrip("/")
+    while name.startswith("./"):
+        name = name[2:].lstrip("/")
+    if not name.startswith(prefix):
+        return None
+    name = name[len(prefix) :]
+    return name if name and "/" not in name else None
+
+
+def _parse(member: str, data: bytes) -> UciFile:
+    """Parse the content of an archive member, identifying the member in any error."""
+    try:
+        return UciFile.from_text(data.decode())
+    except UciParseError as e:
+        raise UciParseError(f"{member}: {e.message}") from e
+    except UnicodeDecodeError as e:
+        raise UciParseError(f"{member}: File is not valid UTF-8: {e}") from e
+
+
+def _read_zip(path: "str | PathLike[str]", prefix: str) -> Iterator[tuple[str, UciFile]]:
+    """Generate (name, UciFile) for each UCI file in a zip archive."""
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            name = _config_name(info.filename, prefix)
+            if name and not info.is_dir():
+                yield name, _parse(info.filename, archive.read(info))
+
+
+def _read_tar(path: "str | PathLike[str]", prefix: str) -> Iterator[tuple[str, UciFile]]:
+    """Generate (name, UciFile) for each UCI file in a tar archive, reading it as a stream."""
+    try:
+        archive = tarfile.open(path, mode="r|*")  # noqa: SIM115  # a stream, so the archive is decompressed once
+    except tarfile.TarError as e:
+        raise UciParseError(f"Invalid archive {path}: {e}") from e
+    with archive:
+        while True:
+            try:
+                member = archive.next()
+                name = _config_name(member.name, prefix) if member and member.isfile() else None
+                fp = archive.extractfile(member) if member and name else None
+                data = fp.read() if fp else None
+            except (tarfile.TarError, EOFError) as e:
+                raise UciParseError(f"Invalid archive {path}: {e}") from e
+            if member is None:
+                break
+            if name and data is not None:
+                yield name, _parse(member.name, data)
+
+
+def read_archive(path: "str | PathLike[str]", prefix: str = CONFIG_DIR) -> Iterator[tuple[str, UciFile]]:
+    """Generate (name, UciFile) for each UCI file in a tar or zip archive, raising UciParseError if it is not valid."""
+    return _read_zip(path, prefix) if zipfile.is_zipfile(path) else _read_tar(path, prefix)
@@ -0,0 +1,822 @@
+# vim: set ft=python ts=4 sw=4 expandtab:
+
+"""
+Generate and apply ``uci batch`` command scripts.
+
+Commands
+========
+
+A command script is the input accepted by ``uci batch``, one command per line,
+like this::
+
+    set network.lan=interface
+    set network.lan.ipaddr='192.168.1.1'
+    add_list network.lan.dns='8.8.8.8'
+    del_list network.lan.dns='1.1.1.1'
+    delete network.@rule[2]
+    add network rule
+    set network.@rule[-1].name='Allow-Ping'
+    rename network.wan=uplink
+    reorder network.uplink=0
+
+Sections are addressed by name, or by ``@type[index]`` for an anonymous
+section, where the index counts every section of that type (named or not) and
+a negative index counts from the end.  Values are quoted with single quotes,
+with an embedded single quote written as ``'\\''``, like in a shell.  A
+``rename`` applies to a section (giving an anonymous section a name) or to an
+option.  Blank lines and ``commit`` commands are accepted and ignored.
+
+Diffs
+=====
+
+A diff between two files is the sequence of commands that transforms the first
+file into the second.  The diff is semantic: comments, quoting, whitespace and
+the order of options within a section are ignored, while the order of sections
+and the order of values within a list are significant.  Duplicate named
+sections are combined the way UCI combines them.
+
+Sections are matched between the two files using a hash table, the same way as
+for a three-way merge (see uciparse.merge).  Named sections are matched by
+name.  Anonymous sections are matched by type, first by identical content,
+then by their first option (often a name), and then in order of appearance, so
+removing one section doesn't cause every later section of that type to look
+modified.
+
+The commands are emitted in four phases: sections that no longer exist are
+deleted (last first, so the ``@type[index]`` of each remaining section stays
+valid), options are changed within the sections that remain, new sections are
+added at the end, and finally sections are moved into place.  Only the options
+that changed are touched.  A list is updated with ``del_list`` and
+``add_list`` when that takes fewer commands than replacing it, and sections
+are moved with one ``reorder`` for each section outside the longest run of
+sections that are already in order.
+
+A diff can be verified by replaying it onto the first file and checking that
+the result has the same content as the second file.
+
+Applying Commands
+=================
+
+Commands are applied to an in-memory model of the package, which is indexed
+so that each command is cheap no matter how large the package is: a command
+that refers to a section by name is O(1), and one that refers to a section by
+``@type[index]`` is O(log n).  The exceptions are ``reorder`` and changing the
+type of an existing section, which are O(log^2 n).  Commands are
+parsed with a single regular expression in the common case, so a script of
+100,000 commands takes a fraction of a second.
+
+The result is built from the model once all of the commands have been
+applied, so, as with ``uci commit``, comments in the original file are not
+preserved.
+
+Semantic Content
+================
+
+The model is shared with other semantic comparisons, like the fleet checks in
+uciparse.fleet.  ``UciPackageContent.from_file()`` builds the content of a
+file, as a list of ``UciSectionContent`` in ``sections``.  A
+``UciSectionMatcher`` indexes the sections of one package once, and matches
+the sections of any number of other packages against it, as for a diff.
+``section_references()`` returns the name or ``@type[index]`` of each section,
+and ``quote_value()`` quotes a value the way ``uci`` does.
+"""
+
+import random
+import re
+from bisect import bisect_left
+from collections.abc import Callable, Iterable, Iterator
+from functools import lru_cache
+from typing import NamedTuple
+
+from uciparse.convert import is_identifier, split_value
+from uciparse.uci import UciConfigLine, UciFile, UciLine, UciListLine, UciOptionLine, UciPackageLine, UciParseError
+
+# Matches a command target: package, section, optional option, and optional value
+_TARGET_REGEX = re.compile(
+    r"([a-zA-Z0-9_-]+)\.(@[a-zA-Z0-9_-]+\[-?[0-9]+\]|[a-zA-Z0-9_-]+)(?:\.([a-zA-Z0-9_-]+))?(?:=(.*))?", re.DOTALL
+)
+
+# Matches an anonymous section reference: type and index
+_REFERENCE_REGEX = re.compile(r"@([a-zA-Z0-9_-]+)\[(-?[0-9]+)\]")
+
+# Matches the common form of a command: command, package, section, optional option, and optional quoted or unquoted value
+_COMMAND_REGEX = re.compile(
+    r"(set|add_list|del_list|delete|rename|reorder) ([a-zA-Z0-9_-]+)\.(@[a-zA-Z0-9_-]+\[-?[0-9]+\]|[a-zA-Z0-9_-]+)"
+    r"(?:\.([a-zA-Z0-9_-]+))?(?:='([^']*)'|=([^\s'\"\\]*))?\s*"
+)
+
+# Matches the common form of an add command: package and type
+_ADD_REGEX = re.compile(r"add ([a-zA-Z0-9_-]+) ([a-zA-Z0-9_-]+)\s*")
+
+# Commands that take a target (package.section or package.section.option)
+_TARGET_COMMANDS = frozenset({"set", "add_list", "del_list", "delete", "rename", "reorder"})
+
+# Commands whose value is an option value, which is quoted when the command is formatted
+_VALUE_COMMANDS = frozenset({"set", "add_list", "del_list"})
+
+# Random numbers for balancing trees, seeded so that the shape of a tree can be reproduced
+_RANDOM = random.Random(0)  # noqa: S311
+
+
+class UciCommand(NamedTuple):
+    """
+    A single uci batch command.
+
+    For ``add``, the section is None and the value is the type of the new
+    section.  For ``delete``, the value is None.  For any other command on a
+    section (rather than an option), the value is the section type (``set``),
+    the new position (``reorder``) or the new name (``rename``).
+    """
+
+    command: str
+    package: str
+    section: str | None
+    option: str | None = None
+    value: str | None = None
+
+    def __str__(self) -> str:
+        if self.section is None:
+            return f"{self.command} {self.package} {self.value}"
+        target = f"{self.package}.{self.section}" if self.option is None else f"{self.package}.{self.section}.{self.option}"
+        if self.value is None:
+            return f"{self.command} {target}"
+        if self.option is not None and self.command in _VALUE_COMMANDS:
+            return f"{self.command} {target}={quote_value(self.value)}"
+        return f"{self.command} {target}={self.value}"
+
+
+def quote_value(value: str) -> str:
+    """Quote a value with single quotes, like a shell would."""
+    return "'" + value.replace("'", "'\\''") + "'"
+
+
+def _check_command(lineno: int, command: str, target: "tuple[str, str, str | None, str | None]") -> UciCommand:
+    """Check that a command has the right form of target, returning the command."""
+    package, section, option, value = target
+    if command not in _TARGET_COMMANDS:
+        raise UciParseError(f"Error on line {lineno}: unknown command {command}")
+    if (value is None) != (command == "delete"):
+        raise UciParseError(f"Error on line {lineno}: invalid {command} command")
+    if option is None and command in {"add_list", "del_list"}:
+        raise UciParseError(f"Error on line {lineno}: invalid {command} command")
+    if option is not None and command == "reorder":
+        raise UciParseError(f"Error on line {lineno}: invalid {command} command")
+    if (command == "rename" or (command == "set" and option is None)) and not is_identifier(value or ""):
+        raise UciParseError(f"Error on line {lineno}: invalid {command} command")
+    return UciCommand(command, package, section, option, value)
+
+
+def _parse_command(lineno: int, line: str) -> UciCommand | None:
+    """Parse a single command line, returning None for a line that is blank or has no effect."""
+    # The fast path handles the common case of a target with a single-quoted or unquoted value
+    match = _COMMAND_REGEX.fullmatch(line)
+    if match:
+        value = match[5] if match[5] is not None else match[6]
+        if match[1] == "set" and value is not None and (match[4] is not None or is_identifier(value)):
+            return UciCommand("set", match[2], match[3], match[4], value)  # always valid
+        return _check_command(lineno, match[1], (match[2], match[3], match[4], value))
+    match = _ADD_REGEX.fullmatch(line)
+    if match:
+        return UciCommand("add", match[1], None, None, match[2])
+
+    try:
+        words = split_value(line.strip())
+    except ValueError as e:
+        raise UciParseError(f"Error on line {lineno}: invalid command: {e}") from e
+    if not words or words[0] == "commit":
+        return None
+    command, arguments = words[0], words[1:]
+    if command == "add":
+        if len(arguments) != 2 or not all(is_identifier(argument) for argument in arguments):
+            raise UciParseError(f"Error on line {lineno}: invalid add command")
+        return UciCommand(command, arguments[0], None, None, arguments[1])
+    target = _TARGET_REGEX.fullmatch(arguments[0]) if command in _TARGET_COMMANDS and len(arguments) == 1 else None
+    if command in _TARGET_COMMANDS and not target:
+        raise UciParseError(f"Error on line {lineno}: invalid {command} command")
+    package, section, option, value = target.groups() if target else ("", "", None, None)
+    return _check_command(lineno, command, (package, section, option, value))
+
+
+def parse_commands(lines: Iterable[str]) -> Iterator[UciCommand]:
+    """Generate the commands in a uci batch script, raising UciParseError if a command is not valid."""
+    for lineno, line in enumerate(lines, start=1):
+        command = _parse_command(lineno, line)
+        if command is not None:
+            yield command
+
+
+@lru_cache(maxsize=1024)
+def _parse_reference(reference: str) -> tuple[str, int] | None:
+    """Parse an @type[index] reference, which scripts tend to repeat, into its type and index."""
+    match = _REFERENCE_REGEX.fullmatch(reference)
+    return (match[1], int(match[2])) if match else None
+
+
+class _Node:
+    """A node in an order-statistics tree, holding one section."""
+
+    __slots__ = ("item", "left", "parent", "right", "size")
+
+    def __init__(self, item: "UciSectionContent") -> None:
+        self.item = item
+        self.left: _Node | None = None
+        self.right: _Node | None = None
+        self.parent: _Node | None = None
+        self.size = 1  # number of nodes in the subtree rooted here
+
+
+def _update(node: _Node) -> _Node:
+    """Recompute the size of a node after its children change, pointing the children back at it."""
+    node.size = 1
+    if node.left is not None:
+        node.size += node.left.size
+        node.left.parent = node
+    if node.right is not None:
+        node.size += node.right.size
+        node.right.parent = node
+    return node
+
+
+def _build(nodes: list[_Node], start: int, stop: int) -> _Node | None:
+    """Build a balanced tree from a slice of a list of nodes, in O(n)."""
+    if start == stop:
+        return None
+    middle = (start + stop) // 2
+    node = nodes[middle]
+    node.left, node.right = _build(nodes, start, middle), _build(nodes, middle + 1, stop)
+    return _update(node)
+
+
+def _merge(left: _Node | None, right: _Node | None) -> _Node | None:
+    """Concatenate two trees, choosing the root from either side at random in proportion to its size, which keeps the tree balanced."""
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if _RANDOM.random() * (left.size + right.size) < left.size:
+        left.right = _merge(left.right, right)
+        return _update(left)
+    right.left = _merge(left, right.left)
+    return _update(right)
+
+
+def _split(node: _Node | None, count: int) -> tuple[_Node | None, _Node | None]:
+    """Split a tree into a tree of its first ``count`` nodes and a tree of the rest."""
+    if node is None:
+        return None, None
+    left = node.left.size if node.left is not None else 0
+    if count <= left:
+        first, rest = _split(node.left, count)
+        node.left = rest
+        return first, _update(node)
+    first, rest = _split(node.right, count - left - 1)
+    node.right = first
+    return _update(node), rest
+
+
+class _Sequence:
+    """
+    A sequence of sections, as an order-statistics tree, for finding a section by index and the index of a section.
+
+    This is a randomized binary search tree ordered by position, where each
+    node holds the size of its subtree and a pointer to its parent.  Finding
+    the section at an index, finding the index of a section from its node, and
+    inserting or removing a section anywhere are all O(log n).
+    """
+
+    def __init__(self, nodes: list[_Node] | None = None) -> None:
+        self.root = _build(nodes, 0, len(nodes)) if nodes else None
+        if self.root is not None:
+            self.root.parent = None
+
+    def __len__(self) -> int:
+        return self.root.size if self.root is not None else 0
+
+    def __iter__(self) -> "Iterator[UciSectionContent]":
+        stack: list[_Node] = []
+        node = self.root
+        while stack or node is not None:
+            while node is not None:
+                stack.append(node)
+                node = node.left
+            node = stack.pop()
+            yield node.item
+            node = node.right
+
+    def _set_root(self, root: _Node | None) -> None:
+        """Set the root of the tree after a split or merge."""
+        self.root = root
+        if root is not None:
+            root.parent = None
+
+    def find(self, index: int) -> "UciSectionContent | None":
+        """Find the section at an index, counting from the end if the index is negative."""
+        if index < 0:
+            index += len(self)
+        node = self.root if 0 <= index < len(self) else None
+        while node is not None:
+            left = node.left.size if node.left is not None else 0
+            if index == left:
+                return node.item
+            if index < left:
+                node = node.left
+            else:
+                index -= left + 1
+                node = node.right
+        return None
+
+    @staticmethod
+    def index(node: _Node) -> int:
+        """Return the index of the section held by a node, which must be in the sequence."""
+        index = node.left.size if node.left is not None else 0
+        while node.parent is not None:
+            if node.parent.right is node:
+                index += 1 + (node.parent.left.size if node.parent.left is not None else 0)
+            node = node.parent
+        return index
+
+    def bisect(self, key: "Callable[[UciSectionContent], int]", value: int) -> int:
+        """Return the number of sections whose key is less than a value, for sections that are in order by that key."""
+        count, node = 0, self.root
+        while node is not None:
+            if key(node.item) < value:
+                count += 1 + (node.left.size if node.left is not None else 0)
+                node = node.right
+            else:
+                node = node.left
+        return count
+
+    def append(self, node: _Node) -> None:
+        """Add the section held by a node at the end."""
+        self._set_root(_merge(self.root, node))
+
+    def insert(self, index: int, node: _Node) -> None:
+        """Insert the section held by a node at an index, or at the end if the index is past the end."""
+        first, rest = _split(self.root, index)
+        self._set_root(_merge(_merge(first, node), rest))
+
+    def remove(self, node: _Node) -> None:
+        """Remove the section held by a node, which must be in the sequence, so the node can be inserted again."""
+        child, parent = _merge(node.left, node.right), node.parent
+        if child is not None:
+            child.parent = parent
+        if parent is None:
+            self.root = child
+        elif parent.left is node:
+            parent.left = child
+        else:
+            parent.right = child
+        while parent is not None:
+            parent.size -= 1
+            parent = parent.parent
+        node.left = node.right = node.parent = None
+        node.size = 1
+
+
+class UciSectionContent:
+    """The semantic content of a section: its type, its name, and its values keyed by option name."""
+
+    __slots__ = ("name", "node", "options", "type", "type_node")
+
+    def __init__(self, section_type: str, name: str | None) -> None:
+        self.type = section_type
+        self.name = name
+        self.options: dict[str, str | list[str]] = {}
+        self.node: _Node  # node in the sequence of the sections in its package, once the package is indexed
+        self.type_node: _Node  # node in the sequence of the sections of its type, once the package is indexed
+
+    def add_list(self, option: str, value: str) -> None:
+        """Add a value to a list, converting an option into a list the way UCI does."""
+        current = self.options.get(option)
+        if isinstance(current, list):
+            current.append(value)
+        else:
+            self.options[option] = [value] if current is None else [current, value]
+
+    def content(self) -> tuple[object, ...]:
+        """Return a hashable representation of the content of the section, ignoring the order of options."""
+        values = ((name, tuple(value) if isinstance(value, list) else value) for name, value in self.options.items())
+        return self.type, tuple(sorted(values))
+
+
+class UciPackageContent:
+    """
+    The semantic content of a package, indexed so that commands can be applied to it.
+
+    Named sections are indexed by name.  The first time a section is found by
+    ``@type[index]`` or the sections change, the sections are also indexed by
+    position, in a sequence of all of the sections and a sequence for each type
+    (see _Sequence), which a diff never needs.  Any command that finds a
+    section by name is O(1), any command that finds a section by
+    ``@type[index]`` or adds or deletes a section is O(log n), and moving a
+    section or changing its type, which finds its place among the sections of
+    its type by comparing positions, is O(log^2 n).
+    """
+
+    def __init__(self, name: str | None, sections: list[UciSectionContent] | None = None) -> None:
+        self.name = name
+        self.named = {section.name: section for section in sections or [] if section.name}
+        self.order = _Sequence()
+        self.typed: dict[str, _Sequence] = {}
+        self._sections: list[UciSectionContent] | None = sections or []  # the sections in order, until they change
+        self._indexed = False
+
+    @staticmethod
+    def from_file(file: UciFile) -> "UciPackageContent":
+        """Build the semantic content of a file, combining duplicate named sections the way UCI does."""
+        name: str | None = None
+        sections: list[UciSectionContent] = []
+        named: dict[str, UciSectionContent] = {}
+        section: UciSectionContent | None = None
+        for line in file.lines:
+            if isinstance(line, UciPackageLine):
+                name = name or line.name
+            elif isinstance(line, UciConfigLine):
+                section = named.get(line.name) if line.name else None
+                if section is not None:
+                    section.type = line.section  # the last definition sets the type
+                else:
+                    section = UciSectionContent(line.section, line.name)
+                    sections.append(section)
+                    if line.name:
+                        named[line.name] = section
+            elif section is not None and isinstance(line, UciOptionLine):
+                section.options[line.name] = line.value
+            elif section is not None and isinstance(line, UciListLine):
+                section.add_list(line.name, line.value)
+        return UciPackageContent(name, sections)
+
+    @property
+    def sections(self) -> list[UciSectionContent]:
+        """The sections, in order, as a list that is kept until the sections next change."""
+        if self._sections is None:
+            self._sections = list(self.order)
+        return self._sections
+
+    def _index(self) -> None:
+        """Index the sections by position, if they aren't indexed yet."""
+        if not self._indexed:
+            typed: dict[str, list[_Node]] = {}
+            for section in self.sections:
+                section.node, section.type_node = _Node(section), _Node(section)
+                typed.setdefault(section.type, []).append(section.type_node)
+            self.order = _Sequence([section.node for section in self.sections])
+            self.typed = {section_type: _Sequence(nodes) for section_type, nodes in typed.items()}
+            self._indexed = True
+
+    def position(self, section: UciSectionContent) -> int:
+        """Return the position of a section within the package."""
+        self._index()
+        return _Sequence.index(section.node)
+
+    def reference(self, section: UciSectionContent) -> str:
+        """Return the reference for a section: its name, or @type[index] for an anonymous section."""
+        self._index()
+        return section.name or f"@{section.type}[{_Sequence.index(section.type_node)}]"
+
+    def to_file(self) -> UciFile:
+        """Build a file from the semantic content."""
+        lines: list[UciLine] = [UciPackageLine(name=self.name)] if self.name else []
+        for section in self.sections:
+            lines.append(UciConfigLine(section=section.type, name=section.name))
+            for name, value in section.options.items():
+                if isinstance(value, list):
+                    lines.extend(UciListLine(name=name, value=item) for item in value)
+                else:
+                    lines.append(UciOptionLine(name=name, value=value))
+        return UciFile(lines=lines)
+
+    def content(self) -> list[tuple[str, str | None, dict[str, str | list[str]]]]:
+        """Return the content of the package for comparison, ignoring the order of options."""
+        return [(section.type, section.name, section.options) for section in self.sections]
+
+    def define(self, section_type: str, name: str | None) -> UciSectionContent:
+        """Define a section, changing the type of an existing named section or adding a new section at the end."""
+        section = self.named.get(name) if name else None
+        if section is not None:
+            self._retype(section, section_type)
+            return section
+        self._index()
+        section = UciSectionContent(section_type, name)
+        section.node, section.type_node = _Node(section), _Node(section)
+        self.order.append(section.node)
+        self.typed.setdefault(section_type, _Sequence()).append(section.type_node)
+        if name:
+            self.named[name] = section
+        self._sections = None
+        return section
+
+    def find(self, reference: str) -> UciSectionContent | None:
+        """Find a section by name or by @type[index] reference."""
+        if reference[0] != "@":
+            return self.named.get(reference)
+        parsed = _parse_reference(reference)
+        self._index()
+        sequence = self.typed.get(parsed[0]) if parsed else None
+        return sequence.find(parsed[1]) if parsed and sequence else None
+
+    def apply(self, lineno: int, command: UciCommand) -> None:
+        """Apply a single command, raising UciParseError if it can't be applied."""
+        if command.package != self.name:
+            if self.name is not None:
+                raise UciParseError(f"Error on line {lineno}: command for package {command.package} in package {self.name}")
+            self.name = command.package
+        if command.section is None:
+            self.define(command.value or "", None)
+            return
+        section = self.find(command.section)
+        if section is None:
+            if command.command != "set" or command.option is not None or command.section[0] == "@":
+                raise UciParseError(f"Error on line {lineno}: section not found: {command.section}")
+            self.define(command.value or "", command.section)
+        elif command.option is not None:
+            self._apply_option(lineno, section, command)
+        elif command.command == "set":
+            self._retype(section, command.value or "")
+        elif command.command == "delete":
+            self._delete(section)
+        elif command.command == "rename":
+            self._rename(lineno, section, command.value or "")
+        else:
+            if not (command.value or "").isdigit():
+                raise UciParseError(f"Error on line {lineno}: invalid position: {command.value}")
+            self.move(section, int(command.value or ""))
+
+    @staticmethod
+    def _apply_option(lineno: int, section: UciSectionContent, command: UciCommand) -> None:
+        """Apply a single command to an option within a section."""
+        option, value = command.option or "", command.value or ""
+        if command.command == "set":
+            section.options[option] = value
+        elif command.command == "add_list":
+            section.add_list(option, value)
+        elif option not in section.options:
+            raise UciParseError(f"Error on line {lineno}: option not found: {command.section}.{option}")
+        elif command.command == "delete":
+            del section.options[option]
+        elif command.command == "rename":
+            if value in section.options and value != option:
+                raise UciParseError(f"Error on line {lineno}: option already exists: {command.section}.{value}")
+            section.options = {value if name == option else name: item for name, item in section.options.items()}
+        else:
+            current = section.options[option]
+            remaining = [item for item in current if item != value] if isinstance(current, list) else current
+            if remaining:
+                section.options[option] = remaining
+            else:
+                del section.options[option]
+
+    def _delete(self, section: UciSectionContent) -> None:
+        """Delete a section."""
+        self._index()
+        self.order.remove(section.node)
+        self.typed[section.type].remove(section.type_node)
+        if section.name:
+            del self.named[section.name]
+        self._sections = None
+
+    def _rename(self, lineno: int, section: UciSectionContent, name: str) -> None:
+        """Rename a section, which may be anonymous."""
+        if name in self.named and self.named[name] is not section:
+            raise UciParseError(f"Error on line {lineno}: section already exists: {name}")
+        if section.name:
+            del self.named[section.name]
+        section.name = name
+        self.named[name] = section
+
+    def _retype(self, section: UciSectionContent, section_type: str) -> None:
+        """Change the type of a section."""
+        if section.type != section_type:
+            self._index()
+            self.typed[section.type].remove(section.type_node)
+            section.type = section_type
+            self._place(section)
+
+    def move(self, section: UciSectionContent, position: int) -> None:
+        """Move a section to a position within the package, or to the end if the position is past the end."""
+        self._index()
+        self.order.remove(section.node)
+        self.order.insert(position, section.node)
+        self.typed[section.type].remove(section.type_node)
+        self._place(section)
+        self._sections = None
+
+    def _place(self, section: UciSectionContent) -> None:
+        """Insert a section into the sequence for its type, in the same order as the sections in the package."""
+        sequence = self.typed.setdefault(section.type, _Sequence())
+        sequence.insert(sequence.bisect(self.position, self.position(section)), section.type_node)
+
+
+def apply_commands(file: UciFile, commands: Iterable[UciCommand]) -> UciFile:
+    """Apply commands to a file, returning a new file in normalized form, and raising UciParseError on failure."""
+    package = UciPackageContent.from_file(file)
+    for lineno, command in enumerate(commands, start=1):
+        package.apply(lineno, command)
+    return package.to_file()
+
+
+def verify_commands(a: UciFile, b: UciFile, commands: Iterable[UciCommand]) -> bool:
+    """Whether applying commands to the first file reproduces the second file."""
+    package = UciPackageContent.from_file(a)
+    try:
+        for lineno, command in enumerate(commands, start=1):
+            package.apply(lineno, command)
+    except UciParseError:
+        return False
+    return package.content() == UciPackageContent.from_file(b).content()
+
+
+def section_references(sections: list[UciSectionContent]) -> list[str]:
+    """Return the reference for each section in a package: its name, or @type[index] for an anonymous section."""
+    counts: dict[str, int] = {}
+    references: list[str] = []
+    for section in sections:
+        count = counts.get(section.type, 0)
+        counts[section.type] = count + 1
+        references.append(section.name or f"@{section.type}[{count}]")
+    return references
+
+
+def _first_option(section: UciSectionContent) -> tuple[object, ...]:
+    """Return a hashable key for a section made from its type and its first option."""
+    for name, value in section.options.items():
+        return section.type, name, tuple(value) if isinstance(value, list) else value
+    return (section.type,)
+
+
+def _type(section: UciSectionContent) -> tuple[object, ...]:
+    """Return a hashable key for a section made from its type."""
+    return (section.type,)
+
+
+class UciSectionMatcher:
+    """
+    An index of the sections in a package, built once, for matching the sections of other packages against it.
+
+    Named sections are matched by name.  Anonymous sections are matched by
+    type, first by identical content, then by their first option (often a
+    name), and then in order of appearance.
+    """
+
+    _KEYS: tuple[Callable[[UciSectionContent], tuple[object, ...]], ...] = (UciSectionContent.content, _first_option, _type)
+
+    def __init__(self, package: UciPackageContent) -> None:
+        self.names = {section.name: index for index, section in enumerate(package.sections) if section.name}
+        self.tables: list[dict[tuple[object, ...], list[int]]] = [{} for _ in self._KEYS]
+        for index, section in enumerate(package.sections):
+            if not section.name:
+                for table, key in zip(self.tables, self._KEYS, strict=True):
+                    table.setdefault(key(section), []).append(index)
+
+    def match(self, other: UciPackageContent) -> dict[int, int]:
+        """Match the sections in another package, returning the index in this package for each matched index in the other."""
+        matched: dict[int, int] = {}
+        pending: list[int] = []
+        for index, section in enumerate(other.sections):
+            if not section.name:
+                pending.append(index)
+            elif section.name in self.names:
+                matched[index] = self.names[section.name]
+
+        used: set[int] = set()
+        for table, key in zip(self.tables, self._KEYS, strict=True):
+            positions: dict[tuple[object, ...], int] = {}  # the first candidate for each key that might not be used yet
+            unmatched: list[int] = []
+            for index in pending:
+                value = key(other.sections[index])
+                candidates = table.get(value, [])
+                position = positions.get(value, 0)
+                while position < len(candidates) and candidates[position] in used:
+                    position += 1
+                if position < len(candidates):
+                    matched[index] = candidates[position]
+                    used.add(candidates[position])
+                    position += 1
+                else:
+                    unmatched.append(index)
+                positions[value] = position
+            pending = unmatched
+        return matched
+
+
+def _diff_list(target: tuple[str, str, str], before: str | list[str] | None, after: list[str]) -> list[UciCommand]:
+    """Return the fewest commands that change an option or list into a list."""
+    replace = [UciCommand("delete", *target)] if before is not None else []
+    replace.extend(UciCommand("add_list", *target, value) for value in after)
+    if before is None:
+        return replace
+    values = set(after)
+    current = [before] if isinstance(before, str) else before  # add_list converts an option into a list
+    kept = [value for value in current if value in values]
+    removed = dict.fromkeys(value for value in current if value not in values)  # del_list removes every copy
+    if after[: len(kept)] != kept or (isinstance(before, str) and (removed or len(after) == 1)):
+        return replace
+    incremental = [UciCommand("del_list", *target, value) for value in removed]
+    incremental.extend(UciCommand("add_list", *target, value) for value in after[len(kept) :])
+    return incremental if len(incremental) < len(replace) else replace
+
+
+def _diff_section(package: str, reference: str, before: UciSectionContent | None, after: UciSectionContent) -> list[UciCommand]:
+    """Return the commands that change the options in one section into the options in another."""
+    options = before.options if before else {}
+    commands = [UciCommand("delete", package, reference, name) for name in options if name not in after.options]
+    for name, value in after.options.items():
+        current = options.get(name)
+        if value == current:
+            continue
+        if isinstance(value, list):
+            commands.extend(_diff_list((package, reference, name), current, value))
+        else:
+            commands.append(UciCommand("set", package, reference, name, value))
+    return commands
+
+
+def _longest_run(sequence: list[int]) -> set[int]:
+    """Return the values in a longest increasing subsequence of distinct values, in O(n log n)."""
+    tails: list[int] = []  # smallest final value of an increasing subsequence of each length
+    tail_positions: list[int] = []
+    previous: list[int] = []  # position of the previous value in the subsequence ending at each position
+    for position, value in enumerate(sequence):
+        length = bisect_left(tails, value)
+        if length == len(tails):
+            tails.append(value)
+            tail_positions.append(position)
+        else:
+            tails[length] = value
+            tail_positions[length] = position
+        previous.append(tail_positions[length - 1] if length else -1)
+    result: set[int] = set()
+    position = tail_positions[-1] if tail_positions else -1
+    while position >= 0:
+        result.add(sequence[position])
+        position = previous[position]
+    return result
+
+
+def _reorder(package: str, current: list[int], sections: list[UciSectionContent]) -> list[UciCommand]:
+    """Return the reorder commands that sort a list of section indexes, moving the fewest sections, in O(n log^2 n)."""
+    commands: list[UciCommand] = []
+    fixed = _longest_run(current)
+    # The moves are made on a copy of the package, which keeps the position and reference of each section up to date
+    copies = {index: UciSectionContent(sections[index].type, sections[index].name) for index in current}
+    model = UciPackageContent(package, [copies[index] for index in current])
+    for index in range(len(current)):
+        if index in fixed:
+            continue
+        # Each section is moved to just after its predecessor, which is already in place relative to the fixed sections
+        section = copies[index]
+        reference = model.reference(section)
+        position = 0
+        if index:
+            position = model.position(copies[index - 1])
+            position += 0 if model.position(section) < position else 1  # the predecessor moves up when the section is removed
+        model.move(section, position)
+        commands.append(UciCommand("reorder", package, reference, None, str(position)))
+    return commands
+
+
+def diff_commands(a: UciFile, b: UciFile, package: str | None = None) -> list[UciCommand]:
+    """
+    Return the commands that transform one file into another; see uciparse.batch for details.
+
+    The package name is taken from the package line of either file, or from
+    ``package`` if neither file has one.  ValueError is raised if there is no
+    package name or if the files name different packages.
+    """
+    before, after = UciPackageContent.from_file(a), UciPackageContent.from_file(b)
+    if before.name and after.name and before.name != after.name:
+        raise ValueError(f"Files are for different packages: {before.name} and {after.name}")
+    package = after.name or before.name or package
+    if not package:
+        raise ValueError("A package name is required, since neither file has a package line")
+
+    matched = UciSectionMatcher(before).match(after)
+    kept = {index: other for other, index in matched.items()}
+    commands: list[UciCommand] = []
+
+    references = section_references(before.sections)
+    commands.extend(
+        UciCommand("delete", package, references[index]) for index in reversed(range(len(before.sections))) if index not in kept
+    )
+
+    survivors = [index for index in range(len(before.sections)) if index in kept]
+    references = section_references([before.sections[index] for index in survivors])
+    retyped: list[UciCommand] = []
+    for index, reference in zip(survivors, references, strict=True):
+        section, target = before.sections[index], after.sections[kept[index]]
+        commands.extend(_diff_section(package, reference, section, target))
+        if section.type != target.type:  # only a named section can change type, but that shifts @type[index], so do it last
+            retyped.append(UciCommand("set", package, reference, None, target.type))
+    commands.extend(retyped)
+
+    added = [index for index in range(len(after.sections)) if index not in matched]
+    for index in added:
+        section = after.sections[index]
+        if section.name:
+            commands.append(UciCommand("set", package, section.name, None, section.type))
+        else:
+            commands.append(UciCommand("add", package, None, None, section.type))
+        commands.extend(_diff_section(package, section.name or f"@{section.type}[-1]", None, section))
+
+    commands.extend(_reorder(package, [kept[index] for index in survivors] + added, after.sections))
+    return commands
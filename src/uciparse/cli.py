@@ -2,17 +2,233 @@
 
 """
 Implementations for command-line (CLI) tools.
+
+These tools are often run many times in a row from shell pipelines, so startup
+time matters.  Each command imports only the modules it actually needs, at the
+point it needs them, rather than importing everything at the top of this module.
 """
 
-import argparse
-import difflib
 import sys
 
-from uciparse.uci import UciFile, UciParseError
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from argparse import Namespace
+    from collections.abc import Iterator
+    from contextlib import AbstractContextManager
+
+    from uciparse.uci import UciFile
+
+
+def _profiler(args: "Namespace") -> "AbstractContextManager[object]":
+    """Return a profiler for the command if --profile or --trace-memory was given, or a context that does nothing."""
+    if not args.profile and not args.trace_memory:
+        from contextlib import nullcontext
+
+        return nullcontext()
+    from uciparse.profiling import UciProfiler
+
+    return UciProfiler(args.profile, trace_memory=args.trace_memory)
+
+
+def _phase(name: str) -> "AbstractContextManager[object]":
+    """Return a context that times a phase of the command if it's being profiled, or a context that does nothing."""
+    if "uciparse.profiling" not in sys.modules:  # not profiling, since _profiler() didn't import it
+        from contextlib import nullcontext
+
+        return nullcontext()
+    from uciparse.profiling import phase
+
+    return phase(name)
+
+
+def _load(source: str, path: str) -> "Iterator[UciFile]":
+    """Load UCI files from a path (or '-' for stdin) in the indicated source format."""
+    if source == "show":
+        from uciparse.convert import from_show
+
+        if path == "-":
+            yield from from_show(sys.stdin)
+        else:
+            with open(path, encoding=None) as fp:  # noqa: PTH123  # use platform-specific encoding
+                yield from from_show(fp)
+    elif source == "json":
+        from uciparse.convert import from_json
+
+        if path == "-":
+            yield from_json(sys.stdin.read())
+        else:
+            with open(path, encoding=None) as fp:  # noqa: FURB101,PTH123  # use platform-specific encoding
+                yield from_json(fp.read())
+    else:
+        from uciparse.uci import UciFile
+
+        yield UciFile.from_fp(sys.stdin) if path == "-" else UciFile.from_file(path)
+
+
+def _normalize_remote(socket: str, path: str, source: str) -> str:
+    """Normalize a path (or '-' for stdin) using a server running on a Unix socket."""
+    from uciparse.server import UciClient
+
+    with UciClient(socket) as client:
+        if path == "-":
+            return client.normalize(text=sys.stdin.read(), source=source)
+        return client.normalize(path=path, source=source)
+
+
+def _diff_archives(a: str, b: str) -> list[str]:
+    """Generate a unified diff between the normalized UCI files within two backup archives."""
+    from uciparse.archive import read_archive
+    from uciparse.diff import unified_diff
+
+    a_files, b_files = dict(read_archive(a)), dict(read_archive(b))
+    result: list[str] = []
+    for name in sorted(a_files.keys() | b_files.keys()):
+        a_lines = a_files[name].normalized() if name in a_files else []
+        b_lines = b_files[name].normalized() if name in b_files else []
+        result.extend(unified_diff(a=a_lines, b=b_lines, fromfile=f"{a}:{name}", tofile=f"{b}:{name}"))
+    return result
+
+
+def _diff_batch(a: "UciFile", b: "UciFile", path: str) -> list[str]:
+    """Generate the uci batch commands that transform one file into another, checking that they do."""
+    import os
+
+    from uciparse.batch import diff_commands, verify_commands
+
+    commands = diff_commands(a, b, package=os.path.basename(path))  # noqa: PTH119  # used if there's no package line
+    if not verify_commands(a, b, commands):
+        raise ValueError(f"Generated commands do not reproduce {path}")
+    return [f"{command}\n" for command in commands]
+
+
+def _diff_files(a: str, b: str, diff_format: str) -> list[str]:
+    """Generate a diff between two UCI files, in the named format, timing each phase if profiling."""
+    from uciparse.diff import unified_diff
+    from uciparse.uci import UciFile
+
+    with _phase("parse"):
+        a_file, b_file = UciFile.from_file(a), UciFile.from_file(b)
+    if diff_format == "uci-batch":
+        with _phase("diff"):
+            return _diff_batch(a_file, b_file, b)
+    with _phase("normalize"):
+        a_lines, b_lines = a_file.normalized(), b_file.normalized()
+    with _phase("diff"):
+        return list(unified_diff(a=a_lines, b=b_lines, fromfile=a, tofile=b))
+
+
+def _device_paths(paths: list[str]) -> list[str]:
+    """Expand directories into the regular files within them, in sorted order."""
+    import os
+
+    result = []
+    for path in paths:
+        if os.path.isdir(path):  # noqa: PTH112
+            with os.scandir(path) as entries:
+                result.extend(sorted(entry.path for entry in entries if entry.is_file()))
+        else:
+            result.append(path)
+    return result
+
+
+def _diff_fleet(golden: str, paths: list[str], jobs: int | None) -> bool:
+    """Check device files against a golden file, reporting deviations and a summary; returns whether all devices match."""
+    from uciparse.fleet import UciTemplate, compare_fleet, drift
+    from uciparse.uci import UciFile
+
+    with _phase("parse"):
+        template = UciTemplate(UciFile.from_file(golden))
+    results = []
+    with _phase("compare"):
+        for result in compare_fleet(template, _device_paths(paths), jobs=jobs):
+            if result.error:
+                sys.stdout.write(f"{result.path}: error: {result.error}\n")
+            sys.stdout.writelines(f"{result.path}: {deviation}\n" for deviation in result.deviations)
+            results.append(result)
+    failed = sum(1 for result in results if result.error or result.deviations)
+    sys.stdout.write(f"Summary: {failed} of {len(results)} devices deviate from {golden}\n")
+    sys.stdout.writelines(f"  {count:>5} {location}\n" for location, count in drift(results).most_common())
+    return failed == 0
+
+
+def _validate(schema: str, paths: list[str]) -> bool:
+    """Validate files against a schema, reporting each problem; returns whether all files are valid."""
+    import os
+
+    from uciparse.schema import UciSchema
+    from uciparse.uci import UciFile, UciParseError
+
+    try:
+        compiled = UciSchema.from_file(schema)
+    except (OSError, ValueError) as e:
+        sys.stderr.write(f"{e}\n")
+        raise SystemExit from e
+    valid = True
+    for path in _device_paths(paths):
+        try:
+            with _phase("parse"):
+                ucifile = UciFile.from_file(path)
+            with _phase("validate"):
+                violations = compiled.validate(ucifile, package=os.path.basename(path))  # noqa: PTH119
+        except (OSError, UciParseError) as e:
+            sys.stdout.write(f"{path}: error: {e.message if isinstance(e, UciParseError) else e}\n")
+            valid = False
+            continue
+        sys.stdout.writelines(f"{path}: {violation}\n" for violation in violations)
+        valid = valid and not violations
+    return valid
+
+
+def _watch(directory: str) -> None:
+    """Watch a directory, reporting the status of each file as it changes, until interrupted."""
+    import os
+
+    from uciparse.watch import UciWatcher
+
+    with UciWatcher(directory) as watcher:
+        try:
+            for events in watcher.watch():
+                for event in events:
+                    path = os.path.join(directory, event.name)  # noqa: PTH118
+                    if not event.state:
+                        sys.stdout.write(f"{path}: removed\n")
+                    elif event.state.error:
+                        sys.stdout.write(f"{path}: {event.state.error}\n")
+                    else:
+                        sys.stdout.write(f"{path}: ok\n")
+                sys.stdout.flush()
+        except KeyboardInterrupt:
+            pass
+
+
+def _normalize(path: str, source: str, connect: str | None, *, archive: bool, canonical: bool) -> None:
+    """Normalize a file, locally or on a server, or every file within an archive, optionally in canonical order."""
+
+    if connect:
+        sys.stdout.write(_normalize_remote(connect, path, source))
+    elif archive:
+        from uciparse.archive import read_archive
+
+        with _phase("parse"):
+            files = list(read_archive(path))  # parse everything first, so an error means no output
+        for name, uci in files:
+            with _phase("normalize"):
+                lines = uci.normalized(canonical=canonical)
+            sys.stdout.writelines([f"==> {name} <==\n", *lines, "\n"])
+    else:
+        with _phase("parse"):
+            ucifiles = list(_load(source, path))
+        for uci in ucifiles:
+            with _phase("normalize"):
+                lines = uci.normalized(canonical=canonical)
+            sys.stdout.writelines(lines)
 
 
 def parse() -> None:
     """Run the uciparse command."""
+    import argparse
+
+    from uciparse.uci import UciParseError
 
     parser = argparse.ArgumentParser(
         description="Parse and normalize a UCI configuration file.",
@@ -20,34 +236,270 @@ def parse() -> None:
         "then an error will be returned and no output will be generated.",
     )
 
-    parser.add_argument("uci", help="Path to the UCI file to normalize, or '-' for stdin")
+    parser.add_argument(
+        "--from",
+        dest="source",
+        choices=["uci", "show", "json"],
+        default="uci",
+        help="Format of the input: a UCI file (the default), 'uci show' output, or ubus-style JSON",
+    )
+    parser.add_argument("--serve", metavar="SOCKET", help="Run a server on a Unix socket, rather than normalizing a file")
+    parser.add_argument("--connect", metavar="SOCKET", help="Send the file to a server running on a Unix socket")
+    parser.add_argument("--git-filter", action="store_true", help="Run as a git long-running clean filter process")
+    parser.add_argument("--textconv", action="store_true", help="Run as a git textconv command, showing unparseable files as-is")
+    parser.add_argument("--archive", action="store_true", help="Normalize every UCI file within a backup archive")
+    parser.add_argument("--watch", metavar="DIR", help="Watch a directory, re-validating files as they change, until interrupted")
+    parser.add_argument(
+        "--canonical",
+        action="store_true",
+        help="Order sections and options canonically, so files that differ only in order normalize the same way",
+    )
+    parser.add_argument(
+        "--schema", metavar="FILE", help="Validate files (or directories of them) against a JSON schema, rather than normalizing"
+    )
+    parser.add_argument(
+        "uci",
+        nargs="*",
+        help="Path to the UCI file to normalize, or '-' for stdin; with --schema, any number of files or directories",
+    )
+    parser.add_argument(
+        "--profile", metavar="OUT", help="Write a cProfile profile of the command to a pstats file, including any worker processes"
+    )
+    parser.add_argument(
+        "--trace-memory", action="store_true", help="Trace memory allocations, reporting the lines of uci.py using the most memory"
+    )
     args = parser.parse_args(args=sys.argv[1:])
+    with _profiler(args):
+        if args.serve:
+            from uciparse.server import serve
 
-    try:
-        uci = UciFile.from_fp(sys.stdin) if args.uci == "-" else UciFile.from_file(args.uci)
-        sys.stdout.writelines(uci.normalized())
-    except UciParseError as e:
-        sys.stderr.write(e.message + "\n")
-        raise SystemExit from e
+            serve(args.serve)
+            return
+
+        if args.git_filter:
+            from uciparse.gitfilter import filter_process
+
+            filter_process(sys.stdin.buffer, sys.stdout.buffer)
+            return
+
+        if args.watch:
+            _watch(args.watch)
+            return
+
+        if not args.uci:
+            parser.error("the following arguments are required: uci")
+
+        if args.canonical and (args.connect or args.textconv or args.schema):
+            parser.error("--canonical can't be combined with --connect, --textconv or --schema")
+
+        if args.schema:
+            if args.source != "uci" or args.connect or args.archive or args.textconv:
+                parser.error("--schema can't be combined with --from, --connect, --archive or --textconv")
+            if not _validate(args.schema, args.uci):
+                raise SystemExit(1)
+            return
+
+        if len(args.uci) > 1:
+            parser.error("only one file can be normalized at a time")
+        path = args.uci[0]
+
+        if args.textconv:
+            from uciparse.gitfilter import textconv
+
+            sys.stdout.write(textconv(path))
+            return
+
+        try:
+            _normalize(path, args.source, args.connect, archive=args.archive, canonical=args.canonical)
+        except UciParseError as e:
+            sys.stderr.write(e.message + "\n")
+            raise SystemExit from e
 
 
 def diff() -> None:
     """Run the ucidiff command."""
+    import argparse
+    import os
+
+    from uciparse.uci import UciParseError
+
     parser = argparse.ArgumentParser(
         description="Diff two UCI configuration files.",
         epilog="The comparison is equivalent to a 'diff -Naur' between the normalized versions of the files.  "
-        "If either file can't be parsed, then an error will be returned and no diff will be shown.",
+        "If either file can't be parsed, then an error will be returned and no diff will be shown.  "
+        "With --against, each device file is instead checked against a golden file, followed by a summary of how many "
+        "devices deviate at each location, and the exit status is 1 if any device deviates or can't be parsed.",
+    )
+
+    parser.add_argument("--connect", metavar="SOCKET", help="Send the files to a server running on a Unix socket")
+    parser.add_argument("--archive", action="store_true", help="Compare the UCI files within two backup archives")
+    parser.add_argument(
+        "--format",
+        choices=["unified", "uci-batch"],
+        default="unified",
+        help="Format of the diff: a unified diff (the default), or 'uci batch' commands that transform a into b",
+    )
+    parser.add_argument("--against", metavar="GOLDEN", help="Check each device file against a golden file, instead of a diff")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count(),
+        metavar="N",
+        help="Number of worker processes used to check device files with --against (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "files",
+        nargs="+",
+        metavar="file",
+        help="Paths to the two UCI files to compare, or with --against, device files or directories of them",
+    )
+    parser.add_argument(
+        "--profile", metavar="OUT", help="Write a cProfile profile of the command to a pstats file, including any worker processes"
+    )
+    parser.add_argument(
+        "--trace-memory", action="store_true", help="Trace memory allocations, reporting the lines of uci.py using the most memory"
+    )
+    args = parser.parse_args(args=sys.argv[1:])
+    if args.format == "uci-batch" and (args.connect or args.archive):
+        parser.error("--format uci-batch can't be combined with --connect or --archive")
+    if args.against and (args.connect or args.archive or args.format != "unified"):
+        parser.error("--against can't be combined with --connect, --archive or --format")
+    if not args.against and len(args.files) != 2:
+        parser.error("exactly two files are required unless --against is used")
+
+    with _profiler(args):
+        try:
+            if args.against:
+                if not _diff_fleet(args.against, args.files, args.jobs):
+                    raise SystemExit(1)
+                return
+            path_a, path_b = args.files
+            if args.connect:
+                from uciparse.server import UciClient
+
+                with UciClient(args.connect) as client:
+                    sys.stdout.write(client.diff(path_a, path_b))
+                return
+            if args.archive:
+                with _phase("diff"):
+                    result = _diff_archives(path_a, path_b)
+                sys.stdout.writelines(result)
+                return
+            sys.stdout.writelines(_diff_files(path_a, path_b, args.format))
+        except (UciParseError, ValueError) as e:
+            sys.stderr.write(f"{e}\n")
+            raise SystemExit from e
+
+
+def merge() -> None:
+    """Run the ucimerge command."""
+    import argparse
+
+    from uciparse.merge import merge3
+    from uciparse.uci import UciFile, UciParseError
+
+    parser = argparse.ArgumentParser(
+        description="Merge UCI configuration files, layering overlays on top of a base file, "
+        "or three-way merging two files derived from a common base.",
+        epilog="The merged file will be printed to stdout in normalized form.  Any conflicts are reported to stderr "
+        "and result in a non-zero exit status; in a three-way merge, conflicting options are also shown with conflict "
+        "markers.  If any file can't be parsed, then an error will be returned and no output will be generated.",
+    )
+
+    parser.add_argument("--append-lists", action="store_true", help="Append overlay lists to base lists instead of replacing them")
+    parser.add_argument(
+        "-3", "--three-way", action="store_true", help="Three-way merge two files (ours and theirs) derived from the base file"
+    )
+    parser.add_argument("base", help="Path to the base UCI file")
+    parser.add_argument("overlays", metavar="overlay", nargs="+", help="Path to an overlay UCI file, applied in order")
+    args = parser.parse_args(args=sys.argv[1:])
+    if args.three_way and len(args.overlays) != 2:
+        parser.error("a three-way merge requires exactly two files after the base file")
+
+    try:
+        base = UciFile.from_file(args.base)
+        overlays = [UciFile.from_file(overlay) for overlay in args.overlays]
+        if args.three_way:
+            result = merge3(base, overlays[0], overlays[1], labels=(args.overlays[0], args.overlays[1]))
+        else:
+            result = UciFile.merge(base, *overlays, lists="append" if args.append_lists else "replace")
+        sys.stdout.writelines(result.file.normalized())
+    except UciParseError as e:
+        sys.stderr.write(e.message + "\n")
+        raise SystemExit from e
+
+    if result.conflicts:
+        sys.stderr.writelines(f"Conflict: {conflict}\n" for conflict in result.conflicts)
+        raise SystemExit(1)
+
+
+def apply() -> None:
+    """Run the uciapply command."""
+    import argparse
+
+    from uciparse.batch import apply_commands, parse_commands
+    from uciparse.uci import UciFile, UciParseError
+
+    parser = argparse.ArgumentParser(
+        description="Apply 'uci batch' commands to a UCI configuration file.",
+        epilog="Commands are read from stdin, and the resulting file will be printed to stdout in normalized form.  "
+        "If the file can't be parsed or a command can't be applied, then an error will be returned and no output "
+        "will be generated.",
     )
 
-    parser.add_argument("a", help="Path to the first UCI file to compare")
-    parser.add_argument("b", help="Path to the second UCI file to compare")
+    parser.add_argument("uci", help="Path to the UCI file to apply the commands to")
     args = parser.parse_args(args=sys.argv[1:])
 
     try:
-        a = UciFile.from_file(args.a)
-        b = UciFile.from_file(args.b)
-        result = difflib.unified_diff(a=a.normalized(), b=b.normalized(), fromfile=args.a, tofile=args.b)
-        sys.stdout.writelines(result)
+        result = apply_commands(UciFile.from_file(args.uci), parse_commands(sys.stdin))
+        sys.stdout.writelines(result.normalized())
     except UciParseError as e:
         sys.stderr.write(e.message + "\n")
         raise SystemExit from e
+
+
+def lint() -> None:
+    """Run the ucilint command."""
+    import argparse
+    import os
+
+    from uciparse.lint import RULES, UciLinter, lint_files
+
+    parser = argparse.ArgumentParser(
+        description="Check UCI configuration files for likely mistakes.",
+        epilog="Each problem is printed to stdout as 'path:line: message [rule]', and a file that can't be read is "
+        "reported as 'path: error: message'.  Lines that can't be parsed are reported by the 'syntax' rule.  "
+        "The exit status is 1 if any problem was found.",
+    )
+
+    parser.add_argument("--disable", metavar="RULE", action="append", default=[], help="Disable a rule (may be repeated)")
+    parser.add_argument("--list-rules", action="store_true", help="List the available rules and exit")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count(),
+        metavar="N",
+        help="Number of worker processes used to check the files (default: number of CPUs)",
+    )
+    parser.add_argument("files", nargs="*", metavar="file", help="Paths to UCI files, or directories of them")
+    args = parser.parse_args(args=sys.argv[1:])
+
+    if args.list_rules:
+        sys.stdout.write(f"{'syntax':<24} a line can't be parsed\n")
+        sys.stdout.writelines(f"{name:<24} {rule.description}\n" for name, rule in RULES.items())
+        return
+    if not args.files:
+        parser.error("at least one file is required")
+    try:
+        linter = UciLinter(disable=args.disable)
+    except ValueError as e:
+        parser.error(str(e))
+
+    clean = True
+    for result in lint_files(linter, _device_paths(args.files), jobs=args.jobs):
+        if result.error:
+            sys.stdout.write(f"{result.path}: error: {result.error}\n")
+        sys.stdout.writelines(f"{result.path}:{finding}\n" for finding in result.findings)
+        clean = clean and not result.error and not result.findings
+    if not clean:
+        raise SystemExit(1)
@@ -0,0 +1,244 @@
+# vim: set ft=python ts=4 sw=4 expandtab:
+
+"""
+Convert other representations of UCI configuration into UciFile objects.
+
+Two representations are supported: the output of ``uci show`` and the JSON
+returned by the ``ubus`` UCI interface.
+
+The ``uci show`` Format
+=======================
+
+The output of ``uci show`` contains one line per section and one line per
+option or list, like this::
+
+    network.lan=interface
+    network.lan.ipaddr='192.168.1.1'
+    network.lan.dns='8.8.8.8' '1.1.1.1'
+    network.@rule[0]=rule
+    network.@rule[0].name='Allow-Ping'
+
+Anonymous sections are identified either with the ``@type[index]`` syntax
+shown above or with a generated name like ``cfg0a1b2c`` (if ``uci show -X``
+was used).  Values are always quoted with single quotes, and an embedded
+single quote is written as ``'\\''``, like in a shell.  A list is written
+as a series of quoted values separated by whitespace.  Since a single-element
+list looks exactly like an option, we always treat a single value as an
+option.  ``split_value()`` splits a value written this way, which is the same
+quoting that ``uci batch`` accepts, and ``is_identifier()`` checks a package,
+section, type or option name.
+
+A dump can contain more than one package.  Each package is returned as a
+separate UciFile, starting with a package line.  Since ``uci show`` always
+emits all of the lines for a package together, the dump is processed as a
+stream, and only the package currently being built is held in memory.
+
+The JSON Format
+===============
+
+The JSON format is the one returned by ``ubus call uci get``, which looks like
+this:
+
+.. code-block:: json
+
+    {
+       "values": {
+          "lan": {
+             ".anonymous": false,
+             ".type": "interface",
+             ".name": "lan",
+             ".index": 1,
+             "ipaddr": "192.168.1.1",
+             "dns": [ "8.8.8.8", "1.1.1.1" ]
+          }
+       }
+    }
+
+The ``values`` wrapper is optional.  Sections are emitted in ``.index`` order
+if that is available, or in document order otherwise.  Arrays become lists,
+and booleans and numbers are converted to strings the way UCI would store them.
+"""
+
+import json
+import re
+from collections.abc import Iterable, Iterator, Mapping
+from typing import Any
+
+from uciparse.uci import UciConfigLine, UciFile, UciLine, UciListLine, UciOptionLine, UciPackageLine, UciParseError
+
+# Matches a line of uci show output: package, section, optional option, and value
+_SHOW_REGEX = re.compile(r"([a-zA-Z0-9_-]+)\.(@[a-zA-Z0-9_-]+\[-?[0-9]+\]|[a-zA-Z0-9_-]+)(?:\.([a-zA-Z0-9_-]+))?=(.*)")
+
+# Matches the generated name that uci show -X uses for an anonymous section
+_GENERATED_REGEX = re.compile(r"cfg[0-9a-f]{6}")
+
+# Matches a legal UCI identifier
+_IDENTIFIER_REGEX = re.compile(r"[a-zA-Z0-9_-]+")
+
+# Characters that end a run of literal characters within a value
+_SPECIAL = frozenset(" \t'\"\\")
+
+
+def is_identifier(value: str) -> bool:
+    """Whether a value is a legal UCI identifier, as used for a package, section, type or option name."""
+    return _IDENTIFIER_REGEX.fullmatch(value) is not None
+
+
+def split_value(value: str) -> list[str]:
+    """Split a shell-quoted value into its component values, raising ValueError if it is not valid."""
+    # The fast path handles the common case of a single quoted value with no embedded quotes
+    if len(value) >= 2 and value[0] == "'" and value.find("'", 1) == len(value) - 1:
+        return [value[1:-1]]
+
+    # Otherwise, scan the string once from left to right, so this is linear in the length of the value
+    values: list[str] = []
+    current: list[str] = []
+    in_value = False
+    index = 0
+    length = len(value)
+    while index < length:
+        char = value[index]
+        if char in {"'", '"'}:
+            end = value.find(char, index + 1)
+            if end < 0:
+                raise ValueError("unbalanced quotes")
+            current.append(value[index + 1 : end])
+            in_value = True
+            index = end + 1
+        elif char == "\\":
+            if index + 1 >= length:
+                raise ValueError("trailing escape character")
+            current.append(value[index + 1])
+            in_value = True
+            index += 2
+        elif char in {" ", "\t"}:
+            if in_value:
+                values.append("".join(current))
+                current = []
+                in_value = False
+            index += 1
+        else:
+            end = index + 1
+            while end < length and value[end] not in _SPECIAL:
+                end += 1
+            current.append(value[index:end])
+            in_value = True
+            index = end
+    if in_value:
+        values.append("".join(current))
+    return values
+
+
+def _is_anonymous(section: str) -> bool:
+    """Whether a uci show section identifier refers to an anonymous section."""
+    return section.startswith("@") or _GENERATED_REGEX.fullmatch(section) is not None
+
+
+def _build(package: str, sections: dict[str, tuple[UciConfigLine, list[UciLine]]]) -> UciFile:
+    """Build a UciFile from the sections accumulated for a package."""
+    lines: list[UciLine] = [UciPackageLine(name=package)]
+    for config, options in sections.values():
+        lines.append(config)
+        lines.extend(options)
+    return UciFile(lines=lines)
+
+
+def _add_show_line(sections: dict[str, tuple[UciConfigLine, list[UciLine]]], lineno: int, match: re.Match[str]) -> None:
+    """Add a single line of uci show output to the sections accumulated for a package."""
+    try:
+        values = split_value(match[4])
+    except ValueError as e:
+        raise UciParseError(f"Error on line {lineno}: invalid value: {e}") from e
+    if not match[3]:
+        if len(values) != 1 or not _IDENTIFIER_REGEX.fullmatch(values[0]):
+            raise UciParseError(f"Error on line {lineno}: invalid section type")
+        if match[2] in sections:
+            raise UciParseError(f"Error on line {lineno}: duplicate section {match[2]}")
+        name = None if _is_anonymous(match[2]) else match[2]
+        sections[match[2]] = (UciConfigLine(section=values[0], name=name), [])
+    else:
+        if match[2] not in sections:
+            raise UciParseError(f"Error on line {lineno}: option for unknown section {match[2]}")
+        if not values:  # uci show quotes every value, so even an empty value is written as ''
+            raise UciParseError(f"Error on line {lineno}: missing value for option {match[3]}")
+        options = sections[match[2]][1]
+        if len(values) == 1:
+            options.append(UciOptionLine(name=match[3], value=values[0]))
+        else:
+            options.extend(UciListLine(name=match[3], value=value) for value in values)
+
+
+def from_show(lines: Iterable[str]) -> Iterator[UciFile]:
+    """Generate a UciFile for each package in uci show output, raising UciParseError if it is not valid."""
+    package: str | None = None
+    sections: dict[str, tuple[UciConfigLine, list[UciLine]]] = {}
+    for lineno, line in enumerate(lines, start=1):
+        stripped = line.rstrip("\r\n")
+        if not stripped.strip():
+            continue
+        match = _SHOW_REGEX.fullmatch(stripped)
+        if not match:
+            raise UciParseError(f"Error on line {lineno}: invalid uci show line")
+        if match[1] != package:
+            if package is not None:
+                yield _build(package, sections)
+            package = match[1]
+            sections = {}
+        _add_show_line(sections, lineno, match)
+    if package is not None:
+        yield _build(package, sections)
+
+
+def _convert_value(key: str, value: Any) -> str:
+    """Convert a JSON scalar into a UCI value."""
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, (str, int, float)):
+        return str(value)
+    raise UciParseError(f"Error in section {key}: unsupported value {value!r}")
+
+
+def _convert_section(key: str, section: Any) -> list[UciLine]:
+    """Convert a JSON section object into a config line followed by its option and list lines."""
+    if not isinstance(section, Mapping):
+        raise UciParseError(f"Error in section {key}: expected an object")
+    section_type = section.get(".type")
+    name = None if section.get(".anonymous", False) else section.get(".name", key)
+    if not isinstance(section_type, str) or not _IDENTIFIER_REGEX.fullmatch(section_type):
+        raise UciParseError(f"Error in section {key}: invalid section type")
+    if name is not None and (not isinstance(name, str) or not _IDENTIFIER_REGEX.fullmatch(name)):
+        raise UciParseError(f"Error in section {key}: invalid section name")
+    lines: list[UciLine] = [UciConfigLine(section=section_type, name=name)]
+    for option, value in section.items():
+        if option.startswith("."):
+            continue
+        if not _IDENTIFIER_REGEX.fullmatch(option):
+            raise UciParseError(f"Error in section {key}: invalid option name {option!r}")
+        if isinstance(value, list):
+            lines.extend(UciListLine(name=option, value=_convert_value(key, item)) for item in value)
+        else:
+            lines.append(UciOptionLine(name=option, value=_convert_value(key, value)))
+    return lines
+
+
+def from_json(data: str | bytes | Mapping[str, Any], package: str | None = None) -> UciFile:
+    """Generate a UciFile from ubus-style JSON, raising UciParseError if it is not valid."""
+    if isinstance(data, (str, bytes)):
+        try:
+            data = json.loads(data)
+        except json.JSONDecodeError as e:
+            raise UciParseError(f"Invalid JSON: {e}") from e
+    if not isinstance(data, Mapping):
+        raise UciParseError("Invalid JSON: expected an object")
+    values = data.get("values", data)
+    if not isinstance(values, Mapping):
+        raise UciParseError("Invalid JSON: expected an object of sections")
+
+    sections = list(values.items())
+    if all(isinstance(section, Mapping) and ".index" in section for _, section in sections):
+        sections.sort(key=lambda item: item[1][".index"])
+
+    lines: list[UciLine] = [UciPackageLine(name=package)] if package else []
+    for key, section in sections:
+        lines.extend(_convert_section(key, section))
+    return UciFile(lines=lines)
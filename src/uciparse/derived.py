@@ -0,0 +1,212 @@
+# vim: set ft=python ts=4 sw=4 expandtab:
+
+"""
+Copy-on-write files derived from a shared template.
+
+Generating one configuration per device from a template usually means copying
+the parsed template and changing a few options in each copy, which copies every
+line.  ``UciFile.derive()`` instead returns a ``UciDerivedFile``, which refers to
+the template and stores only the sections that were changed.  The first change
+to a section copies the list of lines in that section (but not the lines
+themselves), and the changed lines are replaced rather than modified, so the
+template is never affected.  Every other section, and every unchanged line, is
+shared with the template and with every other file derived from it.
+
+The layout of the template (the key and position of each section) is indexed
+the first time a file is derived from it, along with the normalized text of
+each section, and the index is shared by every file derived from the same
+template.  Serializing a derived file with ``normalized()`` therefore only
+serializes the sections that were changed.  Since the index is built once, the
+template must not be modified after a file has been derived from it.
+
+Sections are identified by their keys, as for UciSection.  The key of an
+anonymous section is fixed when the file is derived (or when the section is
+added), so deleting a section doesn't renumber the sections after it.  Sections
+added to a derived file are placed at the end of the file, as for an overlay
+merge.  uci merges named sections with the same name into one, so a section
+whose name appears more than once in the template can't be changed by name;
+ValueError is raised instead, since a change to any one of the definitions
+could be overridden by another.
+"""
+
+from weakref import WeakKeyDictionary
+
+from uciparse.uci import UciConfigLine, UciFile, UciLine, UciListLine, UciOptionLine, UciSection
+
+
+class _TemplateIndex:
+    """The layout of a template file, built once and shared by every file derived from it."""
+
+    def __init__(self, file: UciFile) -> None:
+        self.lines = tuple(file.lines)
+        self.keys: list[str] = []
+        self.bounds: list[tuple[int, int]] = []
+        self.counts: dict[str, int] = {}  # number of sections of each type, to number added anonymous sections
+        start = 0
+        for section in file.sections():
+            end = start + len(section.lines) + (1 if section.config else 0)
+            self.keys.append(section.key)
+            self.bounds.append((start, end))
+            if section.config:
+                self.counts[section.config.section] = self.counts.get(section.config.section, 0) + 1
+            start = end
+        self.positions: dict[str, int] = {}
+        self.duplicates: set[str] = set()  # names of sections that are defined more than once
+        for position, key in enumerate(self.keys):
+            if key in self.positions:
+                self.duplicates.add(key)
+            self.positions[key] = position
+        self._texts: list[str] | None = None
+
+    def section(self, position: int) -> list[UciLine]:
+        """Return the lines in a section of the template."""
+        start, end = self.bounds[position]
+        return list(self.lines[start:end])
+
+    def texts(self) -> list[str]:
+        """Return the normalized text of each section in the template, serialized on first use."""
+        if self._texts is None:
+            self._texts = [_text(self.lines[start:end]) for start, end in self.bounds]
+        return self._texts
+
+
+# Indexes of the files that have been used as templates, released when a template is no longer used
+_INDEXES: "WeakKeyDictionary[UciFile, _TemplateIndex]" = WeakKeyDictionary()
+
+
+def _text(lines: "tuple[UciLine, ...] | list[UciLine]") -> str:
+    """Serialize lines in normalized form, as a single string."""
+    return "".join([line.normalized() for line in lines])
+
+
+def _template_index(file: UciFile) -> _TemplateIndex:
+    """Return the index of a template file, building it the first time the file is used as a template."""
+    index = _INDEXES.get(file)
+    if index is None:
+        index = _INDEXES[file] = _TemplateIndex(file)
+    return index
+
+
+class UciDerivedFile:
+    """A copy-on-write view of a template file, storing only the sections that were changed; see uciparse.derived."""
+
+    __slots__ = ("_added", "_changed", "_counts", "_index", "_positions", "template")
+
+    def __init__(self, template: UciFile) -> None:
+        self.template = template
+        self._index = _template_index(template)
+        self._changed: dict[int, list[UciLine]] = {}  # replacement lines for changed (or added) sections, by position
+        self._added: list[str] = []  # keys of added sections, in order
+        self._positions: dict[str, int] = {}  # positions of added sections, by key
+        self._counts: dict[str, int] = {}  # number of sections added, by type, to number added anonymous sections
+
+    @property
+    def lines(self) -> list[UciLine]:
+        """The lines in the file, as a new list that shares unchanged lines with the template."""
+        index, lines = self._index, []
+        for position in range(len(index.keys) + len(self._added)):
+            if position in self._changed:
+                lines.extend(self._changed[position])
+            else:
+                start, end = index.bounds[position]
+                lines.extend(index.lines[start:end])
+        return lines
+
+    def _position(self, key: str) -> int:
+        """Return the position of a section, raising ValueError if there is no section with that key, or more than one."""
+        if key in self._index.duplicates:
+            raise ValueError(f"Section is defined more than once: {key}")
+        position = self._positions.get(key, self._index.positions.get(key))
+        if position is None or (position in self._changed and not self._changed[position]):
+            raise ValueError(f"Unknown section: {key}")
+        return position
+
+    def _exists(self, key: str) -> bool:
+        """Whether there is a section with a key."""
+        if key in self._index.duplicates:
+            return True
+        try:
+            self._position(key)
+        except ValueError:
+            return False
+        return True
+
+    def _edit(self, key: str) -> list[UciLine]:
+        """Return the lines in a section for editing, copying the list of lines the first time the section is changed."""
+        position = self._position(key)
+        lines = self._changed.get(position)
+        if lines is None:
+            lines = self._changed[position] = self._index.section(position)
+        return lines
+
+    def _section(self, position: int, key: str) -> UciSection:
+        """Return the section at a position."""
+        lines = self._changed[position] if position in self._changed else self._index.section(position)
+        config = lines[0] if lines and isinstance(lines[0], UciConfigLine) else None
+        return UciSection(key=key, config=config, lines=lines[1:] if config else lines)
+
+    def section(self, key: str) -> UciSection:
+        """Return a section by key, raising ValueError if there is no section with that key."""
+        return self._section(self._position(key), key)
+
+    def sections(self) -> list[UciSection]:
+        """Return the sections in the file, in order, keyed by their keys in the template."""
+        keys = [*self._index.keys, *self._added]
+        return [self._section(position, key) for position, key in enumerate(keys) if self._changed.get(position, True)]
+
+    def set(self, key: str, option: str, value: str | list[str]) -> None:
+        """
+        Set an option (for a string) or a list (for a list of strings) in a section.
+
+        Any option or list lines with the same name are replaced, at the position
+        of the first one, which also keeps its comment.  Otherwise, the new lines
+        are added at the end of the section.
+        """
+        lines = self._edit(key)
+        found = [i for i, line in enumerate(lines) if isinstance(line, (UciOptionLine, UciListLine)) and line.name == option]
+        comment = getattr(lines[found[0]], "comment", None) if found else None
+        if isinstance(value, str):
+            replacement: list[UciLine] = [UciOptionLine(name=option, value=value, comment=comment)]
+        else:
+            replacement = [UciListLine(name=option, value=item, comment=None if i else comment) for i, item in enumerate(value)]
+        if not found:
+            lines.extend(replacement)
+            return
+        for i in reversed(found[1:]):
+            del lines[i]
+        lines[found[0] : found[0] + 1] = replacement
+
+    def delete(self, key: str, option: str | None = None) -> None:
+        """Delete an option or list from a section, or the whole section if no option is given."""
+        if option is None:
+            self._changed[self._position(key)] = []
+            return
+        lines = self._edit(key)
+        lines[:] = [line for line in lines if not (isinstance(line, (UciOptionLine, UciListLine)) and line.name == option)]
+
+    def add(self, section_type: str, name: str | None = None) -> str:
+        """Add a section at the end of the file, returning its key."""
+        if name is not None and self._exists(name):
+            raise ValueError(f"Section already exists: {name}")
+        count = self._counts.get(section_type, 0)
+        self._counts[section_type] = count + 1  # named sections count too, as for UciFile.sections()
+        key = name if name is not None else f"@{section_type}[{self._index.counts.get(section_type, 0) + count}]"
+        position = self._positions[key] = len(self._index.keys) + len(self._added)
+        self._added.append(key)
+        self._changed[position] = [UciConfigLine(section=section_type, name=name)]
+        return key
+
+    def normalized(self) -> list[str]:
+        """Return a list of normalized lines comprising the file, serializing only the sections that were changed."""
+        chunks = list(self._index.texts())
+        for position in sorted(self._changed):
+            text = _text(self._changed[position])
+            if position < len(chunks):
+                chunks[position] = text
+            else:
+                chunks.append(text)
+        return "".join(chunks).splitlines(keepends=True)
+
+    def to_file(self) -> UciFile:
+        """Return the derived file as a standalone UciFile, which shares unchanged lines with the template."""
+        return UciFile(lines=self.lines)
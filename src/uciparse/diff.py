@@ -0,0 +1,144 @@
+# vim: set ft=python ts=4 sw=4 expandtab:
+
+"""
+Unified diffs of normalized files that scale to large files.
+
+``difflib`` finds the longest matching block, and then repeats that for the
+lines on either side of it.  When there are many changes, each repetition scans
+most of the remaining lines again, so a diff between two large files with many
+small changes (like one option changed in each of a thousand firewall rules)
+takes quadratic time.
+
+Most lines in a UCI file are repeated (``config rule``, ``option src 'wan'``),
+but most sections also have a line that appears only once, like a section name
+or the name option of a firewall rule.  As in a patience diff, the lines that
+appear exactly once in each file are matched first, keeping the longest run of
+them that is in the same order in both files, and ``difflib`` is only used for
+the short runs of lines between those anchors.  A file with no unique lines at
+all is diffed by ``difflib`` as a whole, as before.
+
+The output has the same format as ``difflib.unified_diff()``.  Where a change
+can be shown in more than one way, the hunks may differ from the ones
+``difflib`` would produce.
+"""
+
+import difflib
+from bisect import bisect_left
+from collections.abc import Iterator, Sequence
+
+
+def _unique(lines: Sequence[str]) -> dict[str, int]:
+    """Return the position of each line that appears exactly once, in order."""
+    positions: dict[str, int] = {}
+    repeated: set[str] = set()
+    for position, line in enumerate(lines):
+        if line in positions:
+            repeated.add(line)
+        else:
+            positions[line] = position
+    for line in repeated:
+        del positions[line]
+    return positions
+
+
+def _anchors(a: Sequence[str], b: Sequence[str]) -> list[tuple[int, int]]:
+    """Return the longest run of lines unique to both files that appear in the same order in both, as (a, b) positions."""
+    a_unique, b_unique = _unique(a), _unique(b)
+    pairs = [(i, b_unique[line]) for line, i in a_unique.items() if line in b_unique]  # in order of position in a
+    # Find the longest increasing subsequence of positions in b by patience sorting, in O(n log n)
+    tails: list[int] = []  # position in b at the end of the best subsequence of each length
+    ends: list[int] = []  # index in pairs of the end of the best subsequence of each length
+    previous: list[int] = []  # index in pairs of the element before each element in its subsequence
+    for index, (_, j) in enumerate(pairs):
+        length = bisect_left(tails, j)
+        if length == len(tails):
+            tails.append(j)
+            ends.append(index)
+        else:
+            tails[length] = j
+            ends[length] = index
+        previous.append(ends[length - 1] if length else -1)
+    result: list[tuple[int, int]] = []
+    index = ends[-1] if ends else -1
+    while index >= 0:
+        result.append(pairs[index])
+        index = previous[index]
+    result.reverse()
+    return result
+
+
+def _match_gap(left: Sequence[str], right: Sequence[str]) -> list[tuple[int, int, int]]:
+    """Match the lines in a gap between two anchors, as (a, b, size) blocks, only using difflib if there is more to match."""
+    start = 0
+    while start < len(left) and start < len(right) and left[start] == right[start]:
+        start += 1
+    end = 0
+    while start < len(left) - end and start < len(right) - end and left[-end - 1] == right[-end - 1]:
+        end += 1
+    blocks = [(0, 0, start)] if start else []
+    middle_left, middle_right = left[start : len(left) - end], right[start : len(right) - end]
+    if middle_left and middle_right and not set(middle_left).isdisjoint(middle_right):
+        matcher = difflib.SequenceMatcher(None, middle_left, middle_right)
+        blocks.extend((start + match.a, start + match.b, match.size) for match in matcher.get_matching_blocks() if match.size)
+    if end:
+        blocks.append((len(left) - end, len(right) - end, end))
+    return blocks
+
+
+class _AnchoredMatcher(difflib.SequenceMatcher[str]):
+    """A SequenceMatcher that matches unique lines first, and only uses difflib between them."""
+
+    def __init__(self, a: Sequence[str], b: Sequence[str]) -> None:
+        super().__init__(None, a, b)
+        self._lines = (a, b)
+        self._blocks: list[difflib.Match] | None = None
+
+    def get_matching_blocks(self) -> list[difflib.Match]:
+        """Return the matching blocks, computed the first time they are needed."""
+        if self._blocks is not None:
+            return self._blocks
+        a, b = self._lines
+        blocks: list[tuple[int, int, int]] = []
+        i = j = 0
+        for anchor_i, anchor_j in [*_anchors(a, b), (len(a), len(b))]:
+            blocks.extend((i + gap_i, j + gap_j, size) for gap_i, gap_j, size in _match_gap(a[i:anchor_i], b[j:anchor_j]))
+            if anchor_i < len(a):
+                blocks.append((anchor_i, anchor_j, 1))
+            i, j = anchor_i + 1, anchor_j + 1
+        merged: list[difflib.Match] = []
+        for block_i, block_j, size in blocks:  # merge adjacent blocks, as difflib does
+            if merged and merged[-1].a + merged[-1].size == block_i and merged[-1].b + merged[-1].size == block_j:
+                merged[-1] = difflib.Match(merged[-1].a, merged[-1].b, merged[-1].size + size)
+            else:
+                merged.append(difflib.Match(block_i, block_j, size))
+        merged.append(difflib.Match(len(a), len(b), 0))
+        self._blocks = merged
+        return merged
+
+
+def _range(start: int, stop: int) -> str:
+    """Format a range of lines for a hunk header, as difflib does."""
+    length = stop - start
+    if length == 1:
+        return str(start + 1)
+    return f"{start + 1 if length else start},{length}"
+
+
+def unified_diff(a: Sequence[str], b: Sequence[str], fromfile: str = "", tofile: str = "", n: int = 3) -> Iterator[str]:
+    """Generate a unified diff between two lists of lines, like difflib.unified_diff(), in near-linear time."""
+    started = False
+    for group in _AnchoredMatcher(a, b).get_grouped_opcodes(n):
+        if not started:
+            started = True
+            yield f"--- {fromfile}\n"
+            yield f"+++ {tofile}\n"
+        first, last = group[0], group[-1]
+        yield f"@@ -{_range(first[1], last[2])} +{_range(first[3], last[4])} @@\n"
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                yield from (f" {line}" for line in a[i1:i2])
+                continue
+            if tag in {"replace", "delete"}:
+                yield from (f"-{line}" for line in a[i1:i2])
+            if tag in {"replace", "insert"}:
+                yield from (f"+{line}" for line in b[j1:j2])
@@ -0,0 +1,167 @@
+# vim: set ft=python ts=4 sw=4 expandtab:
+
+"""
+Compare a fleet of device files against a golden template.
+
+A compliance check compares the configuration of every device to one golden
+file.  A ``UciTemplate`` parses and indexes the golden file once, and then
+each device file is compared against that precomputed index, so the cost of
+checking a device is proportional to the size of the device file, no matter
+how many devices there are.
+
+The comparison is semantic, the same as for ``uciparse.batch``: comments,
+quoting, whitespace and the order of options and sections are ignored, and
+sections are matched between the files using a hash table (named sections by
+name, and anonymous sections by type, first by identical content, then by their
+first option, and then in order).  Each difference is reported as a
+``UciDeviation``, located by the key of the section in the golden file (or in
+the device file, for an unexpected section).
+
+``compare_fleet()`` checks many device files, in a pool of worker processes
+if asked to.  Each worker receives the template once, when it starts, rather
+than once per device.  ``drift()`` aggregates the results into a count of the
+devices that deviate at each location, so the options that drift most often
+can be found.
+"""
+
+from collections import Counter
+from collections.abc import Iterable, Iterator
+from typing import NamedTuple
+
+from uciparse.batch import UciPackageContent, UciSectionMatcher, quote_value, section_references
+from uciparse.profiling import init_worker
+from uciparse.uci import UciFile, UciParseError
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from uciparse.batch import UciSectionContent
+
+
+class UciDeviation(NamedTuple):
+    """A difference between a device file and the golden template."""
+
+    section: str
+    option: str | None
+    message: str
+
+    def __str__(self) -> str:
+        return f"{self.location}: {self.message}"
+
+    @property
+    def location(self) -> str:
+        """The location of the deviation, as section or section.option."""
+        return f"{self.section}.{self.option}" if self.option else self.section or "package"
+
+
+class UciFleetResult(NamedTuple):
+    """The result of checking one device file: its deviations, or the error if it couldn't be parsed."""
+
+    path: str
+    deviations: list[UciDeviation]
+    error: str | None = None
+
+
+def _format(value: str | list[str]) -> str:
+    """Format a value the way uci show does, with each value in a list quoted separately."""
+    return " ".join(quote_value(item) for item in value) if isinstance(value, list) else quote_value(value)
+
+
+def _compare_options(key: str, expected: "UciSectionContent", actual: "UciSectionContent") -> list[UciDeviation]:
+    """Compare the options in a device section against the options in the matching template section."""
+    deviations: list[UciDeviation] = []
+    for name, value in expected.options.items():
+        found = actual.options.get(name)
+        if found is None:
+            deviations.append(UciDeviation(key, name, f"missing, expected {_format(value)}"))
+        elif found != value:
+            deviations.append(UciDeviation(key, name, f"is {_format(found)}, expected {_format(value)}"))
+    deviations.extend(
+        UciDeviation(key, name, f"unexpected {_format(value)}")
+        for name, value in actual.options.items()
+        if name not in expected.options
+    )
+    return deviations
+
+
+class UciTemplate:
+    """A golden file, parsed and indexed once, for comparing many device files against."""
+
+    def __init__(self, file: UciFile) -> None:
+        self._package = UciPackageContent.from_file(file)
+        self._matcher = UciSectionMatcher(self._package)
+        self._keys = section_references(self._package.sections)
+
+    def compare(self, file: UciFile) -> list[UciDeviation]:
+        """Compare a device file against the template, returning the deviations in template order."""
+        device = UciPackageContent.from_file(file)
+        matched = {index: other for other, index in self._matcher.match(device).items()}
+        deviations: list[UciDeviation] = []
+        if self._package.name and device.name and device.name != self._package.name:
+            deviations.append(UciDeviation("", None, f"package is {device.name}, expected {self._package.name}"))
+        for index, (key, expected) in enumerate(zip(self._keys, self._package.sections, strict=True)):
+            if index not in matched:
+                deviations.append(UciDeviation(key, None, "missing section"))
+                continue
+            actual = device.sections[matched[index]]
+            if actual.type != expected.type:
+                deviations.append(UciDeviation(key, None, f"type is {actual.type}, expected {expected.type}"))
+            deviations.extend(_compare_options(key, expected, actual))
+        unexpected = set(range(len(device.sections))) - set(matched.values())
+        for index, key in enumerate(section_references(device.sections)):
+            if index in unexpected:
+                deviations.append(UciDeviation(key, None, "unexpected section"))
+        return deviations
+
+
+# The template used by a worker process, set once when the worker starts
+_worker_template: UciTemplate | None = None
+
+
+def _init_worker(template: UciTemplate) -> None:
+    """Set the template used by a worker process."""
+    global _worker_template  # noqa: PLW0603
+    _worker_template = template
+    init_worker()
+
+
+def _check(template: UciTemplate, path: str) -> UciFleetResult:
+    """Check a single device file against a template."""
+    try:
+        return UciFleetResult(path, template.compare(UciFile.from_file(path)))
+    except (OSError, UnicodeDecodeError, UciParseError) as e:
+        return UciFleetResult(path, [], e.message if isinstance(e, UciParseError) else str(e))
+
+
+def _check_in_worker(path: str) -> UciFleetResult:
+    """Check a single device file against the template in a worker process."""
+    if _worker_template is None:  # only a safeguard, since the pool always sets the template
+        raise RuntimeError("Worker was not initialized")
+    return _check(_worker_template, path)
+
+
+def compare_fleet(template: UciTemplate | UciFile, paths: Iterable[str], jobs: int | None = None) -> Iterator[UciFleetResult]:
+    """
+    Check device files against a template, generating a result for each file in order.
+
+    If ``jobs`` is more than 1, the files are checked in a pool of that many
+    worker processes.  A file that can't be read or parsed is reported as an
+    error in its result rather than stopping the check.
+    """
+    if isinstance(template, UciFile):
+        template = UciTemplate(template)
+    if not jobs or jobs <= 1:
+        yield from (_check(template, path) for path in paths)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor  # noqa: PLC0415
+
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(template,)) as executor:
+        yield from executor.map(_check_in_worker, paths, chunksize=16)
+
+
+def drift(results: Iterable[UciFleetResult]) -> Counter[str]:
+    """Count the devices that deviate at each location, so the locations that drift most often can be found."""
+    counts: Counter[str] = Counter()
+    for result in results:
+        counts.update(list(dict.fromkeys(deviation.location for deviation in result.deviations)))  # unique, in order
+    return counts
@@ -0,0 +1,152 @@
+# vim: set ft=python ts=4 sw=4 expandtab:
+
+"""
+Integrate normalization with git, as a clean filter and as a textconv command.
+
+Configure the integration for a repository like this::
+
+    $ git config filter.uci.process "uciparse --git-filter"
+    $ git config diff.uci.textconv "uciparse --textconv"
+    $ echo "config/* filter=uci diff=uci" >> .gitattributes
+
+The ``filter.<driver>.process`` setting runs a single long-running process
+that cleans every file git touches, rather than one process per file.  Git
+talks to the process using the pkt-line protocol described in
+gitprotocol-common(5) and gitattributes(5): each packet is a 4-digit hex length
+(including the 4 bytes of the length itself) followed by the data, and a
+packet of ``0000`` is a flush packet that ends a list.  After a version and
+capability handshake, git sends a list of ``key=value`` headers (including
+``command`` and ``pathname``) and then the content of the file.  We answer with
+a status, the filtered content, and an empty list that leaves the status as-is.
+
+Only the ``clean`` command is supported.  Files are stored normalized, and are
+checked out exactly as stored.  If a file can't be parsed, we answer with
+``status=error``, and git stores the file unchanged (unless the filter is
+configured as required).
+
+The textconv command prints the normalized version of a file, so ``git diff``
+and ``git log -p`` show semantic differences.  If a file can't be parsed, it is
+printed as-is, so that the diff can still be shown.
+"""
+
+from typing import BinaryIO
+
+from uciparse.uci import UciFile, UciParseError
+
+# Maximum size of the data in a single packet
+MAX_PACKET_DATA = 65516
+
+# Protocol version we speak
+VERSION = "2"
+
+# Capabilities we support
+CAPABILITIES = ["clean"]
+
+
+def read_packet(stream: BinaryIO) -> bytes | None:
+    """Read a single packet, returning None for a flush packet, raising EOFError at end of stream."""
+    header = stream.read(4)
+    if not header:
+        raise EOFError("end of stream")
+    if len(header) != 4:
+        raise ValueError("truncated packet")
+    try:
+        length = int(header, 16)
+    except ValueError as e:
+        raise ValueError(f"invalid packet header {header!r}") from e
+    if length == 0:
+        return None
+    if length <= 4:
+        raise ValueError(f"invalid packet header {header!r}")
+    data = stream.read(length - 4)
+    if len(data) != length - 4:
+        raise ValueError("truncated packet")
+    return data
+
+
+def write_packet(stream: BinaryIO, data: bytes | None) -> None:
+    """Write a single packet, or a flush packet if data is None."""
+    if data is None:
+        stream.write(b"0000")
+    else:
+        stream.write(b"%04x" % (len(data) + 4) + data)
+
+
+def read_packets(stream: BinaryIO) -> list[bytes]:
+    """Read a list of packets, up to the next flush packet."""
+    packets = []
+    while (packet := read_packet(stream)) is not None:
+        packets.append(packet)
+    return packets
+
+
+def read_text(stream: BinaryIO) -> list[str]:
+    """Read a list of text packets, up to the next flush packet, without their trailing newlines."""
+    return [packet.decode().removesuffix("\n") for packet in read_packets(stream)]
+
+
+def write_text(stream: BinaryIO, lines: list[str]) -> None:
+    """Write a list of text packets, followed by a flush packet."""
+    for line in lines:
+        write_packet(stream, f"{line}\n".encode())
+    write_packet(stream, None)
+
+
+def write_content(stream: BinaryIO, content: bytes) -> None:
+    """Write content split into as many packets as needed, followed by a flush packet."""
+    for start in range(0, len(content), MAX_PACKET_DATA):
+        write_packet(stream, content[start : start + MAX_PACKET_DATA])
+    write_packet(stream, None)
+
+
+def clean(content: bytes) -> bytes:
+    """Normalize the content of a file, raising UciParseError if it can't be parsed."""
+    try:
+        text = content.decode()
+    except UnicodeDecodeError as e:
+        raise UciParseError(f"File is not valid UTF-8: {e}") from e
+    return "".join(UciFile.from_text(text).normalized()).encode()
+
+
+def _handshake(stdin: BinaryIO, stdout: BinaryIO) -> None:
+    """Perform the version and capability handshake at the start of the protocol."""
+    welcome = read_text(stdin)
+    if not welcome or welcome[0] != "git-filter-client" or f"version={VERSION}" not in welcome[1:]:
+        raise ValueError(f"unsupported filter client {welcome!r}")
+    write_text(stdout, ["git-filter-server", f"version={VERSION}"])
+    offered = read_text(stdin)
+    write_text(stdout, [f"capability={capability}" for capability in CAPABILITIES if f"capability={capability}" in offered])
+    stdout.flush()
+
+
+def filter_process(stdin: BinaryIO, stdout: BinaryIO) -> None:
+    """Run the long-running filter process protocol until git closes the stream."""
+    _handshake(stdin, stdout)
+    while True:
+        try:
+            headers = dict(line.partition("=")[::2] for line in read_text(stdin))
+        except EOFError:
+            return  # git is done with us
+        content = b"".join(read_packets(stdin))
+        if headers.get("command") not in CAPABILITIES:
+            write_text(stdout, ["status=error"])
+        else:
+            try:
+                cleaned = clean(content)
+            except UciParseError:
+                write_text(stdout, ["status=error"])
+            else:
+                write_text(stdout, ["status=success"])
+                write_content(stdout, cleaned)
+                write_packet(stdout, None)  # an empty list keeps the status unchanged
+        stdout.flush()
+
+
+def textconv(path: str) -> str:
+    """Convert a file for display in a diff, normalizing it if it can be parsed and returning it as-is otherwise."""
+    with open(path, encoding=None) as fp:  # noqa: FURB101,PTH123  # use platform-specific encoding
+        text = fp.read()
+    try:
+        return "".join(UciFile.from_text(text).normalized())
+    except UciParseError:
+        return text
@@ -0,0 +1,283 @@
+# vim: set ft=python ts=4 sw=4 expandtab:
+
+"""
+Lint UCI files in a single pass, with pluggable rules.
+
+A file can be syntactically valid and still be wrong: a section defined twice,
+an option set twice in the same section, or an option that appears before any
+config line.  Each such check is a ``UciLintRule``, which declares the line
+types it checks.  ``UciLinter`` walks the lines of a file once, and dispatches
+each line only to the rules registered for its type, so adding a rule doesn't
+add another pass over the file.
+
+A new instance of each rule is created for every file, so a rule can keep its
+own state (like the names it has already seen) in attributes.  The state shared
+by every rule, such as the config line of the current section, is kept in a
+``UciLintContext``.  A rule reports a finding with ``report()``, and can report
+anything it has accumulated from ``finish()``, which is called once the whole
+file has been checked.
+
+Parsed lines don't record their line numbers, so the linter parses the text
+itself, one line at a time, as it walks it.  A line that can't be parsed is
+reported as a ``syntax`` finding, and linting continues with the next line, so
+every syntax error in a file is reported at once.
+
+Rules are registered with the ``register`` decorator and identified by name in
+``RULES``.  ``lint_files()`` lints many files, in a pool of worker processes if
+asked to.
+"""
+
+import os
+from abc import ABC, abstractmethod
+from collections.abc import Callable, Iterable, Iterator
+from typing import ClassVar, NamedTuple
+
+from uciparse.profiling import init_worker
+from uciparse.uci import UciConfigLine, UciLine, UciListLine, UciOptionLine, UciPackageLine, UciParseError, parse_line
+
+
+class UciFinding(NamedTuple):
+    """A problem found by a lint rule, at a line number."""
+
+    lineno: int
+    rule: str
+    message: str
+
+    def __str__(self) -> str:
+        return f"{self.lineno}: {self.message} [{self.rule}]"
+
+
+class UciLintResult(NamedTuple):
+    """The result of linting one file: its findings, or the error if it couldn't be read."""
+
+    path: str
+    findings: list[UciFinding]
+    error: str | None = None
+
+
+class UciLintContext:
+    """The state of the file being linted, shared by every rule checking it."""
+
+    def __init__(self, path: str | None = None) -> None:
+        self.path = path
+        self.section: UciConfigLine | None = None  # config line of the current section, set before it is checked
+        self.findings: list[UciFinding] = []
+
+
+class UciLintRule(ABC):
+    """
+    A lint rule, checking the lines of the types in ``line_types``.
+
+    Subclasses set ``name``, ``description`` and ``line_types``, and implement
+    ``check()``.  A new instance is created for each file.
+    """
+
+    name: ClassVar[str]
+    description: ClassVar[str]
+    line_types: ClassVar[tuple[type[UciLine], ...]]
+
+    def __init__(self, context: UciLintContext) -> None:
+        self.context = context
+
+    @abstractmethod
+    def check(self, lineno: int, line: UciLine) -> None:
+        """Check a line, which is an instance of one of the line types of the rule."""
+
+    def finish(self) -> None:  # noqa: B027  # optional, unlike check()
+        """Called once every line in the file has been checked."""
+
+    def report(self, lineno: int, message: str) -> None:
+        """Report a finding at a line number."""
+        self.context.findings.append(UciFinding(lineno, self.name, message))
+
+
+# Registered rules, by name, in the order they were registered
+RULES: dict[str, type[UciLintRule]] = {}
+
+
+def register(rule: type[UciLintRule]) -> type[UciLintRule]:
+    """Register a rule, so it is used by default; raises ValueError if another rule has the same name."""
+    if rule.name in RULES or rule.name == "syntax":
+        raise ValueError(f"Duplicate rule: {rule.name}")
+    RULES[rule.name] = rule
+    return rule
+
+
+def _kind(line: UciLine) -> str:
+    """The kind of an option or list line, as used in messages."""
+    return "list" if isinstance(line, UciListLine) else "option"
+
+
+@register
+class _PackageName(UciLintRule):
+    name = "package-name"
+    description = "the package line does not match the name of the file"
+    line_types = (UciPackageLine,)
+
+    def check(self, lineno: int, line: UciLine) -> None:
+        expected = os.path.basename(self.context.path) if self.context.path else None  # noqa: PTH119
+        if isinstance(line, UciPackageLine) and expected and line.name != expected:
+            self.report(lineno, f"package {line.name} does not match file name {expected}")
+
+
+@register
+class _OutsideSection(UciLintRule):
+    name = "outside-section"
+    description = "an option or list appears before any config line"
+    line_types = (UciOptionLine, UciListLine)
+
+    def check(self, lineno: int, line: UciLine) -> None:
+        if isinstance(line, (UciOptionLine, UciListLine)) and self.context.section is None:
+            self.report(lineno, f"{_kind(line)} {line.name} is outside of any config section")
+
+
+@register
+class _DuplicateSection(UciLintRule):
+    name = "duplicate-section"
+    description = "a named section is defined more than once"
+    line_types = (UciConfigLine,)
+
+    def __init__(self, context: UciLintContext) -> None:
+        super().__init__(context)
+        self.seen: dict[str, int] = {}
+
+    def check(self, lineno: int, line: UciLine) -> None:
+        if isinstance(line, UciConfigLine) and line.name is not None:
+            first = self.seen.setdefault(line.name, lineno)
+            if first != lineno:
+                self.report(lineno, f"section {line.name} is already defined on line {first}")
+
+
+@register
+class _DuplicateOption(UciLintRule):
+    name = "duplicate-option"
+    description = "an option is set more than once in the same section"
+    line_types = (UciConfigLine, UciOptionLine)
+
+    def __init__(self, context: UciLintContext) -> None:
+        super().__init__(context)
+        self.seen: dict[str, int] = {}
+
+    def check(self, lineno: int, line: UciLine) -> None:
+        if isinstance(line, UciConfigLine):
+            self.seen.clear()
+            return
+        if not isinstance(line, UciOptionLine):
+            return
+        first = self.seen.setdefault(line.name, lineno)
+        if first != lineno:
+            self.report(lineno, f"option {line.name} is already set on line {first}")
+
+
+@register
+class _OptionListCollision(UciLintRule):
+    name = "option-list-collision"
+    description = "the same name is used for both an option and a list in a section"
+    line_types = (UciConfigLine, UciOptionLine, UciListLine)
+
+    def __init__(self, context: UciLintContext) -> None:
+        super().__init__(context)
+        self.options: dict[str, int] = {}
+        self.lists: dict[str, int] = {}
+
+    def check(self, lineno: int, line: UciLine) -> None:
+        if isinstance(line, UciConfigLine):
+            self.options.clear()
+            self.lists.clear()
+            return
+        if not isinstance(line, (UciOptionLine, UciListLine)):
+            return
+        same, other = (self.lists, self.options) if isinstance(line, UciListLine) else (self.options, self.lists)
+        same.setdefault(line.name, lineno)
+        if line.name in other:
+            other_kind = "an option" if other is self.options else "a list"
+            self.report(lineno, f"{_kind(line)} {line.name} is already set as {other_kind} on line {other[line.name]}")
+
+
+class UciLinter:
+    """
+    Lints files with a set of rules, walking each file once.
+
+    By default, every registered rule is used.  Rules can be disabled by name;
+    the name of an unknown rule raises ValueError.
+    """
+
+    def __init__(self, rules: Iterable[type[UciLintRule]] | None = None, *, disable: Iterable[str] = ()) -> None:
+        rules = list(RULES.values() if rules is None else rules)
+        disabled = set(disable)
+        unknown = disabled - {rule.name for rule in rules} - {"syntax"}
+        if unknown:
+            raise ValueError(f"Unknown rule: {', '.join(sorted(unknown))}")
+        self.rules = [rule for rule in rules if rule.name not in disabled]
+        self.syntax = "syntax" not in disabled
+
+    def lint_text(self, text: str, path: str | None = None) -> list[UciFinding]:
+        """Lint the text of a file, returning the findings in line order; the path is used by rules that need it."""
+        context = UciLintContext(path)
+        rules = [rule(context) for rule in self.rules]
+        dispatch: dict[type[UciLine], list[Callable[[int, UciLine], None]]] = {}  # checks, by concrete line type
+        for lineno, text_line in enumerate(text.splitlines(keepends=True), start=1):
+            try:
+                line = parse_line(lineno, text_line)
+            except UciParseError as e:
+                if self.syntax:
+                    context.findings.append(UciFinding(lineno, "syntax", e.message.partition(": ")[2]))
+                continue
+            if line is None:
+                continue
+            if isinstance(line, UciConfigLine):
+                context.section = line
+            checks = dispatch.get(type(line))
+            if checks is None:
+                checks = dispatch[type(line)] = [rule.check for rule in rules if isinstance(line, rule.line_types)]
+            for check in checks:
+                check(lineno, line)
+        for rule in rules:
+            rule.finish()
+        context.findings.sort(key=lambda finding: finding.lineno)  # stable, so findings on one line stay in order
+        return context.findings
+
+    def lint_file(self, path: str) -> UciLintResult:
+        """Lint a file on disk; a file that can't be read is reported as an error in the result."""
+        try:
+            with open(path, encoding=None) as fp:  # noqa: FURB101,PTH123  # use platform-specific encoding
+                text = fp.read()
+        except (OSError, UnicodeDecodeError) as e:
+            return UciLintResult(path, [], str(e))
+        return UciLintResult(path, self.lint_text(text, path))
+
+
+# The linter used by a worker process, set once when the worker starts
+_worker_linter: UciLinter | None = None
+
+
+def _init_worker(linter: UciLinter) -> None:
+    """Set the linter used by a worker process."""
+    global _worker_linter  # noqa: PLW0603
+    _worker_linter = linter
+    init_worker()
+
+
+def _lint_in_worker(path: str) -> UciLintResult:
+    """Lint a single file with the linter in a worker process."""
+    if _worker_linter is None:  # only a safeguard, since the pool always sets the linter
+        raise RuntimeError("Worker was not initialized")
+    return _worker_linter.lint_file(path)
+
+
+def lint_files(linter: UciLinter, paths: Iterable[str], jobs: int | None = None) -> Iterator[UciLintResult]:
+    """
+    Lint files, generating a result for each file in order.
+
+    If ``jobs`` is more than 1, the files are linted in a pool of that many
+    worker processes.  The rules must be importable by the workers, so rules
+    defined in ``__main__`` only work with a single job.
+    """
+    if not jobs or jobs <= 1:
+        yield from (linter.lint_file(path) for path in paths)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor  # noqa: PLC0415
+
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(linter,)) as executor:
+        yield from executor.map(_lint_in_worker, paths, chunksize=16)
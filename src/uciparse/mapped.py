@@ -0,0 +1,237 @@
+# vim: set ft=python ts=4 sw=4 expandtab:
+
+"""
+Random access to very large UCI files through a memory map.
+
+Opening a file with ``UciFile.open_mapped()`` maps the file into memory without
+reading or parsing it.  An index of line start offsets and section boundaries
+is built as the file is accessed, a block at a time, and only as far into the
+file as is needed.  Lines are parsed on demand, each time they are accessed, so
+memory use is proportional to the size of the index and the part of the file
+that is actually viewed, not to the size of the file.
+
+The index is compact: the line start offsets are kept in an ``array`` of
+unsigned 64-bit integers, and the section boundaries in another, rather than in
+lists of Python objects.  Asking for the number of lines or sections, or using
+a negative index, indexes the whole file.  The key of an anonymous section
+depends on the sections of the same type that come before it, so the first
+time an anonymous section near the end of a file is accessed, all of the config
+lines before it are parsed (but nothing else).
+
+A mapped file must be UTF-8.  Lines end only at ``\\n``, ``\\r\\n`` or
+``\\r``, and a section starts at any config line that is indented with ASCII
+whitespace, if at all.  Sections are returned the same way as by
+``UciFile.sections()``, but blank lines are included in ``lines`` (as None), so
+that the index into ``lines`` is always the line number in the file, less one.
+"""
+
+import mmap
+import re
+from array import array
+from collections.abc import Iterator, Sequence
+from itertools import accumulate, islice
+from types import TracebackType
+from typing import overload
+
+from uciparse.uci import UciConfigLine, UciLine, UciParseError, UciSection, parse_line
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from os import PathLike
+
+# Number of bytes indexed at a time
+BLOCK_SIZE = 1 << 20
+
+# Matches the config keyword, which starts a new section if it begins a line
+_CONFIG_REGEX = re.compile(rb"config\s")
+
+# Whitespace that may indent a config line
+_INDENT = b"\t\x0b\x0c "
+
+
+def _count_lines(data: bytes, start: int, end: int) -> int:
+    """Count the line endings between two offsets, neither of which is within a \\r\\n."""
+    return data.count(b"\n", start, end) + data.count(b"\r", start, end) - data.count(b"\r\n", start, end)
+
+
+class UciMappedLines(Sequence[UciLine | None]):
+    """The lines in a mapped file, each parsed when it is accessed, with None for a blank line."""
+
+    def __init__(self, file: "UciMappedFile") -> None:
+        self._file = file
+
+    def __len__(self) -> int:
+        return self._file.line_count()
+
+    @overload
+    def __getitem__(self, index: int) -> UciLine | None: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[UciLine | None]: ...
+
+    def __getitem__(self, index: int | slice) -> list[UciLine | None] | UciLine | None:
+        if isinstance(index, slice):
+            return [self._file.line(lineno) for lineno in self._file.line_range(index)]
+        return self._file.line(index)
+
+
+class UciMappedFile:
+    """A UCI file mapped into memory, indexed and parsed on demand; see uciparse.mapped for details."""
+
+    def __init__(self, path: "str | PathLike[str]", *, max_line_length: int | None = None) -> None:
+        self.max_line_length = max_line_length
+        with open(path, "rb") as fp:  # noqa: PTH123
+            try:
+                self._map: mmap.mmap | bytes = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                self._map = b""  # an empty file can't be mapped
+        self._starts = array("Q", [0])  # start offset of each line indexed so far, plus the offset where indexing resumes
+        self._configs = array("Q")  # index of each config line found so far
+        self._keys: list[str] = []  # keys of the sections whose key has been needed so far, in order
+        self._counts: dict[str, int] = {}  # number of sections of each type in self._keys
+        self._preamble: bool | None = None  # whether there are any lines before the first config line, once known
+        self.lines = UciMappedLines(self)
+
+    def __enter__(self) -> "UciMappedFile":
+        return self
+
+    def __exit__(
+        self, exc_type: type[BaseException] | None, exc_value: BaseException | None, traceback: TracebackType | None
+    ) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self.section_count()
+
+    def __getitem__(self, index: int) -> UciSection:
+        return self.section(index)
+
+    def __iter__(self) -> Iterator[UciSection]:
+        index = 0
+        while self._find_section(index) is not None:
+            yield self.section(index)
+            index += 1
+
+    def close(self) -> None:
+        """Unmap the file."""
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+
+    @property
+    def indexed(self) -> int:
+        """Number of bytes of the file that have been indexed so far."""
+        return self._starts[-1]
+
+    def line_count(self) -> int:
+        """Return the number of lines in the file, indexing the whole file."""
+        while self._extend():
+            pass
+        return len(self._starts) - 1
+
+    def section_count(self) -> int:
+        """Return the number of sections in the file, indexing the whole file."""
+        self.line_count()
+        return len(self._configs) + (1 if self._has_preamble() else 0)
+
+    def line_range(self, index: slice) -> range:
+        """Return the line indexes selected by a slice, indexing only as much of the file as needed."""
+        start, stop, step = index.start, index.stop, index.step
+        if (start or 0) >= 0 and stop is not None and stop >= 0 and (step or 1) > 0:
+            self._find_line(stop - 1)  # the slice can be resolved without knowing how many lines there are
+            return range(*index.indices(len(self._starts) - 1))
+        return range(*index.indices(self.line_count()))
+
+    def line(self, index: int) -> UciLine | None:
+        """Parse and return a line, or None if it is blank, raising IndexError if there is no such line."""
+        if index < 0:
+            index += self.line_count()
+        if index < 0 or not self._find_line(index):
+            raise IndexError("line index out of range")
+        data = self._map[self._starts[index] : self._starts[index + 1]]
+        try:
+            text = data.decode()
+        except UnicodeDecodeError as e:
+            raise UciParseError(f"Error on line {index + 1}: line is not valid UTF-8: {e}") from e
+        return parse_line(index + 1, text, max_line_length=self.max_line_length)
+
+    def section(self, index: int) -> UciSection:
+        """Parse and return a section, raising IndexError if there is no such section."""
+        if index < 0:
+            index += self.section_count()
+        first = self._find_section(index) if index >= 0 else None
+        if first is None:
+            raise IndexError("section index out of range")
+        last = self._find_section(index + 1)
+        stop = last if last is not None else self.line_count()
+        config: UciConfigLine | None = None
+        if index == 0 and self._has_preamble():
+            key, start = "", first
+        else:
+            config = self._config(first)
+            key, start = config.name or self._key(index), first + 1  # a named section doesn't need the other keys
+        return UciSection(key=key, config=config, lines=[line for line in self.lines[start:stop] if line])
+
+    def _extend(self) -> bool:
+        """Index the next block of the file, returning False if the whole file has already been indexed."""
+        start = self._starts[-1]
+        if start >= len(self._map):
+            return False
+        end = self._map.find(b"\n", start + BLOCK_SIZE)  # blocks end at \n, so a \r\n is never split
+        end = len(self._map) if end < 0 else end + 1
+        block = self._map[start:end]
+        lineno, previous = len(self._starts) - 1, 0  # a line in the block, and its offset within the block
+        self._starts.extend(islice(accumulate(map(len, block.splitlines(keepends=True)), initial=start), 1, None))
+        for match in _CONFIG_REGEX.finditer(block):
+            begin = max(block.rfind(b"\n", previous, match.start()), block.rfind(b"\r", previous, match.start()), previous - 1) + 1
+            lineno += _count_lines(block, previous, begin)
+            previous = begin
+            if not block[begin : match.start()].strip(_INDENT):
+                self._configs.append(lineno)
+        return True
+
+    def _find_line(self, index: int) -> bool:
+        """Index the file up to a line, returning whether the line exists."""
+        while index >= len(self._starts) - 1:
+            if not self._extend():
+                return False
+        return True
+
+    def _has_preamble(self) -> bool:
+        """Whether there are any lines before the first config line, which make up a section of their own."""
+        if self._preamble is None:
+            while not self._configs and self._extend():
+                pass
+            end = self._starts[self._configs[0]] if self._configs else self._starts[-1]
+            self._preamble = bool(self._map[:end].decode(errors="replace").strip())
+        return self._preamble
+
+    def _find_section(self, index: int) -> int | None:
+        """Index the file up to the start of a section, returning its first line, or None if there is no such section."""
+        if self._has_preamble():
+            if index == 0:
+                return 0
+            index -= 1
+        while index >= len(self._configs):
+            if not self._extend():
+                return None
+        return self._configs[index]
+
+    def _key(self, index: int) -> str:
+        """Return the key of a section, working out the keys of all the sections before it."""
+        while index >= len(self._keys):
+            section = len(self._keys) - (1 if self._has_preamble() else 0)
+            if section < 0:
+                self._keys.append("")
+                continue
+            config = self._config(self._configs[section])
+            count = self._counts.get(config.section, 0)
+            self._counts[config.section] = count + 1
+            self._keys.append(config.name or f"@{config.section}[{count}]")
+        return self._keys[index]
+
+    def _config(self, index: int) -> UciConfigLine:
+        """Parse and return a config line, which was found by the index."""
+        line = self.line(index)
+        if not isinstance(line, UciConfigLine):  # only a safeguard, since the index only finds config lines
+            raise UciParseError(f"Error on line {index + 1}: invalid config line")
+        return line
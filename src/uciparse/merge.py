@@ -0,0 +1,326 @@
+# vim: set ft=python ts=4 sw=4 expandtab:
+
+"""
+Merge UCI files at the level of sections and options.
+
+Overlay Merge
+=============
+
+An overlay merge layers one or more overlay files on top of a base file, the
+way a device configuration might be built from a base template plus site and
+device overlays.  Overlays are applied in order, so a later overlay wins over an
+earlier one.
+
+Named sections are matched by name.  Each option in an overlay section
+replaces the option with the same name in the base section, in place.  Lists
+either replace the base list with the same name (the default) or are appended
+to it.  Options and lists that don't exist in the base section are added at
+the end of the section, and named sections that don't exist in the base file
+are added at the end of the file.  Anonymous sections have no identity that
+could be matched, so anonymous sections in an overlay are always added at the
+end of the file.
+
+Standalone comments in an overlay are ignored, but a trailing comment on an
+option or list line comes along with that line.  The merged file shares line
+objects with its inputs, so treat the lines as read-only.
+
+A conflict is reported (and the overlay wins) when an overlay changes the type
+of a named section, when an overlay uses a list where the base uses an option
+or vice-versa, or when the package names differ.
+
+Each overlay is applied using an index of the sections in the merged result,
+so the cost of a merge is linear in the size of the inputs.
+
+Three-Way Merge
+===============
+
+A three-way merge reconciles two files (ours and theirs) that were both
+derived from a common base, like an on-device file and a central template.
+The merge works on sections and options rather than on lines, so it never
+needs a line-based longest common subsequence.
+
+Sections are matched between the three files using a hash table.  Named
+sections are matched by name.  Anonymous sections are matched by type, first
+by identical content and then in order of appearance, so that adding or
+removing a section on one side doesn't cause every later section of that type
+to look modified.
+
+For each option (treating all of the values in a list as a single value), a
+change on only one side is taken automatically.  If both sides made the same
+change, that change is taken.  If both sides changed the option in different
+ways, conflict markers are emitted showing both versions, and a conflict is
+reported.  Deleting a section on one side while modifying it on the other, or
+changing the type of a section in different ways, is also a conflict.
+
+The result follows the order and comments of our file, with options and
+sections that were added only in their file appended at the end of the
+enclosing section or file.
+"""
+
+from collections import deque
+from typing import NamedTuple
+
+from uciparse.uci import UciFile, UciLine, UciListLine, UciOptionLine, UciPackageLine, UciSection
+
+LIST_REPLACE = "replace"
+LIST_APPEND = "append"
+
+
+class UciConflict:
+    """A conflict found while merging UCI files."""
+
+    def __init__(self, section: str, option: str | None, message: str) -> None:
+        self.section = section
+        self.option = option
+        self.message = message
+
+    def __str__(self) -> str:
+        location = f"{self.section}.{self.option}" if self.option else self.section or "package"
+        return f"{location}: {self.message}"
+
+
+class UciMergeResult(NamedTuple):
+    """The result of a merge: the merged file, along with any conflicts that were found."""
+
+    file: UciFile
+    conflicts: list[UciConflict]
+
+
+def _group(lines: list[UciLine]) -> dict[str, list[UciLine]]:
+    """Group the option and list lines in a section by name, in order of first appearance."""
+    grouped: dict[str, list[UciLine]] = {}
+    for line in lines:
+        if isinstance(line, (UciOptionLine, UciListLine)):
+            grouped.setdefault(line.name, []).append(line)
+    return grouped
+
+
+def _merge_lines(key: str, base: list[UciLine], overlay: list[UciLine], lists: str, conflicts: list[UciConflict]) -> list[UciLine]:
+    """Merge the lines of an overlay section into the lines of a base section."""
+    grouped = _group(overlay)
+    if not grouped:
+        return base
+
+    # The overlay lines for a name are placed at the first base line with that name (or the last, when appending)
+    last: dict[str, int] = {}
+    for index, line in enumerate(base):
+        if isinstance(line, (UciOptionLine, UciListLine)) and line.name in grouped:
+            last[line.name] = index
+
+    merged: list[UciLine] = []
+    placed: set[str] = set()
+    for index, line in enumerate(base):
+        if not isinstance(line, (UciOptionLine, UciListLine)) or line.name not in grouped:
+            merged.append(line)
+            continue
+        replacement = grouped[line.name]
+        if type(line) is not type(replacement[0]) and line.name not in placed:
+            conflicts.append(UciConflict(key, line.name, "overlay changes option to list or list to option"))
+        if isinstance(line, UciListLine) and isinstance(replacement[0], UciListLine) and lists == LIST_APPEND:
+            merged.append(line)
+            if index == last[line.name]:
+                merged.extend(replacement)
+                placed.add(line.name)
+        elif line.name not in placed:
+            merged.extend(replacement)
+            placed.add(line.name)
+
+    for name, replacement in grouped.items():
+        if name not in placed:
+            merged.extend(replacement)
+    return merged
+
+
+def _apply(sections: list[UciSection], index: dict[str, UciSection], overlay: UciFile, lists: str) -> list[UciConflict]:
+    """Apply an overlay to the merged sections in place, returning any conflicts."""
+    conflicts: list[UciConflict] = []
+    for section in overlay.sections():
+        if section.config and not section.config.name:
+            copy = UciSection(key=section.key, config=section.config, lines=list(section.lines))
+            sections.append(copy)
+            continue
+        target = index.get(section.key)
+        if target is None:
+            target = UciSection(key=section.key, config=section.config, lines=[])
+            index[section.key] = target
+            sections.insert(len(sections) if section.config else 0, target)
+        elif section.config and target.config and section.config.section != target.config.section:
+            message = f"overlay changes section type from {target.config.section} to {section.config.section}"
+            conflicts.append(UciConflict(section.key, None, message))
+            target.config = section.config
+        if not section.config:
+            packages = [line for line in section.lines if isinstance(line, UciPackageLine)]
+            existing = [line for line in target.lines if isinstance(line, UciPackageLine)]
+            if packages and existing and packages[0].name != existing[0].name:
+                message = f"overlay changes package from {existing[0].name} to {packages[0].name}"
+                conflicts.append(UciConflict("", None, message))
+            if packages and not existing:
+                target.lines.insert(0, packages[0])
+        target.lines = _merge_lines(section.key, target.lines, section.lines, lists, conflicts)
+    return conflicts
+
+
+def overlay(base: UciFile, *overlays: UciFile, lists: str = LIST_REPLACE) -> UciMergeResult:
+    """Layer one or more overlay files on top of a base file, in order."""
+    if lists not in {LIST_REPLACE, LIST_APPEND}:
+        raise ValueError(f"Unknown list mode: {lists}")
+    sections = [UciSection(key=section.key, config=section.config, lines=list(section.lines)) for section in base.sections()]
+    index: dict[str, UciSection] = {}
+    for section in sections:
+        if not section.config or section.config.name:
+            index.setdefault(section.key, section)
+    conflicts: list[UciConflict] = []
+    for layer in overlays:
+        conflicts.extend(_apply(sections, index, layer, lists))
+    lines: list[UciLine] = []
+    for section in sections:
+        if section.config:
+            lines.append(section.config)
+        lines.extend(section.lines)
+    return UciMergeResult(file=UciFile(lines=lines), conflicts=conflicts)
+
+
+class UciConflictLine(UciLine):
+    """A pair of conflicting versions of one or more lines, emitted with conflict markers."""
+
+    def __init__(self, ours: list[UciLine], theirs: list[UciLine], labels: tuple[str, str] = ("ours", "theirs")) -> None:
+        self.ours = ours
+        self.theirs = theirs
+        self.labels = labels
+
+    def normalized(self) -> str:
+        """Serialize the line in normalized form."""
+        ours = "".join(line.normalized() for line in self.ours)
+        theirs = "".join(line.normalized() for line in self.theirs)
+        return f"<<<<<<< {self.labels[0]}\n{ours}=======\n{theirs}>>>>>>> {self.labels[1]}\n"
+
+
+# Semantic value of an option or list in a section, or None if it doesn't exist
+_Value = str | tuple[str, ...] | None
+
+
+def _index(file: UciFile) -> dict[str, UciSection]:
+    """Index the sections in a file by key, combining duplicate sections the way UCI does."""
+    index: dict[str, UciSection] = {}
+    for section in file.sections():
+        if section.key in index:
+            index[section.key].lines.extend(section.lines)
+        else:
+            index[section.key] = section
+    return index
+
+
+def _values(section: UciSection | None) -> dict[str, _Value]:
+    """Return the semantic values in a section, with lists converted to tuples."""
+    if section is None:
+        return {}
+    return {name: tuple(value) if isinstance(value, list) else value for name, value in section.options().items()}
+
+
+def _content(section: UciSection) -> tuple[object, ...]:
+    """Return a hashable representation of the content of a section."""
+    return (section.config.section if section.config else None, tuple(_values(section).items()))
+
+
+def _rekey(base: dict[str, UciSection], other: dict[str, UciSection], side: str) -> dict[str, UciSection]:
+    """Re-key the anonymous sections in another file so they use the keys of the matching base sections."""
+    unmatched: dict[tuple[object, ...], deque[str]] = {}
+    remaining: dict[str | None, deque[str]] = {}
+    for key, section in base.items():
+        if section.config and not section.config.name:
+            unmatched.setdefault(_content(section), deque()).append(key)
+
+    matched: dict[str, str] = {}
+    pending: list[str] = []
+    for key, section in other.items():
+        if section.config and not section.config.name:
+            candidates = unmatched.get(_content(section))
+            if candidates:
+                matched[key] = candidates.popleft()
+            else:
+                pending.append(key)
+
+    # Anything that didn't match on content is matched in order against the remaining base sections of the same type
+    used = set(matched.values())
+    for key, section in base.items():
+        if section.config and not section.config.name and key not in used:
+            remaining.setdefault(section.config.section, deque()).append(key)
+    for key in pending:
+        config = other[key].config
+        candidates = remaining.get(config.section if config else None)
+        matched[key] = candidates.popleft() if candidates else f"{key}~{side}"
+
+    return {matched.get(key, key): section for key, section in other.items()}
+
+
+def _option_lines(section: UciSection | None) -> dict[str, list[UciLine]]:
+    """Return the option and list lines in a section, grouped by name."""
+    return _group(section.lines) if section else {}
+
+
+def _merge_section(
+    key: str,
+    sections: tuple[UciSection | None, UciSection | None, UciSection | None],
+    labels: tuple[str, str],
+    conflicts: list[UciConflict],
+) -> list[UciLine]:
+    """Three-way merge a single section, returning the merged lines (including the config line)."""
+    _, ours, theirs = sections
+    merged: list[UciLine] = []
+    base_type, ours_type, theirs_type = (section.config.section if section and section.config else None for section in sections)
+    if ours and theirs and ours_type != theirs_type and base_type not in {ours_type, theirs_type}:
+        conflicts.append(UciConflict(key, None, "section type changed in both"))
+        merged.append(UciConflictLine([ours.config] if ours.config else [], [theirs.config] if theirs.config else [], labels))
+    elif ours and (not theirs or ours_type != base_type or ours_type == theirs_type):
+        merged.extend([ours.config] if ours.config else [])
+    elif theirs:
+        merged.extend([theirs.config] if theirs.config else [])
+
+    base_values, ours_values, theirs_values = (_values(section) for section in sections)
+    ours_lines, theirs_lines = _option_lines(ours), _option_lines(theirs)
+
+    def resolve(name: str) -> list[UciLine]:
+        value = base_values.get(name)
+        if ours_values.get(name) == theirs_values.get(name) or theirs_values.get(name) == value:
+            return ours_lines.get(name, [])
+        if ours_values.get(name) == value:
+            return theirs_lines.get(name, [])
+        conflicts.append(UciConflict(key, name, "changed in both"))
+        return [UciConflictLine(ours_lines.get(name, []), theirs_lines.get(name, []), labels)]
+
+    emitted: set[str] = set()
+    for line in ours.lines if ours else []:
+        if not isinstance(line, (UciOptionLine, UciListLine)):
+            merged.append(line)
+        elif line.name not in emitted:
+            emitted.add(line.name)
+            merged.extend(resolve(line.name))
+    for name in theirs_lines:
+        if name not in emitted:
+            merged.extend(resolve(name))
+    return merged
+
+
+def merge3(base: UciFile, ours: UciFile, theirs: UciFile, labels: tuple[str, str] = ("ours", "theirs")) -> UciMergeResult:
+    """Three-way merge two files derived from a common base."""
+    base_index = _index(base)
+    ours_index = _rekey(base_index, _index(ours), "ours")
+    theirs_index = _rekey(base_index, _index(theirs), "theirs")
+
+    keys = list(ours_index)
+    keys.extend(key for key in theirs_index if key not in ours_index)
+
+    lines: list[UciLine] = []
+    conflicts: list[UciConflict] = []
+    for key in keys:
+        base_section, ours_section, theirs_section = base_index.get(key), ours_index.get(key), theirs_index.get(key)
+        remaining = ours_section or theirs_section
+        if base_section and remaining and not (ours_section and theirs_section):
+            if _content(base_section) == _content(remaining):
+                continue  # deleted on one side and unchanged on the other
+            conflicts.append(UciConflict(key, None, "deleted on one side and modified on the other"))
+            kept = _merge_section(key, (None, ours_section, theirs_section), labels, [])
+            lines.append(UciConflictLine(kept if ours_section else [], kept if theirs_section else [], labels))
+        else:
+            lines.extend(_merge_section(key, (base_section, ours_section, theirs_section), labels, conflicts))
+    return UciMergeResult(file=UciFile(lines=lines), conflicts=conflicts)
@@ -0,0 +1,200 @@
+# vim: set ft=python ts=4 sw=4 expandtab:
+
+"""
+Collect profiling data from the command-line tools.
+
+When a tool is slow on a particular file, ``--profile OUT.pstats`` records a
+cProfile profile of the whole command and writes it to a file that can be
+examined with ``python -m pstats OUT.pstats``, and ``--trace-memory`` traces
+allocations with tracemalloc and reports the lines of ``uci.py`` that hold the
+most memory.  Either one also reports the time spent in each phase of the
+command (parsing, normalizing, diffing and so on) to stderr.
+
+The tools wrap each phase in ``phase()``, which does nothing unless a
+``UciProfiler`` is active, so the phases cost nothing in normal use.  The
+command-line tools don't even import this module unless they're profiling.  Memory
+that a phase allocates is usually released as soon as the command is done with
+it, so when tracing memory, a snapshot is taken at the end of each phase, while
+its results are still in use, and the report is based on the snapshot taken
+when the most memory was in use.
+
+A command that checks files in a pool of worker processes is profiled in each
+worker too.  The main process passes a temporary directory to the workers
+through the environment, each worker writes its profile there when it exits,
+and the main process merges those profiles into its own before writing the
+file.  Memory is only traced in the main process.
+"""
+
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    import cProfile
+    import tracemalloc
+    from collections.abc import Iterator
+    from typing import TextIO
+
+# Environment variable that tells worker processes where to write their profiles
+_WORKER_DIRECTORY = "UCIPARSE_PROFILE_WORKERS"
+
+# The profiler for the running command, if any
+_active: "UciProfiler | None" = None
+
+
+class UciProfiler:
+    """
+    Profiles a command and traces its memory use, as a context manager, reporting the results on exit.
+
+    The profile is written to the ``profile`` path, if there is one.  The
+    report of the time spent in each phase, and of the ``top`` lines of ``uci.py``
+    holding the most memory if ``trace_memory`` is set, is written to ``stream``.
+    """
+
+    def __init__(
+        self, profile: str | None = None, *, trace_memory: bool = False, top: int = 10, stream: "TextIO | None" = None
+    ) -> None:
+        self.profile = profile
+        self.trace_memory = trace_memory
+        self.top = top
+        self.stream = stream
+        self.phases: dict[str, tuple[int, float]] = {}  # (count, seconds) by phase, in the order they were first entered
+        self._profiler: cProfile.Profile | None = None
+        self._workers: str | None = None
+        self._snapshot: tuple[str, int, tracemalloc.Snapshot] | None = None  # (phase, traced size, snapshot)
+
+    def __enter__(self) -> "UciProfiler":
+        global _active  # noqa: PLW0603
+        if self.profile:
+            import cProfile  # noqa: PLC0415
+            import tempfile  # noqa: PLC0415
+
+            self._workers = tempfile.mkdtemp(prefix="uciparse-profile-")
+            os.environ[_WORKER_DIRECTORY] = self._workers
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        if self.trace_memory:
+            import tracemalloc  # noqa: PLC0415
+
+            tracemalloc.start()
+        _active = self
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        global _active  # noqa: PLW0603
+        _active = None
+        if self._profiler:
+            self._profiler.disable()
+        peak = None
+        if self.trace_memory:
+            import tracemalloc  # noqa: PLC0415
+
+            self.checkpoint("exit")
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        stream = self.stream or sys.stderr
+        self._report_phases(stream)
+        if self._profiler and self.profile:
+            processes = self._write_profile(self.profile)
+            stream.write(f"Profile of {processes} process{'es' if processes > 1 else ''} written to {self.profile}\n")
+        if peak is not None:
+            self._report_memory(stream, peak)
+
+    def record(self, name: str, seconds: float) -> None:
+        """Record the time spent in one run of a phase."""
+        count, total = self.phases.get(name, (0, 0.0))
+        self.phases[name] = (count + 1, total + seconds)
+
+    def checkpoint(self, name: str) -> None:
+        """Take a snapshot of the traced memory at the end of a phase, if more memory is in use than at any earlier snapshot."""
+        import tracemalloc  # noqa: PLC0415
+
+        if tracemalloc.is_tracing():
+            size = tracemalloc.get_traced_memory()[0]
+            if self._snapshot is None or size > self._snapshot[1]:
+                if self._profiler:
+                    self._profiler.disable()  # so the profile doesn't include taking the snapshot
+                self._snapshot = (name, size, tracemalloc.take_snapshot())
+                if self._profiler:
+                    self._profiler.enable()
+
+    def _write_profile(self, path: str) -> int:
+        """Merge the profiles of any worker processes into the profile of this one, write it, and return the process count."""
+        import pstats  # noqa: PLC0415
+        import shutil  # noqa: PLC0415
+
+        assert self._profiler is not None and self._workers is not None
+        del os.environ[_WORKER_DIRECTORY]
+        stats = pstats.Stats(self._profiler)
+        workers = sorted(os.listdir(self._workers))  # noqa: PTH208
+        for name in workers:
+            stats.add(os.path.join(self._workers, name))  # noqa: PTH118
+        stats.dump_stats(path)
+        shutil.rmtree(self._workers, ignore_errors=True)
+        return len(workers) + 1
+
+    def _report_phases(self, stream: "TextIO") -> None:
+        """Report the time spent in each phase."""
+        if self.phases:
+            stream.write(f"{'Phase':<16} {'Count':>7} {'Time':>10}\n")
+            stream.writelines(f"{name:<16} {count:>7} {seconds:>9.3f}s\n" for name, (count, seconds) in self.phases.items())
+
+    def _report_memory(self, stream: "TextIO", peak: int) -> None:
+        """Report the peak traced memory, and the lines of uci.py holding the most memory in the largest snapshot."""
+        import linecache  # noqa: PLC0415
+        import tracemalloc  # noqa: PLC0415
+
+        from uciparse import uci  # noqa: PLC0415
+
+        stream.write(f"Peak traced memory: {_size(peak)}\n")
+        if self._snapshot is None:
+            return
+        name, _, snapshot = self._snapshot
+        statistics = snapshot.filter_traces([tracemalloc.Filter(inclusive=True, filename_pattern=uci.__file__)]).statistics(
+            "lineno"
+        )
+        stream.write(f"Top {self.top} lines of uci.py by memory in use, at the end of {name}:\n")
+        for statistic in statistics[: self.top]:
+            frame = statistic.traceback[0]
+            source = linecache.getline(frame.filename, frame.lineno).strip()
+            stream.write(f"{_size(statistic.size):>12} {statistic.count:>9} blocks  uci.py:{frame.lineno}: {source}\n")
+
+
+def _size(size: int) -> str:
+    """Format a size in bytes."""
+    return f"{size / 1024:.1f} KiB" if size < 1024 * 1024 else f"{size / 1024 / 1024:.1f} MiB"
+
+
+@contextmanager
+def phase(name: str) -> "Iterator[None]":
+    """Time a phase of a command, and take a snapshot of the traced memory at the end, if a profiler is active."""
+    profiler = _active
+    if profiler is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profiler.record(name, time.perf_counter() - start)
+        profiler.checkpoint(name)
+
+
+def _write_worker_profile(profiler: "cProfile.Profile", directory: str) -> None:
+    """Write the profile of a worker process as it exits."""
+    profiler.disable()
+    profiler.dump_stats(os.path.join(directory, f"worker-{os.getpid()}.pstats"))  # noqa: PTH118
+
+
+def init_worker() -> None:
+    """Start profiling a worker process if the main process is profiling; called by the initializer of each process pool."""
+    directory = os.environ.get(_WORKER_DIRECTORY)
+    if directory:
+        import cProfile  # noqa: PLC0415
+        from multiprocessing.util import Finalize  # noqa: PLC0415
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        Finalize(None, _write_worker_profile, args=(profiler, directory), exitpriority=0)
@@ -0,0 +1,335 @@
+# vim: set ft=python ts=4 sw=4 expandtab:
+
+"""
+Validate the values in UCI files against a schema.
+
+The parser only checks syntax, so a value like ``option enabled 'ture'`` or a
+malformed ``ipaddr`` is accepted, and only fails once it reaches a device.  A
+schema describes the options expected in each type of section in each package,
+and ``UciSchema.validate()`` reports every value that doesn't match.
+
+A schema is a JSON object keyed by package name, then by section type, then by
+option name, like this:
+
+.. code-block:: json
+
+    {
+        "network": {
+            "interface": {
+                "proto": {
+                    "type": "enum",
+                    "values": ["static", "dhcp", "none"],
+                    "required": true
+                },
+                "ipaddr": {"type": "ipv4"},
+                "mtu": {"type": "int", "min": 68, "max": 9000},
+                "dns": {"type": "ipaddr", "list": true, "max_items": 3},
+                "macaddr": {"type": "mac"}
+            }
+        }
+    }
+
+The ``type`` of an option is one of:
+
+    - **string:** any value, or any value matching ``pattern`` (a regular expression)
+    - **bool:** one of the boolean values that uci accepts, like ``1``, ``0``, ``on`` or ``disabled``
+    - **int:** a decimal integer, optionally between ``min`` and ``max`` (inclusive)
+    - **enum:** one of the strings in ``values``
+    - **ipv4**, **ipv6** or **ipaddr:** an IPv4 address, an IPv6 address, or either
+    - **cidr:** an IPv4 or IPv6 address with a prefix length, like ``192.168.1.0/24``
+    - **mac:** a MAC address, like ``00:11:22:aa:bb:cc``
+
+An option may also set ``required`` (the option must be present), ``list``
+(true if the option must be a list, false if it must not be), and
+``min_items`` and ``max_items`` (the number of values in a list, where an
+option counts as one value).  Every value in a list is checked against the
+type.  Options, section types and packages that aren't in the schema are not
+checked.
+
+The schema is compiled once, when it is loaded, into a table of validator
+functions for each section type, so checking a value takes a dict lookup and a
+function call (usually a set lookup or a precompiled regular expression).
+Validation walks the lines of the file directly, rather than building
+sections, so checking a file costs much less than parsing it.
+
+Each problem is reported as a ``UciViolation``, located by section key and
+option name, as for UciSection.
+"""
+
+import re
+from collections.abc import Callable
+from typing import Any, NamedTuple
+
+from uciparse.uci import UciConfigLine, UciFile, UciListLine, UciOptionLine, UciPackageLine
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from os import PathLike
+
+# The boolean values accepted by uci
+_BOOLEANS = frozenset(["0", "1", "no", "yes", "off", "on", "false", "true", "disabled", "enabled"])
+
+_INT_REGEX = re.compile(r"[-+]?[0-9]+")
+_IPV4_REGEX = re.compile(r"(?:(?:25[0-5]|2[0-4][0-9]|1[0-9][0-9]|[1-9]?[0-9])\.){3}(?:25[0-5]|2[0-4][0-9]|1[0-9][0-9]|[1-9]?[0-9])")
+_MAC_REGEX = re.compile(r"[0-9A-Fa-f]{2}(?:[:-][0-9A-Fa-f]{2}){5}")
+
+# The properties allowed in the schema for an option, other than those specific to its type
+_PROPERTIES = frozenset(["type", "required", "list", "min_items", "max_items"])
+
+
+class UciViolation(NamedTuple):
+    """A value in a UCI file that doesn't match the schema."""
+
+    section: str
+    option: str | None
+    message: str
+
+    def __str__(self) -> str:
+        return f"{self.location}: {self.message}"
+
+    @property
+    def location(self) -> str:
+        """The location of the violation, as section or section.option."""
+        return f"{self.section}.{self.option}" if self.option else self.section
+
+
+def _is_ipv6(value: str) -> bool:
+    """Whether a value is an IPv6 address."""
+    import ipaddress  # noqa: PLC0415  # only needed for IPv6, which is checked less often
+
+    if ":" not in value:
+        return False
+    try:
+        ipaddress.IPv6Address(value)
+    except ValueError:
+        return False
+    return True
+
+
+def _is_cidr(value: str) -> bool:
+    """Whether a value is an IPv4 or IPv6 address with a prefix length."""
+    address, _, prefix = value.partition("/")
+    if not prefix.isdigit() or (prefix[0] == "0" and prefix != "0"):
+        return False
+    if _IPV4_REGEX.fullmatch(address):
+        return int(prefix) <= 32
+    return _is_ipv6(address) and int(prefix) <= 128
+
+
+def _int_check(minimum: int | None, maximum: int | None) -> Callable[[str], bool]:
+    """Build a check for an integer within a range."""
+
+    def check(value: str) -> bool:
+        if not _INT_REGEX.fullmatch(value):
+            return False
+        number = int(value)
+        return (minimum is None or number >= minimum) and (maximum is None or number <= maximum)
+
+    return check
+
+
+def _int_description(minimum: int | None, maximum: int | None) -> str:
+    """Describe an integer within a range."""
+    if minimum is not None and maximum is not None:
+        return f"an integer from {minimum} to {maximum}"
+    if minimum is not None:
+        return f"an integer of at least {minimum}"
+    if maximum is not None:
+        return f"an integer of at most {maximum}"
+    return "an integer"
+
+
+class _OptionSchema:
+    """An option in the schema, compiled into a check for each value."""
+
+    __slots__ = ("check", "expected", "is_list", "max_items", "min_items")
+
+    def __init__(self, location: str, spec: object) -> None:
+        if not isinstance(spec, dict):
+            raise ValueError(f"Invalid schema for {location}: expected an object")  # noqa: TRY004
+        kind = spec.get("type", "string")
+        compile_type = _TYPES.get(kind) if isinstance(kind, str) else None
+        if compile_type is None:
+            raise ValueError(f"Invalid schema for {location}: unknown type {kind!r}")
+        try:
+            self.check, self.expected, allowed = compile_type(spec)
+        except (TypeError, ValueError, re.error) as e:
+            raise ValueError(f"Invalid schema for {location}: {e}") from e
+        unknown = sorted(set(spec) - _PROPERTIES - allowed)
+        if unknown:
+            raise ValueError(f"Invalid schema for {location}: unknown property {unknown[0]!r}")
+        self.is_list: bool | None = spec.get("list")
+        self.min_items: int | None = spec.get("min_items")
+        self.max_items: int | None = spec.get("max_items")
+        if self.is_list is not None and not isinstance(self.is_list, bool):
+            raise ValueError(f"Invalid schema for {location}: list must be true or false")
+        for count in (self.min_items, self.max_items):
+            if count is not None and (not isinstance(count, int) or isinstance(count, bool)):
+                raise ValueError(f"Invalid schema for {location}: min_items and max_items must be integers")
+
+    def validate(self, key: str, name: str, values: list[str], is_list: bool) -> list[UciViolation]:  # noqa: FBT001
+        """Validate the values of an option, which is a list if is_list is set."""
+        violations = [
+            UciViolation(key, name, f"invalid value {value!r}, expected {self.expected}")
+            for value in values
+            if not self.check(value)
+        ]
+        if self.is_list is not None and is_list != self.is_list:
+            violations.append(UciViolation(key, name, "expected a list" if self.is_list else "expected an option, not a list"))
+        if self.min_items is not None and len(values) < self.min_items:
+            violations.append(UciViolation(key, name, f"has {len(values)} values, expected at least {self.min_items}"))
+        if self.max_items is not None and len(values) > self.max_items:
+            violations.append(UciViolation(key, name, f"has {len(values)} values, expected at most {self.max_items}"))
+        return violations
+
+
+def _compile_string(spec: dict[str, Any]) -> tuple[Callable[[str], bool], str, frozenset[str]]:
+    pattern = spec.get("pattern")
+    if pattern is None:
+        return (lambda _: True), "a string", frozenset(["pattern"])
+    if not isinstance(pattern, str):
+        raise ValueError("pattern must be a string")  # noqa: TRY004
+    regex = re.compile(pattern)
+    return (lambda value: bool(regex.fullmatch(value))), f"a value matching {pattern!r}", frozenset(["pattern"])
+
+
+def _compile_bool(_spec: dict[str, Any]) -> tuple[Callable[[str], bool], str, frozenset[str]]:
+    return _BOOLEANS.__contains__, "a boolean", frozenset()
+
+
+def _compile_int(spec: dict[str, Any]) -> tuple[Callable[[str], bool], str, frozenset[str]]:
+    minimum, maximum = spec.get("min"), spec.get("max")
+    for bound in (minimum, maximum):
+        if bound is not None and (not isinstance(bound, int) or isinstance(bound, bool)):
+            raise ValueError("min and max must be integers")
+    return _int_check(minimum, maximum), _int_description(minimum, maximum), frozenset(["min", "max"])
+
+
+def _compile_enum(spec: dict[str, Any]) -> tuple[Callable[[str], bool], str, frozenset[str]]:
+    values = spec.get("values")
+    if not isinstance(values, list) or not values or not all(isinstance(value, str) for value in values):
+        raise ValueError("values must be a list of strings")
+    return frozenset(values).__contains__, "one of " + ", ".join(repr(value) for value in values), frozenset(["values"])
+
+
+def _compile_ipv4(_spec: dict[str, Any]) -> tuple[Callable[[str], bool], str, frozenset[str]]:
+    return (lambda value: bool(_IPV4_REGEX.fullmatch(value))), "an IPv4 address", frozenset()
+
+
+def _compile_ipv6(_spec: dict[str, Any]) -> tuple[Callable[[str], bool], str, frozenset[str]]:
+    return _is_ipv6, "an IPv6 address", frozenset()
+
+
+def _compile_ipaddr(_spec: dict[str, Any]) -> tuple[Callable[[str], bool], str, frozenset[str]]:
+    return (lambda value: bool(_IPV4_REGEX.fullmatch(value)) or _is_ipv6(value)), "an IP address", frozenset()
+
+
+def _compile_cidr(_spec: dict[str, Any]) -> tuple[Callable[[str], bool], str, frozenset[str]]:
+    return _is_cidr, "an address with a prefix length", frozenset()
+
+
+def _compile_mac(_spec: dict[str, Any]) -> tuple[Callable[[str], bool], str, frozenset[str]]:
+    return (lambda value: bool(_MAC_REGEX.fullmatch(value))), "a MAC address", frozenset()
+
+
+# Compiles the schema for each type of option into a check, a description of the expected value, and its extra properties
+_TYPES: dict[str, Callable[[dict[str, Any]], tuple[Callable[[str], bool], str, frozenset[str]]]] = {
+    "string": _compile_string,
+    "bool": _compile_bool,
+    "int": _compile_int,
+    "enum": _compile_enum,
+    "ipv4": _compile_ipv4,
+    "ipv6": _compile_ipv6,
+    "ipaddr": _compile_ipaddr,
+    "cidr": _compile_cidr,
+    "mac": _compile_mac,
+}
+
+
+class _SectionSchema:
+    """A section type in the schema, compiled into a validator for each option."""
+
+    __slots__ = ("options", "required")
+
+    def __init__(self, location: str, spec: object) -> None:
+        if not isinstance(spec, dict):
+            raise ValueError(f"Invalid schema for {location}: expected an object")  # noqa: TRY004
+        self.options = {name: _OptionSchema(f"{location}.{name}", option) for name, option in spec.items()}
+        self.required = [name for name, option in spec.items() if option.get("required")]
+
+    def validate(self, key: str, values: dict[str, list[str]], lists: set[str]) -> list[UciViolation]:
+        """Validate the options in a section, given the values of each option and the names of the lists."""
+        violations = [UciViolation(key, name, "missing required option") for name in self.required if name not in values]
+        options = self.options
+        for name, items in values.items():
+            option = options.get(name)
+            if option is not None:
+                violations.extend(option.validate(key, name, items, name in lists))
+        return violations
+
+
+class UciSchema:
+    """A schema for the values in UCI files, compiled once into validators for each section type; see uciparse.schema."""
+
+    def __init__(self, schema: object) -> None:
+        if not isinstance(schema, dict):
+            raise ValueError("Invalid schema: expected an object")  # noqa: TRY004
+        self._packages: dict[str, dict[str, _SectionSchema]] = {}
+        for package, types in schema.items():
+            if not isinstance(types, dict):
+                raise ValueError(f"Invalid schema for {package}: expected an object")  # noqa: TRY004
+            self._packages[package] = {
+                section_type: _SectionSchema(f"{package}.{section_type}", spec) for section_type, spec in types.items()
+            }
+
+    @staticmethod
+    def from_file(path: "str | PathLike[str]") -> "UciSchema":
+        """Load a schema from a JSON file, raising ValueError if it is not valid."""
+        import json  # noqa: PLC0415
+
+        with open(path, encoding="utf-8") as fp:  # noqa: PTH123
+            try:
+                return UciSchema(json.load(fp))
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Invalid schema: {e}") from e
+
+    def validate(self, file: UciFile, package: str | None = None) -> list[UciViolation]:
+        """
+        Validate a file against the schema, returning the violations in file order.
+
+        The package is taken from the package line in the file, or from
+        ``package`` (usually the file name) if there is no package line.
+        """
+        types: dict[str, _SectionSchema] | None = None
+        violations: list[UciViolation] = []
+        counts: dict[str, int] = {}
+        section: _SectionSchema | None = None
+        key = ""
+        values: dict[str, list[str]] = {}
+        lists: set[str] = set()
+        for line in file.lines:
+            if isinstance(line, UciOptionLine):
+                if section is not None:
+                    values[line.name] = [line.value]
+                    lists.discard(line.name)
+            elif isinstance(line, UciListLine):
+                if section is not None:
+                    if line.name in lists:
+                        values[line.name].append(line.value)
+                    else:
+                        values[line.name] = [line.value]
+                        lists.add(line.name)
+            elif isinstance(line, UciConfigLine):
+                if section is not None:
+                    violations.extend(section.validate(key, values, lists))
+                if types is None:
+                    types = self._packages.get(package or "", {})
+                index = counts.get(line.section, 0)
+                counts[line.section] = index + 1
+                key, values, lists = line.name or f"@{line.section}[{index}]", {}, set()
+                section = types.get(line.section)
+            elif isinstance(line, UciPackageLine):
+                package = line.name
+        if section is not None:
+            violations.extend(section.validate(key, values, lists))
+        return violations
@@ -0,0 +1,261 @@
+# vim: set ft=python ts=4 sw=4 expandtab:
+
+"""
+Serve normalization and diff requests over a local Unix socket.
+
+Starting a Python process for every file is expensive when the tools are run
+from hooks, so ``uciparse --serve SOCKET`` runs a long-lived server instead,
+and ``uciparse --connect SOCKET`` and ``ucidiff --connect SOCKET`` send their
+work to it.  The server keeps everything it has already loaded warm, including
+a cache of parsed files on disk, which is invalidated whenever a file changes.
+Each client connection is handled in its own thread, so concurrent clients
+don't wait on each other.
+
+Protocol
+========
+
+The protocol is JSON lines: the client sends one JSON object per line, and the
+server answers each request with one JSON object per line, in order.  A
+connection may be used for any number of requests.  A request looks like this:
+
+.. code-block:: json
+
+    {"command": "normalize", "path": "/etc/config/network", "source": "uci"}
+
+A file is given either as an absolute ``path`` that the server reads itself, or
+as the ``text`` of the file.  The optional ``source`` is the input format, as
+for ``uciparse --from``.  The supported commands are:
+
+``ping``
+    Returns an empty output, to check that the server is alive.
+``normalize``
+    Returns the normalized file.
+``diff``
+    Takes two files ``a`` and ``b`` (each an object with ``path`` or ``text``)
+    and optional ``fromfile`` and ``tofile`` labels, and returns the unified
+    diff between the normalized files, like ``ucidiff``.
+
+A successful response looks like ``{"output": "..."}``, and a failed one looks
+like ``{"error": "..."}``.
+"""
+
+import json
+import os
+import signal
+import socket
+import socketserver
+import stat
+import threading
+from collections import OrderedDict
+from contextlib import suppress
+from types import TracebackType
+from typing import TYPE_CHECKING, Any
+
+from uciparse.convert import from_json, from_show
+from uciparse.diff import unified_diff
+from uciparse.uci import UciFile, UciParseError
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+# Maximum number of parsed files kept by the server's cache
+CACHE_SIZE = 256
+
+# Input formats that may be named in a request
+SOURCES = ["uci", "show", "json"]
+
+
+def _parse(source: str, text: str) -> list[UciFile]:
+    """Parse the text of a file in the indicated source format."""
+    if source == "show":
+        return list(from_show(text.splitlines(keepends=True)))
+    if source == "json":
+        return [from_json(text)]
+    return [UciFile.from_text(text)]
+
+
+class UciCache:
+    """Least-recently-used cache of parsed files on disk, invalidated when a file changes."""
+
+    def __init__(self, size: int = CACHE_SIZE) -> None:
+        self.size = size
+        self._entries: OrderedDict[tuple[str, str], tuple[tuple[int, int, int], list[UciFile]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def load(self, path: str, source: str = "uci") -> list[UciFile]:
+        """Load and parse a file, using the cached result if the file has not changed since it was parsed."""
+        key = (path, source)
+        # The file is identified by its inode, size and modification time, checked before reading it
+        info = os.stat(path)  # noqa: PTH116
+        signature = (info.st_ino, info.st_size, info.st_mtime_ns)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] == signature:
+                self._entries.move_to_end(key)
+                return entry[1]
+        with open(path, encoding=None) as fp:  # noqa: FURB101,PTH123  # use platform-specific encoding
+            files = _parse(source, fp.read())
+        with self._lock:
+            self._entries[key] = (signature, files)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        return files
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """Handle the requests sent over a single client connection."""
+
+    server: "UciServer"
+
+    def handle(self) -> None:
+        for line in self.rfile:
+            response = self.server.dispatch(line)
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+            self.wfile.flush()
+
+
+class UciServer(socketserver.ThreadingUnixStreamServer):
+    """Server that normalizes and diffs UCI files on behalf of clients connected to a Unix socket."""
+
+    daemon_threads = True
+    request_queue_size = 128  # the default of 5 makes connect() fail with EAGAIN when many clients connect at once
+
+    def __init__(self, path: str, cache_size: int = CACHE_SIZE) -> None:
+        self.path = path
+        self.cache = UciCache(size=cache_size)
+        self._commands: dict[str, Callable[[dict[str, Any]], str]] = {
+            "ping": lambda _request: "",
+            "normalize": self._normalize,
+            "diff": self._diff,
+        }
+        _remove_stale(path)
+        super().__init__(path, _Handler)
+
+    def server_close(self) -> None:
+        super().server_close()
+        with suppress(FileNotFoundError):
+            os.unlink(self.path)  # noqa: PTH108
+
+    def dispatch(self, line: bytes) -> dict[str, str]:
+        """Dispatch a single request line, returning the response."""
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise TypeError("expected an object")  # noqa: TRY301
+            command = self._commands.get(request.get("command"))  # type: ignore[arg-type]
+            if not command:
+                return {"error": f"Invalid request: unknown command {request.get('command')!r}"}
+            return {"output": command(request)}
+        except UciParseError as e:
+            return {"error": e.message}
+        except (ValueError, TypeError) as e:
+            return {"error": f"Invalid request: {e}"}
+        except OSError as e:
+            return {"error": f"Error reading {e.filename}: {e.strerror}"}
+
+    def _files(self, request: dict[str, Any]) -> list[UciFile]:
+        """Get the parsed files named by a request, by path or by text."""
+        source = request.get("source", "uci")
+        if source not in SOURCES:
+            raise ValueError(f"unknown source {source!r}")
+        if isinstance(request.get("path"), str):
+            if not os.path.isabs(request["path"]):  # noqa: PTH117
+                raise ValueError("path must be absolute")
+            return self.cache.load(request["path"], source)
+        if isinstance(request.get("text"), str):
+            return _parse(source, request["text"])
+        raise ValueError("expected a path or text")
+
+    def _lines(self, request: dict[str, Any]) -> list[str]:
+        """Get the normalized lines of the files named by a request."""
+        return [line for uci in self._files(request) for line in uci.normalized()]
+
+    def _normalize(self, request: dict[str, Any]) -> str:
+        return "".join(self._lines(request))
+
+    def _diff(self, request: dict[str, Any]) -> str:
+        a, b = request.get("a"), request.get("b")
+        if not isinstance(a, dict) or not isinstance(b, dict):
+            raise TypeError("expected files a and b")
+        fromfile = str(request.get("fromfile", a.get("path", "a")))
+        tofile = str(request.get("tofile", b.get("path", "b")))
+        return "".join(unified_diff(a=self._lines(a), b=self._lines(b), fromfile=fromfile, tofile=tofile))
+
+
+def _remove_stale(path: str) -> None:
+    """Remove a socket left behind by a server that is no longer running, raising OSError if one is running."""
+    try:
+        if not stat.S_ISSOCK(os.stat(path).st_mode):  # noqa: PTH116
+            return  # let bind() fail rather than removing something that isn't a socket
+    except FileNotFoundError:
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(path)
+        except ConnectionRefusedError:
+            os.unlink(path)  # noqa: PTH108
+            return
+    raise OSError(f"Server is already running on {path}")
+
+
+def serve(path: str, cache_size: int = CACHE_SIZE) -> None:
+    """Run a server on a Unix socket until interrupted or terminated, removing the socket on exit."""
+    signal.signal(signal.SIGTERM, signal.default_int_handler)  # treat SIGTERM like an interrupt, so we clean up
+    with UciServer(path, cache_size=cache_size) as server:
+        with suppress(KeyboardInterrupt):
+            server.serve_forever()
+
+
+class UciClient:
+    """Client for a server running on a Unix socket."""
+
+    def __init__(self, path: str, timeout: float | None = None) -> None:
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.settimeout(timeout)
+        try:
+            self._socket.connect(path)
+        except OSError:
+            self._socket.close()
+            raise
+        self._reader = self._socket.makefile("rb")
+
+    def __enter__(self) -> "UciClient":
+        return self
+
+    def __exit__(
+        self, exc_type: type[BaseException] | None, exc_value: BaseException | None, traceback: TracebackType | None
+    ) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Close the connection to the server."""
+        self._reader.close()
+        self._socket.close()
+
+    def request(self, **request: Any) -> str:
+        """Send a request to the server, returning its output or raising UciParseError if the request failed."""
+        self._socket.sendall(json.dumps(request).encode() + b"\n")
+        line = self._reader.readline()
+        if not line:
+            raise ConnectionError("Server closed the connection")
+        response = json.loads(line)
+        if "error" in response:
+            raise UciParseError(response["error"])
+        return str(response["output"])
+
+    def normalize(self, path: str | None = None, text: str | None = None, source: str = "uci") -> str:
+        """Normalize a file, given either its path or its text."""
+        return self.request(command="normalize", **_file(path, text), source=source)
+
+    def diff(self, a: str, b: str) -> str:
+        """Diff two files on disk, like ucidiff."""
+        return self.request(command="diff", a=_file(a, None), b=_file(b, None), fromfile=a, tofile=b)
+
+
+def _file(path: str | None, text: str | None) -> dict[str, str]:
+    """Build the part of a request that identifies a file, making a path absolute since the server may run elsewhere."""
+    return {"path": os.path.abspath(path)} if path is not None else {"text": text or ""}  # noqa: PTH100
@@ -0,0 +1,184 @@
+# vim: set ft=python ts=4 sw=4 expandtab:
+
+"""
+Hold the configuration of a fleet of devices in a compact columnar table.
+
+Analytics over thousands of devices don't need the parsed line objects, only
+the values in them, and a ``UciFile`` costs a few hundred bytes per line.  A
+``UciTable`` instead stores one row for each config, option and list line of
+every file, in seven parallel columns:
+
+    - **device:** the name of the device the file came from
+    - **package:** the package name from the package line, or empty
+    - **type:** the section type
+    - **section:** the section key, as for UciSection (a name, or ``@type[index]``)
+    - **option:** the option or list name, or empty for a config line
+    - **value:** the option or list value, or empty for a config line
+    - **kind:** the kind of line, ``config``, ``option`` or ``list``
+
+Every string is interned in a pool shared by the whole table, and each column
+is a stdlib ``array`` of 32-bit string ids, so a row costs 28 bytes no matter
+how long its strings are, and each distinct string is stored once.  Comments
+and formatting are not kept.
+
+Filtering and grouping work on the ids rather than on strings.  A filter
+looks up the ids of the requested values once and then builds a mask over each
+column with ``map()``, so the per-row work happens in C rather than in a Python
+loop.  A filtered table shares the string pool with the table it came from.
+
+The columns support the buffer protocol, so when NumPy is available they can be
+used without copying, via ``numpy.frombuffer(table.column("value"), dtype=numpy.uint32)``.
+NumPy is not required.
+"""
+
+import operator
+from array import array
+from collections import Counter
+from collections.abc import Iterable, Sequence
+from itertools import compress
+
+from uciparse.uci import UciConfigLine, UciFile, UciListLine, UciOptionLine, UciPackageLine
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import TextIO
+
+COLUMNS = ("device", "package", "type", "section", "option", "value", "kind")
+
+_TYPECODE = "I"  # unsigned 32-bit string ids
+
+
+class UciTable:
+    """A columnar table of the config, option and list lines in many files, with strings interned as ids."""
+
+    def __init__(self) -> None:
+        self._strings: list[str] = [""]  # id 0 is always the empty string
+        self._ids: dict[str, int] = {"": 0}
+        self._columns: dict[str, array[int]] = {name: array(_TYPECODE) for name in COLUMNS}
+
+    def __len__(self) -> int:
+        return len(self._columns["kind"])
+
+    @property
+    def nbytes(self) -> int:
+        """The approximate number of bytes used by the columns and the string pool."""
+        import sys  # noqa: PLC0415
+
+        columns = sum(column.itemsize * len(column) for column in self._columns.values())
+        pool = sys.getsizeof(self._strings) + sys.getsizeof(self._ids) + sum(map(sys.getsizeof, self._strings))
+        return columns + pool
+
+    def intern(self, string: str) -> int:
+        """Return the id of a string, adding it to the string pool if necessary."""
+        identifier = self._ids.get(string)
+        if identifier is None:
+            identifier = self._ids[string] = len(self._strings)
+            self._strings.append(string)
+        return identifier
+
+    def string(self, identifier: int) -> str:
+        """Return the string for an id."""
+        return self._strings[identifier]
+
+    def column(self, name: str) -> "array[int]":
+        """Return a column of string ids, which must not be modified."""
+        return self._columns[name]
+
+    def values(self, name: str) -> list[str]:
+        """Return a column as strings."""
+        return list(map(self._strings.__getitem__, self._columns[name]))
+
+    def rows(self) -> Iterable[tuple[str, ...]]:
+        """Generate each row as a tuple of strings, in the order of COLUMNS."""
+        strings = self._strings.__getitem__
+        columns = [map(strings, self._columns[name]) for name in COLUMNS]
+        return zip(*columns, strict=True)
+
+    def add(self, device: str, file: UciFile) -> None:
+        """Add the config, option and list lines of a file to the table."""
+        intern = self.intern
+        device_id, package_id, type_id, section_id = intern(device), 0, 0, 0
+        config_id, option_id, list_id = intern("config"), intern("option"), intern("list")
+        appends = [self._columns[name].append for name in COLUMNS]
+        counts: dict[str, int] = {}
+        for line in file.lines:
+            if isinstance(line, UciOptionLine):
+                row = (device_id, package_id, type_id, section_id, intern(line.name), intern(line.value), option_id)
+            elif isinstance(line, UciListLine):
+                row = (device_id, package_id, type_id, section_id, intern(line.name), intern(line.value), list_id)
+            elif isinstance(line, UciConfigLine):
+                index = counts.get(line.section, 0)
+                counts[line.section] = index + 1
+                type_id, section_id = intern(line.section), intern(line.name or f"@{line.section}[{index}]")
+                row = (device_id, package_id, type_id, section_id, 0, 0, config_id)
+            elif isinstance(line, UciPackageLine):
+                package_id = intern(line.name)
+                continue
+            else:
+                continue
+            for append, value in zip(appends, row, strict=True):
+                append(value)
+
+    @staticmethod
+    def from_files(paths: Iterable[str]) -> "UciTable":
+        """Build a table from a set of files on disk, using each path as the device name."""
+        table = UciTable()
+        for path in paths:
+            table.add(path, UciFile.from_file(path))
+        return table
+
+    def _mask(self, name: str, value: str | Iterable[str]) -> bytes:
+        """Build a mask of the rows where a column matches a value, or any of a set of values."""
+        column = self._columns[name]
+        if isinstance(value, str):
+            identifier = self._ids.get(value)
+            return bytes(len(column)) if identifier is None else bytes(map(identifier.__eq__, column))
+        identifiers = frozenset(self._ids[item] for item in value if item in self._ids)
+        return bytes(map(identifiers.__contains__, column))
+
+    def filter(self, **criteria: str | Iterable[str]) -> "UciTable":
+        """
+        Return the rows that match all of the criteria, as a new table sharing this table's string pool.
+
+        Each criterion is a column name with a value, or with a collection of
+        values of which any may match, like ``filter(type="rule", option=["src", "dest"])``.
+        """
+        for name in criteria:
+            if name not in self._columns:
+                raise ValueError(f"Unknown column: {name}")
+        mask: Sequence[int] | None = None
+        for name, value in criteria.items():
+            current = self._mask(name, value)
+            mask = current if mask is None else bytes(map(operator.and_, mask, current))
+        result = UciTable()
+        result._strings, result._ids = self._strings, self._ids
+        for name, column in self._columns.items():
+            result._columns[name] = column[:] if mask is None else array(_TYPECODE, compress(column, mask))
+        return result
+
+    def group_by(self, *names: str, distinct: str | None = None) -> Counter[tuple[str, ...]]:
+        """
+        Count the rows in each group of distinct values of the named columns.
+
+        With ``distinct``, count the distinct values of that column in each group
+        instead of the rows, like ``group_by("option", "value", distinct="device")``
+        to count the devices that use each value of each option.
+        """
+        for name in (*names, distinct) if distinct else names:
+            if name not in self._columns:
+                raise ValueError(f"Unknown column: {name}")
+        keys: Iterable[tuple[int, ...]] = zip(*(self._columns[name] for name in names), strict=True)
+        if distinct:
+            pairs = dict.fromkeys(zip(keys, self._columns[distinct], strict=True))  # unique, in order
+            keys = (key for key, _ in pairs)
+        counts = Counter(keys)
+        strings = self._strings
+        return Counter({tuple(strings[identifier] for identifier in key): count for key, count in counts.items()})
+
+    def to_csv(self, fp: "TextIO") -> None:
+        """Write the table as CSV, with a header row of column names."""
+        import csv  # noqa: PLC0415
+
+        writer = csv.writer(fp, lineterminator="\n")
+        writer.writerow(COLUMNS)
+        writer.writerows(self.rows())
@@ -24,6 +24,86 @@
 character when we found the comment.
 
 
+Lossless Round Trips
+====================
+
+Normalizing rewrites every line in a file, which isn't what you want when
+programmatically editing a single option in a hand-maintained file.  For that
+case, a file can be parsed in lossless mode.  In lossless mode, the UciFile
+retains the original text, and each line records its span within that text
+(including any blank lines that precede it) along with a snapshot of its
+fields.  The spans are just offsets, so no text is copied.
+
+When a lossless file is serialized, a line whose fields still match the
+snapshot is emitted byte-for-byte straight from the original text.  A line
+that has been edited is reserialized in normalized form, but keeps its original
+indentation and any preceding blank lines.  A line that was added is emitted in
+normalized form, and a line that was removed simply disappears along with the
+blank lines that preceded it.
+
+Parallel Parsing
+================
+
+Each line is parsed independently of every other line, so a very large file
+can be parsed in parallel.  When a number of jobs is requested, the text is
+split into chunks at line boundaries, the chunks are parsed in a process pool,
+and the resulting lines are reassembled in order.  If a chunk can't be parsed,
+that chunk is parsed again in the main process, with the correct line offset,
+so the error identifies the same line as a sequential parse would.
+
+The parsed lines have to be transferred back to the main process, which is not
+free, so files smaller than about a megabyte are always parsed sequentially.
+Garbage collection is disabled while the lines are rebuilt, since the many new
+objects would otherwise trigger repeated collections.  Parallel parsing is not
+supported in lossless mode.
+
+Lazy Parsing
+============
+
+Many tools only need the structure of a file, like counting firewall rules or
+listing interfaces, which only takes the section types and names.  In lazy
+mode, each line is still classified as it is read, and package, config and
+comment lines are parsed as usual, but an option or list line only records its
+line number and the rest of the line.  Its name, value and comment are parsed,
+and the line is validated, the first time any of them is accessed.  An invalid
+option or list line therefore raises UciParseError only when it is used.  Call
+UciFile.validate() to parse every deferred line up front, which gives the same
+result as parsing the file in the usual way.  Lazy parsing is not supported in
+lossless mode.
+
+Interning
+=========
+
+Across a fleet of files, the same names and values (``interface``, ``proto``,
+``lan``, ``1``) turn up over and over, and each parse creates a new string for
+every one of them.  A ``UciInterner`` is a pool of strings that can be shared by
+any number of parses, like ``UciFile.from_file(path, interner=pool)``.  Each
+package name, section type and name, and option or list name and value is
+replaced by the copy already in the pool, so each distinct string is stored only
+once no matter how many files contain it.  Values longer than a limit are left
+alone, since long values like keys and certificates are rarely repeated.  The
+pool counts its lookups and hits, and estimates the bytes saved.  Comments are
+never interned.  A parallel parse interns the lines once they are back in the
+main process, and a lazy line interns its fields when they are parsed.
+
+Canonical Form
+==============
+
+Normalizing keeps the order of the original file, so two files that differ
+only in the order of their sections or options still produce different output.
+In canonical form, ``normalized(canonical=True)``, sections are ordered by type,
+named sections of a type are ordered by name ahead of the anonymous sections of
+that type, and options and lists within a section are ordered by name.  The
+order of anonymous sections of a type is kept, since it determines their keys
+and is significant to tools like the firewall, and so is the order of values
+within a list.  Sections with the same name, which UCI merges, stay in their
+original order.  A standalone comment moves along with the option or list that
+follows it; the lines before the first config line are never reordered.
+
+The lines are grouped in a single pass over the file, so only the sections and
+the options within each section are sorted, never the whole list of lines.
+
+
 Parser Design
 =============
 
@@ -39,14 +119,12 @@
 Any line that does not match one of these regular expressions is an invalid
 line per the specification.
 
-We can simplify these regular expressions into a single check:
-
-   ``(^\s*$)|((^\s*)(#)(.*$))|((^\s*)(package|config|option|list)(\s+)(.*?)(\s*$))``
-
-With this regular expression, if group #4 is `#`, then we have a comment,
-with the comment text in group #5 and leading whitespace in group #3.  Otherwise,
-group #8 gives us the type of the line (``package``, ``config``, ``option``
-or ``list``) and group #10 gives us the remainder of the line after the type.
+We don't actually use these regular expressions to classify lines.  The lazy
+``(.*?)`` followed by ``(\s*$)`` has to retry the trailing whitespace check at
+every position, which takes quadratic time on a line with a long run of
+whitespace in the middle.  Instead, we strip the leading whitespace, look at
+the first character or keyword, and strip the remainder of the line, which
+gives exactly the same result with a few linear string operations.
 
 Next, we need to parse the data on each line according to the individual rules
 for the type of line.  The UCI restrictions on identifiers are enforced,
@@ -59,16 +137,17 @@
 
 We do not validate boolean values.  The spec supports a specific list, but you
 can't really identify from looking at the file whether an option is supposed to
-be a boolean or just a string.
+be a boolean or just a string.  To check the types of values, describe them in
+a schema; see uciparse.schema.
 
-Regardless, if the first regular expression matches a line, and the second
-regular expression does not, then the line isn't valid and we can't process it.
-If we can't process any line, we'll bomb out and refuse to process the file
-at all.
+Regardless, if we recognize the type of a line, and the regular expression for
+that type of line does not match the remainder, then the line isn't valid and
+we can't process it.  If we can't process any line, we'll bomb out and refuse
+to process the file at all.
 
 For a package line, we can use this regular expression:
 
-``(^)((([\"'])([a-zA-Z0-9_-]+)(?:\4))|([a-zA-Z0-9_-]+))((\s*)(#.*))?($)``
+``(^)((([\"'])([a-zA-Z0-9_-]++)(?:\4))|([a-zA-Z0-9_-]++))((\s*+)(#.*))?($)``
 
 If the field is quoted, this yields the package name in group #5.  If the field
 is not quoted, this yields the package name in group #6.  The comment, if it
@@ -76,7 +155,7 @@
 
 For a config line, we can use this regular expression:
 
-``(^)((([\"'])([a-zA-Z0-9_-]+)(?:\4))|([a-zA-Z0-9_-]+))((\s+)((([\"'])([a-zA-Z0-9_-]+)(?:\11))|([a-zA-Z0-9_-]+)))?((\s*)(#.*))?($)``
+``(^)((([\"'])([a-zA-Z0-9_-]++)(?:\4))|([a-zA-Z0-9_-]++))((\s++)((([\"'])([a-zA-Z0-9_-]++)(?:\11))|([a-zA-Z0-9_-]++)))?((\s*+)(#.*))?($)``
 
 If the first field is quoted, this yields the section type in group #5.  If the
 first field is not quoted, this yields the section type in group #6.  If the
@@ -88,7 +167,7 @@
 The list and option lines are slightly different, since the value is required
 and is not an identifier:
 
-``(^)((([\"'])([a-zA-Z0-9_-]+)(?:\4))|([a-zA-Z0-9_-]+))(\s+)((([\"'])([^\\\10]*)(?:\10))|([^'\"\s#]+))((\s*)(#.*))?($)``
+``(^)((([\"'])([a-zA-Z0-9_-]++)(?:\4))|([a-zA-Z0-9_-]++))(\s++)((([\"'])([^\\\10]*)(?:\10))|([^'\"\s#]++))((\s*+)(#.*))?($)``
 
 If first field is quoted, this yields the list or option name in group #5.  If
 the first field is not quoted, this yields the list or option name in group #6.
@@ -98,6 +177,20 @@
 expression is careful to allow only embedded quotes of a different type, as
 discussed above.
 
+Each of these regular expressions runs in linear time in the length of the
+line.  Identifiers, whitespace and unquoted values use possessive quantifiers,
+and each is followed by a character it can't match, so the regex engine never
+backtracks into them.  The only backtracking is in a quoted value, where the
+engine searches back from the end of the line for the closing quote.  Each
+candidate quote is tried once, and the check that follows it either fails at
+the first character that isn't whitespace or ``#``, or succeeds and ends the
+match, so the total work is still proportional to the length of the line.
+
+To put a bound on the work done for each line, and the memory used for it, the
+parser accepts a maximum line length.  Any line longer than this (not counting
+the line ending) is rejected before it is parsed.  Tools that read lines one
+at a time, rather than a whole file, parse each line with ``parse_line()``.
+
 
 UCI Syntax Specification
 ========================
@@ -170,81 +263,132 @@
 .. _UCI: https://openwrt.org/docs/guide-user/base-system/uci
 """
 
+import gc
+import os
 import re
-import typing
+import sys
 from abc import ABC, abstractmethod
-from collections.abc import Sequence
-from pathlib import Path
-from typing import TextIO
+
+# Imports that are only needed for type checking are deferred, to keep startup fast for the command line tools
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator, Sequence
+    from os import PathLike
+    from typing import TextIO
+
+    from uciparse.derived import UciDerivedFile
+    from uciparse.mapped import UciMappedFile
+    from uciparse.merge import UciMergeResult
 
 # Standard indent of 4 spaces
 _INDENT = "    "
 
-# Matches any known type of line
-_LINE_REGEX = re.compile(r"(^\s*$)|((^\s*)(#)(.*$))|((^\s*)(package|config|option|list)(\s+)(.*?)(\s*$))")
+# Minimum size of text (in characters) that is worth parsing in parallel
+_PARALLEL_MINIMUM = 1 << 20
 
-# Matches the remainder of a package line
-_PACKAGE_REGEX = re.compile(r"(^)((([\"'])([a-zA-Z0-9_-]+)(?:\4))|([a-zA-Z0-9_-]+))((\s*)(#.*))?($)")
+# Keywords that identify the type of a line, other than a comment, keyed by their first character
+_KEYWORDS = {"p": "package", "c": "config", "o": "option", "l": "list"}
 
-# Matches the remainder of a config line
-_CONFIG_REGEX = re.compile(
-    r"(^)((([\"'])([a-zA-Z0-9_-]+)(?:\4))|([a-zA-Z0-9_-]+))((\s+)((([\"'])([a-zA-Z0-9_-]+)(?:\11))|([a-zA-Z0-9_-]+)))?((\s*)(#.*))?($)"
-)
+# Patterns for the regular expressions below, which are compiled on first use
+_PATTERNS = {
+    # Matches the remainder of a package line
+    "package": r"(^)((([\"'])([a-zA-Z0-9_-]++)(?:\4))|([a-zA-Z0-9_-]++))((\s*+)(#.*))?($)",
+    # Matches the remainder of a config line
+    "config": r"(^)((([\"'])([a-zA-Z0-9_-]++)(?:\4))|([a-zA-Z0-9_-]++))((\s++)((([\"'])([a-zA-Z0-9_-]++)(?:\11))|([a-zA-Z0-9_-]++)))?((\s*+)(#.*))?($)",
+    # Matches the remainder of an option or list line
+    "option": r"(^)((([\"'])([a-zA-Z0-9_-]++)(?:\4))|([a-zA-Z0-9_-]++))(\s++)((([\"'])([^\\\10]*)(?:\10))|([^'\"\s#]++))((\s*+)(#.*))?($)",
+}
 
-# Matches the remainder of an option or list line
-_OPTION_REGEX = LIST_REGEX = re.compile(
-    r"(^)((([\"'])([a-zA-Z0-9_-]+)(?:\4))|([a-zA-Z0-9_-]+))(\s+)((([\"'])([^\\\10]*)(?:\10))|([^'\"\s#]+))((\s*)(#.*))?($)"
-)
 
+class _Regexes:
+    """Regular expressions used by the parser, each compiled the first time it is accessed."""
 
-def _contains_single(string: str) -> bool:
-    """Whether a string contains a single quote."""
-    match = re.search(r"[']", string)
-    return match is not None
+    package: "re.Pattern[str]"
+    config: "re.Pattern[str]"
+    option: "re.Pattern[str]"
 
+    def __getattr__(self, name: str) -> "re.Pattern[str]":
+        if name not in _PATTERNS:
+            raise AttributeError(name)
+        regex = re.compile(_PATTERNS[name])
+        setattr(self, name, regex)  # after this, normal attribute lookup finds it without calling __getattr__
+        return regex
 
-def _parse_line(lineno: int, line: str) -> "UciLine | None":
-    """Parse a line, raising UciParseError if it is not valid."""
-    match = _LINE_REGEX.match(line)
-    if not match:
-        raise UciParseError(f"Error on line {lineno}: unrecognized line type")
-    if match[4] == "#":
-        return _parse_comment(lineno, match[3], match[5])
-    if match[8]:
-        if match[8] == "package":
-            return _parse_package(lineno, match[10])
-        if match[8] == "config":
-            return _parse_config(lineno, match[10])
-        if match[8] == "option":
-            return _parse_option(lineno, match[10])
-        if match[8] == "list":
-            return _parse_list(lineno, match[10])
+
+_REGEX = _Regexes()
+
+
+def __getattr__(name: str) -> "re.Pattern[str]":
+    # The list regex used to be a public module attribute, so keep it available without compiling it at import
+    if name == "LIST_REGEX":
+        return _REGEX.option
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _contains_single(string: str) -> bool:
+    """Whether a string contains a single quote."""
+    return "'" in string
+
+
+def _split_line(content: str) -> tuple[str, str] | None:
+    """Split a line with leading whitespace removed into its type and remainder, or None if the type is not recognized."""
+    if content[0] == "#":
+        remainder = content[1:].removesuffix("\n")  # the comment keeps any trailing whitespace, like ".*$" would
+        return ("#", remainder) if "\n" not in remainder else None
+    keyword = _KEYWORDS.get(content[0])
+    if keyword and content.startswith(keyword) and content[len(keyword) : len(keyword) + 1].isspace():
+        remainder = content[len(keyword) :].strip()
+        return (keyword, remainder) if "\n" not in remainder else None
     return None
 
 
-def _parse_package(lineno: int, remainder: str) -> "UciPackageLine":
+def _parse_line(lineno: int, line: str, lazy: bool = False, interner: "UciInterner | None" = None) -> "UciLine | None":  # noqa: FBT001,FBT002
+    """Parse a line, raising UciParseError if it is not valid, deferring the fields of an option or list line if lazy."""
+    content = line.lstrip()
+    if not content:
+        return None
+    split = _split_line(content)
+    if not split:
+        raise UciParseError(f"Error on line {lineno}: unrecognized line type")
+    keyword, remainder = split
+    if keyword == "#":
+        return _parse_comment(lineno, line[: len(line) - len(content)], remainder)
+    if keyword == "package":
+        return _parse_package(lineno, remainder, interner)
+    if keyword == "config":
+        return _parse_config(lineno, remainder, interner)
+    if keyword == "option":
+        return _LazyOptionLine(lineno, remainder, interner) if lazy else _parse_option(lineno, remainder, interner)
+    return _LazyListLine(lineno, remainder, interner) if lazy else _parse_list(lineno, remainder, interner)
+
+
+def _parse_package(lineno: int, remainder: str, interner: "UciInterner | None" = None) -> "UciPackageLine":
     """Parse a package line, raising UciParseError if it is not valid."""
-    match = _PACKAGE_REGEX.match(remainder)
+    match = _REGEX.package.match(remainder)
     if not match:
         raise UciParseError(f"Error on line {lineno}: invalid package line")
     name = match[5] or match[6]
     comment = match[9]
+    if interner is not None:
+        name = interner.intern(name)
     return UciPackageLine(name=name, comment=comment)
 
 
-def _parse_config(lineno: int, remainder: str) -> "UciConfigLine":
+def _parse_config(lineno: int, remainder: str, interner: "UciInterner | None" = None) -> "UciConfigLine":
     """Parse a config line, raising UciParseError if it is not valid."""
-    match = _CONFIG_REGEX.match(remainder)
+    match = _REGEX.config.match(remainder)
     if not match:
         raise UciParseError(f"Error on line {lineno}: invalid config line")
     section = match[5] or match[6]
     name = match[12] or match[9]
     comment = match[16]
+    if interner is not None:
+        section, name = interner.intern(section), name and interner.intern(name)
     return UciConfigLine(section=section, name=name, comment=comment)
 
 
-def _extract_data_of_remainder_match(match: typing.Match[str]) -> tuple[str, str, str]:
-    """Extracts a 3-tuple containing (name,value,comment) out of a {_OPTION_REGEX, LIST_REGEX} matcher"""
+def _extract_data_of_remainder_match(match: "re.Match[str]") -> tuple[str, str, str]:
+    """Extracts a 3-tuple containing (name,value,comment) out of an option or list line matcher"""
     name = match[5] or match[6]
     value = ""
     if match[11]:
@@ -255,21 +399,25 @@ def _extract_data_of_remainder_match(match: typing.Match[str]) -> tuple[str, str
     return name, value, comment
 
 
-def _parse_option(lineno: int, remainder: str) -> "UciOptionLine":
+def _parse_option(lineno: int, remainder: str, interner: "UciInterner | None" = None) -> "UciOptionLine":
     """Parse an option line, raising UciParseError if it is not valid."""
-    match = _OPTION_REGEX.match(remainder)
+    match = _REGEX.option.match(remainder)
     if not match:
         raise UciParseError(f"Error on line {lineno}: invalid option line")
     name, value, comment = _extract_data_of_remainder_match(match)
+    if interner is not None:
+        name, value = interner.intern(name), interner.intern_value(value)
     return UciOptionLine(name=name, value=value, comment=comment)
 
 
-def _parse_list(lineno: int, remainder: str) -> "UciListLine":
+def _parse_list(lineno: int, remainder: str, interner: "UciInterner | None" = None) -> "UciListLine":
     """Parse a list line, raising UciParseError if it is not valid."""
-    match = LIST_REGEX.match(remainder)
+    match = _REGEX.option.match(remainder)
     if not match:
         raise UciParseError(f"Error on line {lineno}: invalid list line")
     name, value, comment = _extract_data_of_remainder_match(match)
+    if interner is not None:
+        name, value = interner.intern(name), interner.intern_value(value)
     return UciListLine(name=name, value=value, comment=comment)
 
 
@@ -280,6 +428,109 @@ def _parse_comment(_lineno: int, prefix: str, remainder: str) -> "UciCommentLine
     return UciCommentLine(comment=comment, indented=indented)
 
 
+def _check_length(lineno: int, line: str, max_line_length: int | None) -> None:
+    """Check a line against the maximum line length, not counting the line ending, raising UciParseError if it is too long."""
+    if max_line_length is not None and len(line) > max_line_length and len(line.rstrip("\r\n")) > max_line_length:
+        raise UciParseError(f"Error on line {lineno}: line is longer than {max_line_length} characters")
+
+
+def parse_line(lineno: int, line: str, *, max_line_length: int | None = None) -> "UciLine | None":
+    """
+    Parse a single line of a file, returning None if it is blank, for tools that read lines one at a time.
+
+    UciParseError is raised if the line is not valid or, if a maximum line
+    length is given, if it is too long, as when parsing a whole file.
+    """
+    if max_line_length is not None:
+        _check_length(lineno, line, max_line_length)
+    return _parse_line(lineno, line)
+
+
+def _parse_lines(
+    lines: "Iterable[str]",
+    start: int = 1,
+    max_line_length: int | None = None,
+    lazy: bool = False,  # noqa: FBT001,FBT002
+    interner: "UciInterner | None" = None,
+) -> "list[UciLine]":
+    """Parse lines, numbering them from the indicated starting line number."""
+    ucilines: list[UciLine] = []
+    for lineno, line in enumerate(lines, start=start):
+        _check_length(lineno, line, max_line_length)
+        parsed = _parse_line(lineno, line, lazy, interner)
+        if parsed:
+            ucilines.append(parsed)
+    return ucilines
+
+
+def _parse_chunk(chunk: str, max_line_length: int | None, lazy: bool) -> "tuple[list[UciLine], int]":  # noqa: FBT001
+    """Parse a chunk of text in a worker process, returning the parsed lines and the number of lines in the chunk."""
+    with _GcDisabled():
+        lines = chunk.splitlines(keepends=True)
+        return _parse_lines(lines, max_line_length=max_line_length, lazy=lazy), len(lines)
+
+
+def _split_chunks(text: str, count: int) -> list[str]:
+    """Split text into roughly equal chunks, each ending at a line boundary."""
+    chunks: list[str] = []
+    size = len(text) // count + 1
+    start = 0
+    while start < len(text):
+        end = text.find("\n", start + size)  # a \n always ends a line, no matter what the other line boundaries are
+        end = len(text) if end < 0 else end + 1
+        chunks.append(text[start:end])
+        start = end
+    return chunks
+
+
+def _parse_parallel(
+    text: str,
+    jobs: int,
+    max_line_length: int | None = None,
+    lazy: bool = False,  # noqa: FBT001,FBT002
+    interner: "UciInterner | None" = None,
+) -> "list[UciLine]":
+    """Parse text in parallel using a pool of worker processes, raising UciParseError for the first invalid line."""
+    from concurrent.futures import ProcessPoolExecutor  # noqa: PLC0415
+
+    from uciparse.profiling import init_worker  # noqa: PLC0415
+
+    chunks = _split_chunks(text, jobs * 2)  # more chunks than jobs, so the work is balanced if some chunks are slower
+    ucilines: list[UciLine] = []
+    with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker) as executor, _GcDisabled():
+        futures = [executor.submit(_parse_chunk, chunk, max_line_length, lazy) for chunk in chunks]
+        start = 1
+        for index, future in enumerate(futures):
+            try:
+                parsed, count = future.result()
+            except UciParseError:
+                executor.shutdown(cancel_futures=True)
+                _parse_lines(chunks[index].splitlines(keepends=True), start, max_line_length, lazy)  # raises at the right line
+                raise  # not reached, unless the worker failed for some other reason
+            if lazy and start > 1:  # each worker numbers lines from the start of its chunk, not the start of the file
+                for uciline in parsed:
+                    if isinstance(uciline, _LazyLine):
+                        uciline._lineno += start - 1  # noqa: SLF001
+            ucilines.extend(parsed)
+            start += count
+        if interner is not None:  # the pool can't be shared with the workers, so the lines are interned here instead
+            for uciline in ucilines:
+                interner.intern_line(uciline)
+    return ucilines
+
+
+class _GcDisabled:
+    """Context that disables garbage collection while creating many objects that will live on."""
+
+    def __enter__(self) -> None:
+        self.enabled = gc.isenabled()
+        gc.disable()
+
+    def __exit__(self, *_: object) -> None:
+        if self.enabled:
+            gc.enable()
+
+
 def _serialize_identifier(prefix: str, identifier: str | None) -> str:
     """Serialize an identifier, which is never quoted."""
     return f"{prefix}{identifier}" if identifier else ""
@@ -304,9 +555,68 @@ def __init__(self, message: str) -> None:
         self.message = message
 
 
+class UciInterner:
+    """
+    A pool of strings shared across parsed files, so that each distinct name or value is stored only once.
+
+    Names are always interned.  Values are only interned if they are no longer
+    than ``max_value_length`` characters.  The statistics count every string
+    looked up in the pool, whether or not it was already there.
+    """
+
+    def __init__(self, *, max_value_length: int = 64) -> None:
+        self.max_value_length = max_value_length
+        self.lookups = 0
+        self.bytes_saved = 0
+        self._pool: dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._pool)
+
+    def __repr__(self) -> str:
+        return f"UciInterner(strings={len(self)}, hit_rate={self.hit_rate:.1%}, bytes_saved={self.bytes_saved})"
+
+    @property
+    def hits(self) -> int:
+        """The number of lookups that found the string already in the pool."""
+        return self.lookups - len(self._pool)  # every other lookup added one string
+
+    @property
+    def hit_rate(self) -> float:
+        """The fraction of lookups that found the string already in the pool."""
+        return self.hits / self.lookups if self.lookups else 0.0
+
+    def intern(self, string: str) -> str:
+        """Return the pooled copy of a string, adding the string to the pool if it isn't there yet."""
+        self.lookups += 1
+        pooled = self._pool.setdefault(string, string)
+        if pooled is not string:
+            self.bytes_saved += sys.getsizeof(string)
+        return pooled
+
+    def intern_value(self, value: str) -> str:
+        """Return the pooled copy of a value, unless it is too long to be worth pooling."""
+        return self.intern(value) if len(value) <= self.max_value_length else value
+
+    def intern_line(self, line: "UciLine") -> None:
+        """Replace the names and values of a parsed line with their pooled copies."""
+        if isinstance(line, _LazyLine) and line._remainder is not None:  # noqa: SLF001
+            line._interner = self  # noqa: SLF001  # interned when the fields are parsed
+        elif isinstance(line, (UciOptionLine, UciListLine)):
+            line.name, line.value = self.intern(line.name), self.intern_value(line.value)
+        elif isinstance(line, UciConfigLine):
+            line.section, line.name = self.intern(line.section), line.name and self.intern(line.name)
+        elif isinstance(line, UciPackageLine):
+            line.name = self.intern(line.name)
+
+
 class UciLine(ABC):
     """A line in a UCI config file."""
 
+    # Set for lines parsed in lossless mode: (preceding blank lines start, line start, line end) offsets, and field snapshot
+    _span: tuple[int, int, int] | None = None
+    _pristine: tuple[object, ...] | None = None
+
     @abstractmethod
     def normalized(self) -> str:
         """Serialize the line in normalized form."""
@@ -374,6 +684,44 @@ def normalized(self) -> str:
         return f"{name_field}{value_field}{comment_field}\n"
 
 
+class _LazyLine:
+    """
+    Mixin for an option or list line whose fields are only parsed when one of them is first accessed.
+
+    Until then, the line keeps only its line number and the unparsed remainder
+    of the line.  A field that is assigned before the line is parsed keeps its
+    assigned value.
+    """
+
+    def __init__(self, lineno: int, remainder: str, interner: "UciInterner | None" = None) -> None:
+        self._lineno = lineno
+        self._remainder: str | None = remainder
+        self._interner = interner
+
+    def __getattr__(self, name: str) -> object:
+        # This is only called for attributes that haven't been set, so the line is parsed at most once
+        if name not in {"name", "value", "comment"} or self.__dict__.get("_remainder") is None:
+            raise AttributeError(name)
+        self._resolve()
+        return self.__dict__[name]
+
+    def _resolve(self) -> None:
+        """Parse the fields of the line, if they haven't been parsed yet, raising UciParseError if it is not valid."""
+        if self._remainder is not None:
+            parse = _parse_option if isinstance(self, UciOptionLine) else _parse_list
+            for field, value in vars(parse(self._lineno, self._remainder, self._interner)).items():
+                self.__dict__.setdefault(field, value)
+            self._remainder = None
+
+
+class _LazyOptionLine(_LazyLine, UciOptionLine):
+    """An option line whose fields are parsed on first access."""
+
+
+class _LazyListLine(_LazyLine, UciListLine):
+    """A list line whose fields are parsed on first access."""
+
+
 class UciCommentLine(UciLine):
     """A comment line in a UCI config file."""
 
@@ -388,36 +736,301 @@ def normalized(self) -> str:
         return f"{comment_field}\n"
 
 
+class UciSection:
+    """
+    A section in a UCI config file, made up of a config line and the lines that follow it.
+
+    The key identifies the section the same way ``uci show`` does: the section
+    name for a named section, or ``@type[index]`` for an anonymous section, where
+    the index counts all sections of that type.  Any lines before the first config
+    line are returned as a section with an empty key and no config line.
+    """
+
+    def __init__(self, key: str, config: UciConfigLine | None, lines: list[UciLine]) -> None:
+        self.key = key
+        self.config = config
+        self.lines = lines
+
+    def options(self) -> dict[str, str | list[str]]:
+        """Return the option and list values in the section, keyed by name, in order of appearance."""
+        options: dict[str, str | list[str]] = {}
+        for line in self.lines:
+            if isinstance(line, UciOptionLine):
+                options[line.name] = line.value
+            elif isinstance(line, UciListLine):
+                values = options.get(line.name)
+                if isinstance(values, list):
+                    values.append(line.value)
+                else:
+                    options[line.name] = [line.value]
+        return options
+
+
+class UciFingerprint:
+    """
+    A stable hash over the semantic content of a UCI file, along with a hash for each section.
+
+    Two fingerprints are equal if their file-level digests are equal.  Section
+    digests are keyed by section key, as for UciSection.
+    """
+
+    def __init__(self, digest: str, sections: dict[str, str]) -> None:
+        self.digest = digest
+        self.sections = sections
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, UciFingerprint) and self.digest == other.digest
+
+    def __hash__(self) -> int:
+        return hash(self.digest)
+
+    def __repr__(self) -> str:
+        return f"UciFingerprint({self.digest!r})"
+
+    def changed(self, other: "UciFingerprint") -> list[str]:
+        """Return the keys of sections that differ between two fingerprints, including sections that exist in only one."""
+        changed = [key for key, digest in self.sections.items() if other.sections.get(key) != digest]
+        changed.extend(key for key in other.sections if key not in self.sections)
+        return changed
+
+
+def _snapshot(line: UciLine) -> tuple[object, ...]:
+    """Take a snapshot of the public fields of a line, used to detect edits in lossless mode."""
+    return tuple(value for name, value in vars(line).items() if not name.startswith("_"))
+
+
+def _canonical(lines: "Sequence[UciLine]") -> list[UciLine]:
+    """Reorder lines into canonical form, grouping them in a single pass and then sorting the sections and options."""
+    import operator  # noqa: PLC0415
+
+    preamble: list[UciLine] = []
+    sections: list[tuple[tuple[str, bool, str], UciConfigLine, list[tuple[str, list[UciLine]]]]] = []
+    groups: list[tuple[str, list[UciLine]]] | None = None  # (name, lines) for each option in the current section
+    pending: list[UciLine] = []  # comments waiting for the option or list that follows them
+    for line in lines:
+        if isinstance(line, UciConfigLine):
+            if groups is not None and pending:
+                groups.append(("\uffff", pending))  # comments at the end of a section stay at the end
+                pending = []
+            groups = []
+            named = line.name is not None
+            sections.append(((line.section, not named, line.name or ""), line, groups))
+        elif groups is None:
+            preamble.append(line)
+        elif isinstance(line, UciCommentLine):
+            pending.append(line)
+        else:
+            pending.append(line)
+            groups.append((getattr(line, "name", ""), pending))
+            pending = []
+    if groups is not None and pending:
+        groups.append(("\uffff", pending))
+    result = preamble
+    for _, config, section in sorted(sections, key=operator.itemgetter(0)):  # stable, so anonymous sections keep their order
+        result.append(config)
+        for _, group in sorted(section, key=operator.itemgetter(0)):  # stable, so list values keep their order
+            result.extend(group)
+    return result
+
+
 class UciFile:
-    def __init__(self, lines: list[UciLine]) -> None:
+    def __init__(self, lines: list[UciLine], source: str | None = None, tail: int = 0) -> None:
         self.lines = lines
+        self.source = source  # the original text, for a file parsed in lossless mode
+        self.tail = tail  # offset of any trailing blank lines in the original text
 
-    def normalized(self) -> list[str]:
-        """Return a list of normalized lines comprising the file."""
+    def normalized(self, *, canonical: bool = False) -> list[str]:
+        """Return a list of normalized lines comprising the file, in canonical order if requested; see module docs."""
+        lines = _canonical(self.lines) if canonical else self.lines
         # We join the lines first and then re-split so we don't end up with lines that have an embedded newline
-        return "".join([line.normalized() for line in self.lines]).splitlines(keepends=True)
+        return "".join([line.normalized() for line in lines]).splitlines(keepends=True)
+
+    def lossless(self) -> list[str]:
+        """Return a list of lines comprising the file, preserving the original formatting of unchanged lines."""
+        if self.source is None:
+            return self.normalized()
+        source = self.source
+        chunks: list[str] = []
+        for line in self.lines:
+            if chunks and not chunks[-1].endswith(("\n", "\r")):
+                chunks.append("\n")  # the last line in the original text had no newline, but other lines now follow it
+            span = line._span  # noqa: SLF001
+            if span is None:
+                chunks.append(line.normalized())
+            elif line._pristine == _snapshot(line):  # noqa: SLF001
+                chunks.append(source[span[0] : span[2]])
+            else:
+                indent = span[1]  # keep the original indentation and preceding blank lines
+                while indent < span[2] and source[indent] in {" ", "\t"}:
+                    indent += 1
+                chunks.extend([source[span[0] : indent], line.normalized().lstrip()])
+        chunks.append(source[self.tail :])
+        return "".join(chunks).splitlines(keepends=True)
+
+    def sections(self) -> list[UciSection]:
+        """Return the sections in the file, in order."""
+        sections: list[UciSection] = []
+        counts: dict[str, int] = {}
+        current = UciSection(key="", config=None, lines=[])
+        for line in self.lines:
+            if isinstance(line, UciConfigLine):
+                if current.config or current.lines:
+                    sections.append(current)
+                index = counts.get(line.section, 0)
+                counts[line.section] = index + 1
+                key = line.name or f"@{line.section}[{index}]"
+                current = UciSection(key=key, config=line, lines=[])
+            else:
+                current.lines.append(line)
+        if current.config or current.lines:
+            sections.append(current)
+        return sections
+
+    def validate(self) -> None:
+        """Parse any lines that were parsed lazily, raising UciParseError for the first line that is not valid."""
+        for line in self.lines:
+            if isinstance(line, _LazyLine):
+                line._resolve()  # noqa: SLF001
+
+    def fingerprint(self, *, ordered: bool = True) -> UciFingerprint:
+        """
+        Compute a fingerprint over the semantic content of the file.
+
+        Comments, quoting and whitespace are ignored.  If ``ordered`` is False,
+        the order of options within a section and the order of sections within
+        the file are ignored too, although the order of values within a list is
+        always significant.  Duplicate sections with the same key are hashed
+        together, since UCI merges them.
+        """
+        import hashlib  # noqa: PLC0415
+        import operator  # noqa: PLC0415
+
+        hashers: dict[str, hashlib.blake2b] = {}
+        for section in self.sections():
+            records: list[tuple[str, str]] = []  # (name, record) so records can be sorted by name
+            for line in section.lines:
+                if isinstance(line, UciOptionLine):
+                    records.append((line.name, f"option\0{line.name}\0{line.value}\n"))
+                elif isinstance(line, UciListLine):
+                    records.append((line.name, f"list\0{line.name}\0{line.value}\n"))
+                elif isinstance(line, UciPackageLine):
+                    records.append(("", f"package\0{line.name}\n"))
+            if not ordered:
+                records.sort(key=operator.itemgetter(0))  # stable, so list values stay in order
+            if section.key not in hashers:
+                hashers[section.key] = hashlib.blake2b(digest_size=16)
+                if section.config:
+                    hashers[section.key].update(f"config\0{section.config.section}\0{section.config.name or ''}\n".encode())
+            hashers[section.key].update("".join(record for _, record in records).encode())
+        sections = {key: hasher.hexdigest() for key, hasher in hashers.items()}
+        digest = hashlib.blake2b(digest_size=16)
+        for key in sorted(sections) if not ordered else sections:
+            digest.update(f"{key}\0{sections[key]}\n".encode())
+        return UciFingerprint(digest=digest.hexdigest(), sections=sections)
 
     @staticmethod
-    def from_file(path: str | Path) -> "UciFile":
-        """Generate a UciFile from a file on disk."""
-        source = path if isinstance(path, Path) else Path(path)
-        return UciFile.from_text(source.read_text(encoding=None))  # use platform-specific encoding
+    def merge(base: "UciFile", *overlays: "UciFile", lists: str = "replace") -> "UciMergeResult":
+        """Layer one or more overlay files on top of a base file, in order; see uciparse.merge for details."""
+        from uciparse.merge import overlay  # noqa: PLC0415
+
+        return overlay(base, *overlays, lists=lists)
+
+    def derive(self) -> "UciDerivedFile":
+        """Derive a copy-on-write file that shares unchanged sections and lines with this one; see uciparse.derived."""
+        from uciparse.derived import UciDerivedFile  # noqa: PLC0415
+
+        return UciDerivedFile(self)
 
     @staticmethod
-    def from_fp(fp: TextIO) -> "UciFile":
-        """Generate a UciFile from the contents of a file pointer."""
-        return UciFile.from_lines(fp.readlines())
+    def from_archive(path: "str | PathLike[str]") -> "Iterator[tuple[str, UciFile]]":
+        """Generate (name, UciFile) for each file in a tar or zip backup archive; see uciparse.archive for details."""
+        from uciparse.archive import read_archive  # noqa: PLC0415
+
+        return read_archive(path)
 
     @staticmethod
-    def from_text(text: str) -> "UciFile":
-        return UciFile.from_lines(text.splitlines(keepends=True))
+    def open_mapped(path: "str | PathLike[str]", *, max_line_length: int | None = None) -> "UciMappedFile":
+        """Open a file for random access through a memory map, parsing lines on demand; see uciparse.mapped for details."""
+        from uciparse.mapped import UciMappedFile  # noqa: PLC0415
+
+        return UciMappedFile(path, max_line_length=max_line_length)
 
     @staticmethod
-    def from_lines(lines: Sequence[str]) -> "UciFile":
-        """Generate a UciFile from a list of lines."""
+    def from_file(  # noqa: PLR0913
+        path: "str | PathLike[str]",
+        *,
+        lossless: bool = False,
+        jobs: int | None = None,
+        max_line_length: int | None = None,
+        lazy: bool = False,
+        interner: "UciInterner | None" = None,
+    ) -> "UciFile":
+        """Generate a UciFile from a file on disk, optionally in lossless mode or in parallel; see from_text()."""
+        # We use open() rather than pathlib, which is comparatively expensive to import
+        with open(path, encoding=None) as fp:  # noqa: FURB101,PTH123  # use platform-specific encoding
+            text = fp.read()
+        return UciFile.from_text(text, lossless=lossless, jobs=jobs, max_line_length=max_line_length, lazy=lazy, interner=interner)
+
+    @staticmethod
+    def from_fp(
+        fp: "TextIO",
+        *,
+        lossless: bool = False,
+        max_line_length: int | None = None,
+        lazy: bool = False,
+        interner: "UciInterner | None" = None,
+    ) -> "UciFile":
+        """Generate a UciFile from the contents of a file pointer, optionally in lossless mode; see from_text()."""
+        if lossless:
+            return UciFile.from_text(fp.read(), lossless=True, max_line_length=max_line_length, lazy=lazy, interner=interner)
+        return UciFile.from_lines(fp.readlines(), max_line_length=max_line_length, lazy=lazy, interner=interner)
+
+    @staticmethod
+    def from_text(  # noqa: PLR0913
+        text: str,
+        *,
+        lossless: bool = False,
+        jobs: int | None = None,
+        max_line_length: int | None = None,
+        lazy: bool = False,
+        interner: "UciInterner | None" = None,
+    ) -> "UciFile":
+        """
+        Generate a UciFile from a string, optionally in lossless mode.
+
+        If ``jobs`` is set, a large file is parsed in parallel using that many
+        processes (or one per CPU if ``jobs`` is 0).  If ``max_line_length`` is
+        set, any line longer than that is rejected with UciParseError.  If
+        ``lazy`` is set, the fields of option and list lines are only parsed
+        when they are first accessed; see validate().  If ``interner`` is set,
+        names and values are shared through that UciInterner.
+        """
+        if lazy and lossless:
+            raise ValueError("Lazy parsing is not supported in lossless mode")
+        if jobs is not None and jobs != 1:
+            if lossless:
+                raise ValueError("Parallel parsing is not supported in lossless mode")
+            if len(text) >= _PARALLEL_MINIMUM:
+                return UciFile(lines=_parse_parallel(text, jobs or os.cpu_count() or 1, max_line_length, lazy, interner))
+        if not lossless:
+            return UciFile.from_lines(text.splitlines(keepends=True), max_line_length=max_line_length, lazy=lazy, interner=interner)
         ucilines: list[UciLine] = []
-        for lineno, line in enumerate(lines, start=1):
-            parsed = _parse_line(lineno, line)
+        offset = trivia = 0
+        for lineno, line in enumerate(text.splitlines(keepends=True), start=1):
+            end = offset + len(line)
+            _check_length(lineno, line, max_line_length)
+            parsed = _parse_line(lineno, line, interner=interner)
             if parsed:
+                parsed._span = (trivia, offset, end)  # noqa: SLF001
+                parsed._pristine = _snapshot(parsed)  # noqa: SLF001
                 ucilines.append(parsed)
-        return UciFile(lines=ucilines)
+                trivia = end
+            offset = end
+        return UciFile(lines=ucilines, source=text, tail=trivia)
+
+    @staticmethod
+    def from_lines(
+        lines: "Sequence[str]", *, max_line_length: int | None = None, lazy: bool = False, interner: "UciInterner | None" = None
+    ) -> "UciFile":
+        """Generate a UciFile from a list of lines, optionally rejecting long lines or parsing lazily; see from_text()."""
+        return UciFile(lines=_parse_lines(lines, max_line_length=max_line_length, lazy=lazy, interner=interner))
@@ -0,0 +1,218 @@
+# vim: set ft=python ts=4 sw=4 expandtab:
+
+"""
+Watch a directory of UCI files, re-parsing files as they change.
+
+The watcher keeps the state of every file in the directory in memory: the
+file's stat signature (inode, size and modification time), a hash of its
+content, and either the parsed UciFile or the error that prevented parsing it.
+A file is only re-read when its stat signature changes, and only re-parsed
+when its content hash changes, so unchanged files cost nothing.
+
+On Linux, changes are detected with inotify, accessed through ctypes.  Where
+inotify or ctypes isn't available (ctypes is not part of OpenWRT's
+python3-light package), the watcher falls back to polling the directory with
+stat.  Either way, changes are debounced: a file is processed only once no
+change has been seen for the debounce interval, so a burst of writes from an
+editor results in a single re-parse.
+
+Only the top level of the directory is watched, like ``/etc/config``.  Hidden
+files and editor backup files (ending in ``~``) are ignored.
+"""
+
+import hashlib
+import os
+import select
+import stat
+import struct
+import time
+from collections.abc import Iterator
+from contextlib import suppress
+from types import TracebackType
+from typing import NamedTuple
+
+from uciparse.uci import UciFile, UciParseError
+
+# Default number of seconds a file must be quiet before it is processed
+DEBOUNCE = 0.2
+
+# Default number of seconds between checks of the directory when polling
+INTERVAL = 1.0
+
+# inotify event masks, from <sys/inotify.h>
+_IN_MODIFY = 0x00000002
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_Q_OVERFLOW = 0x00004000
+_IN_MASK = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+
+# Layout of the fixed part of struct inotify_event: wd, mask, cookie, len
+_IN_EVENT = struct.Struct("iIII")
+
+
+class UciWatchState(NamedTuple):
+    """State of a watched file: its stat signature, content hash, and either the parsed file or an error."""
+
+    signature: tuple[int, int, int]
+    digest: str
+    file: UciFile | None
+    error: str | None
+
+
+class UciWatchEvent(NamedTuple):
+    """Change to a watched file, with its new state, which is None if the file was removed."""
+
+    name: str
+    state: UciWatchState | None
+
+
+class _Inotify:
+    """Minimal wrapper over the Linux inotify API, for a single directory."""
+
+    def __init__(self, directory: str) -> None:
+        import ctypes  # noqa: PLC0415  # not available everywhere, so imported only when needed
+
+        libc = ctypes.CDLL(None, use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)  # IN_NONBLOCK and IN_CLOEXEC share these values
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), _IN_MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, "inotify_add_watch failed", directory)
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+    def read(self, timeout: float) -> set[str] | None:
+        """Wait for events, returning the names of files that changed, or None if events were lost."""
+        names: set[str] = set()
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return names
+        data = os.read(self.fd, 65536)
+        offset = 0
+        while offset < len(data):
+            _, mask, _, length = _IN_EVENT.unpack_from(data, offset)
+            if mask & _IN_Q_OVERFLOW:
+                return None
+            offset += _IN_EVENT.size
+            name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+            if name:
+                names.add(os.fsdecode(name))
+        return names
+
+
+def _ignored(name: str) -> bool:
+    """Whether a file in the watched directory should be ignored."""
+    return name.startswith(".") or name.endswith("~")
+
+
+class UciWatcher:
+    """Watch a directory of UCI files, keeping the state of each file in memory."""
+
+    def __init__(self, directory: str, *, debounce: float = DEBOUNCE, interval: float = INTERVAL, inotify: bool = True) -> None:
+        self.directory = directory
+        self.debounce = debounce
+        self.interval = interval
+        self.states: dict[str, UciWatchState] = {}
+        self._seen: dict[str, tuple[int, int, int]] = {}  # stat signatures from the last poll
+        self._inotify: _Inotify | None = None
+        if inotify:
+            with suppress(ImportError, AttributeError, OSError):  # if inotify isn't available, we fall back to polling
+                self._inotify = _Inotify(directory)
+
+    def __enter__(self) -> "UciWatcher":
+        return self
+
+    def __exit__(
+        self, exc_type: type[BaseException] | None, exc_value: BaseException | None, traceback: TracebackType | None
+    ) -> None:
+        self.close()
+
+    @property
+    def polling(self) -> bool:
+        """Whether the watcher is polling, rather than using inotify."""
+        return self._inotify is None
+
+    def close(self) -> None:
+        """Stop watching the directory."""
+        if self._inotify:
+            self._inotify.close()
+            self._inotify = None
+
+    def refresh(self, name: str) -> UciWatchEvent | None:
+        """Check a single file, returning an event if its content changed."""
+        try:
+            info = os.stat(os.path.join(self.directory, name))  # noqa: PTH116,PTH118
+        except FileNotFoundError:
+            return UciWatchEvent(name, None) if self.states.pop(name, None) else None
+        if _ignored(name) or not stat.S_ISREG(info.st_mode):
+            return None
+        signature = (info.st_ino, info.st_size, info.st_mtime_ns)
+        previous = self.states.get(name)
+        if previous and previous.signature == signature:
+            return None
+        with open(os.path.join(self.directory, name), "rb") as fp:  # noqa: FURB101,PTH118,PTH123
+            data = fp.read()
+        digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+        if previous and previous.digest == digest:
+            self.states[name] = previous._replace(signature=signature)
+            return None
+        try:
+            state = UciWatchState(signature, digest, UciFile.from_text(data.decode()), None)
+        except UciParseError as e:
+            state = UciWatchState(signature, digest, None, e.message)
+        except UnicodeDecodeError as e:
+            state = UciWatchState(signature, digest, None, f"File is not valid UTF-8: {e}")
+        self.states[name] = state
+        return UciWatchEvent(name, state)
+
+    def scan(self) -> list[UciWatchEvent]:
+        """Check every file in the directory, returning events for the files that changed."""
+        names = {entry.name for entry in os.scandir(self.directory) if not _ignored(entry.name)}
+        self._seen = self._signatures(names)
+        return [event for name in sorted(names | set(self.states)) if (event := self.refresh(name))]
+
+    def watch(self) -> Iterator[list[UciWatchEvent]]:
+        """Generate batches of events as files change, forever, starting with a scan of the whole directory."""
+        yield self.scan()
+        pending: dict[str, float] = {}  # name -> when a change was last seen
+        while True:
+            timeout = min(pending.values()) + self.debounce - time.monotonic() if pending else self.interval
+            changed = self._wait(max(timeout, 0.0))
+            now = time.monotonic()
+            if changed is None:
+                changed = set(self.states) | {entry.name for entry in os.scandir(self.directory)}
+            pending.update((name, now) for name in changed if not _ignored(name))
+            ready = sorted(name for name, seen in pending.items() if now - seen >= self.debounce)
+            for name in ready:
+                del pending[name]
+            events = [event for name in ready if (event := self.refresh(name))]
+            if events:
+                yield events
+
+    def _wait(self, timeout: float) -> set[str] | None:
+        """Wait up to a timeout for changes, returning the names of changed files, or None if all should be checked."""
+        if self._inotify:
+            return self._inotify.read(timeout)
+        time.sleep(min(timeout, self.interval))
+        names = {entry.name for entry in os.scandir(self.directory) if not _ignored(entry.name)}
+        seen = self._signatures(names)
+        changed = {name for name in names | set(self._seen) if seen.get(name) != self._seen.get(name)}
+        self._seen = seen
+        return changed
+
+    def _signatures(self, names: set[str]) -> dict[str, tuple[int, int, int]]:
+        """Get the stat signatures of files in the directory, skipping any that disappear."""
+        signatures = {}
+        for name in names:
+            try:
+                info = os.stat(os.path.join(self.directory, name))  # noqa: PTH116,PTH118
+            except FileNotFoundError:
+                continue
+            signatures[name] = (info.st_ino, info.st_size, info.st_mtime_ns)
+        return signatures